@@ -0,0 +1,97 @@
+""" Dock adjusting how the shown image is displayed, to check the boxes of low contrast images.
+
+    The adjustments only change the view, the image files are never written.
+    They are computed by image_adjust.ImageAdjuster, which needs NumPy.
+"""
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+from image_adjust import IDENTITY, ImageAdjuster
+
+CHANNELS = (("RGB", "rgb"), ("Red", "red"), ("Green", "green"), ("Blue", "blue"))
+
+
+class AdjustmentsPanel(QtWidgets.QDockWidget):
+    """ Sliders and switches of the Adjustments applied to the shown image """
+    # adjusted image and whether it is at full resolution or a preview
+    adjusted = QtCore.pyqtSignal(QtGui.QImage, bool)
+
+    def __init__(self, parent=None):
+        super(AdjustmentsPanel, self).__init__("Adjustments", parent)
+        self.setObjectName("adjustmentsPanel")
+        self.adjuster = ImageAdjuster(parent=self)
+        self.adjuster.adjusted.connect(self.adjusted)
+
+        # brightness in hundredths, contrast and gamma in percent
+        self.brightness = self._slider(-100, 100, 0)
+        self.contrast = self._slider(0, 300, 100)
+        self.gamma = self._slider(10, 300, 100)
+        self.channel = QtWidgets.QComboBox()
+        for label, channel in CHANNELS:
+            self.channel.addItem(label, channel)
+        self.channel.currentIndexChanged.connect(self._changed)
+        self.grayscale = QtWidgets.QCheckBox("Grayscale", toggled=self._changed)
+        self.equalize = QtWidgets.QCheckBox("Equalize (CLAHE)", toggled=self._changed)
+        self.resetButton = QtWidgets.QPushButton("Reset", clicked=self.reset)
+        self.status = QtWidgets.QLabel()
+
+        form = QtWidgets.QFormLayout()
+        form.addRow("Brightness", self.brightness)
+        form.addRow("Contrast", self.contrast)
+        form.addRow("Gamma", self.gamma)
+        form.addRow("Channel", self.channel)
+        form.addRow(self.grayscale)
+        form.addRow(self.equalize)
+        bar = QtWidgets.QHBoxLayout()
+        bar.addWidget(self.status, 1)
+        bar.addWidget(self.resetButton)
+        layout = QtWidgets.QVBoxLayout()
+        layout.addLayout(form)
+        layout.addLayout(bar)
+        layout.addStretch(1)
+        widget = QtWidgets.QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+        self._changed()
+
+    def _slider(self, low, high, value):
+        slider = QtWidgets.QSlider(Qt.Horizontal)
+        slider.setRange(low, high)
+        slider.setValue(value)
+        slider.valueChanged.connect(self._changed)
+        return slider
+
+    def adjustments(self):
+        """ The Adjustments set in the panel """
+        return IDENTITY._replace(brightness=self.brightness.value() / 100.0,
+                contrast=self.contrast.value() / 100.0, gamma=self.gamma.value() / 100.0,
+                channel=self.channel.currentData(), grayscale=self.grayscale.isChecked(),
+                equalize=self.equalize.isChecked())
+
+    def set_image(self, image, scale=1.0):
+        """ Adjust image, displayed at scale. A null image, one shown in tiles, is not adjusted. """
+        self.widget().setEnabled(not image.isNull())
+        self.adjuster.set_image(image, scale)
+
+    def reset(self):
+        widgets = (self.brightness, self.contrast, self.gamma, self.channel, self.grayscale, self.equalize)
+        for widget in widgets:
+            widget.blockSignals(True)
+        self.brightness.setValue(0)
+        self.contrast.setValue(100)
+        self.gamma.setValue(100)
+        self.channel.setCurrentIndex(0)
+        self.grayscale.setChecked(False)
+        self.equalize.setChecked(False)
+        for widget in widgets:
+            widget.blockSignals(False)
+        self._changed()
+
+    def _changed(self, *args):
+        adjustments = self.adjustments()
+        self.status.setText("Brightness %+.2f, contrast %.2f, gamma %.2f" % (adjustments.brightness,
+                adjustments.contrast, adjustments.gamma))
+        self.adjuster.request(adjustments)
+
+    def shutdown(self):
+        self.adjuster.shutdown()
@@ -1,7 +1,8 @@
+import sys
+import time
 from pathlib import Path
 from enum import Enum
 from functools import partial
-import pandas as pd
 
 from PyQt5 import QtWidgets, QtGui, QtCore
 from PyQt5.QtCore import QDir, Qt
@@ -10,6 +11,19 @@ from PyQt5.QtWidgets import (QAction, QApplication, QFileDialog, QLabel,
         QMainWindow, QMenu, QMessageBox, QScrollArea, QSizePolicy)
 
 from imageviewer_gw import Ui_MainWindow
+from image_cache import ImageLoader, image_size, LARGE_IMAGE_PIXELS
+from gt_layer import GroundTruthLayer, top_left_coord
+from navigation import NavigationController
+from image_list import (DirectoryScanner, FolderLister, ImageListModel, read_listing, scan_images,
+        write_listing)
+from byte_cache import read_ahead_from_environment
+import icdar_gt
+from icdar_gt import DONT_CARE, GroundTruth, gt_name
+from gt_loaders import open_loader
+from gt_writer import AnnotationWriter
+from scaled_image import ZOOM_STEPS, ScaledImageItem, clamp_zoom, zoom_step
+from session import load_session, save_session
+from tracing import span, tracer
 
 class GripItem(QtWidgets.QGraphicsPathItem):
     circle = QtGui.QPainterPath()
@@ -45,6 +59,7 @@ class GripItem(QtWidgets.QGraphicsPathItem):
     def mouseReleaseEvent(self, event):
         self.setSelected(False)
         super(GripItem, self).mouseReleaseEvent(event)
+        self.m_annotation_item.edit_finished()
 
     def itemChange(self, change, value):
         if change == QtWidgets.QGraphicsItem.ItemPositionChange and self.isEnabled():
@@ -67,6 +82,11 @@ class PolygonAnnotation(QtWidgets.QGraphicsPolygonItem):
         self.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor))
 
         self.m_items = []
+        # set once the polygon differs from what is saved in the ground truth file
+        self.dirty = False
+        self.text = DONT_CARE
+        # called with the polygon once a point or the whole polygon was dragged
+        self.edited = None
 
     def number_of_points(self):
         return len(self.m_items)
@@ -90,7 +110,11 @@ class PolygonAnnotation(QtWidgets.QGraphicsPolygonItem):
     def movePoint(self, i, p):
         if 0 <= i < len(self.m_points):
             self.m_points[i] = self.mapFromScene(p)
-            self.setPolygon(QtGui.QPolygonF(self.m_points))
+            # replace the point instead of building the polygon from the whole list
+            polygon = self.polygon()
+            polygon.replace(i, self.m_points[i])
+            self.setPolygon(polygon)
+            self.dirty = True
 
     def move_item(self, index, pos):
         if 0 <= index < len(self.m_items):
@@ -103,8 +127,28 @@ class PolygonAnnotation(QtWidgets.QGraphicsPolygonItem):
         if change == QtWidgets.QGraphicsItem.ItemPositionHasChanged:
             for i, point in enumerate(self.m_points):
                 self.move_item(i, self.mapToScene(point))
+            self.dirty = True
         return super(PolygonAnnotation, self).itemChange(change, value)
 
+    def mouseReleaseEvent(self, event):
+        super(PolygonAnnotation, self).mouseReleaseEvent(event)
+        self.edit_finished()
+
+    def edit_finished(self):
+        if self.dirty and self.edited is not None:
+            self.edited(self)
+
+    def scene_polygon(self):
+        return QtGui.QPolygonF([self.mapToScene(point) for point in self.m_points])
+
+    def scene_coords(self):
+        """ Flat x1,y1,x2,y2,... scene coordinates of the points """
+        coords = []
+        for point in self.m_points:
+            p = self.mapToScene(point)
+            coords.extend((p.x(), p.y()))
+        return coords
+
     def hoverEnterEvent(self, event):
         self.setBrush(QtGui.QColor(255, 0, 0, 100))
         super(PolygonAnnotation, self).hoverEnterEvent(event)
@@ -131,12 +175,7 @@ class PolygonAnnotation(QtWidgets.QGraphicsPolygonItem):
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable, False)
 
     def get_top_left_coord(self):
-        minx, miny = self.m_points[0].x(), self.m_points[0].y()
-        for point in self.m_points:
-            x, y = point.x(), point.y()
-            if x < minx and y < miny:
-                minx, miny = x, y
-        return (minx, miny)
+        return top_left_coord([c for point in self.m_points for c in (point.x(), point.y())])
     
     def remove_points(self):
         for item in self.m_items:
@@ -151,21 +190,54 @@ class Instructions(Enum):
 class AnnotationScene(QtWidgets.QGraphicsScene):
     def __init__(self, parent=None):
         super(AnnotationScene, self).__init__(parent)
-        self.image_item = QtWidgets.QGraphicsPixmapItem()
-        self.image_item.setCursor(QtGui.QCursor(QtCore.Qt.CrossCursor))
-        self.addItem(self.image_item)
+        self.pixmap_item = ScaledImageItem()
+        self.pixmap_item.setCursor(QtGui.QCursor(QtCore.Qt.CrossCursor))
+        self.addItem(self.pixmap_item)
+        self.tiled_item = None
+        # the item showing the current image, the pixmap item or a tiled one
+        self.image_item = self.pixmap_item
         self.current_instruction = Instructions.No_Instruction
         self.added_polygons = []
 
-    def load_image(self, filename):
-        self.image_item.setPixmap(QtGui.QPixmap(filename))
+    def load_image(self, image):
+        """ Show the image, either a decoded QImage or the path of an image file """
+        if not isinstance(image, QtGui.QImage):
+            image = QtGui.QImage(str(image))
+        self.remove_tiled_image()
+        self.pixmap_item.set_image(image)
+        self.image_item = self.pixmap_item
         self.setSceneRect(self.image_item.boundingRect())
 
+    def load_tiled_image(self, filename, size=None):
+        """ Show a very large image through a tiled item decoding only the visible tiles """
+        from tiled_image import TiledImageItem
+        self.remove_tiled_image()
+        self.pixmap_item.set_image(QtGui.QImage())
+        self.tiled_item = TiledImageItem(filename, size)
+        self.tiled_item.setCursor(QtGui.QCursor(QtCore.Qt.CrossCursor))
+        self.addItem(self.tiled_item)
+        self.image_item = self.tiled_item
+        self.setSceneRect(self.image_item.boundingRect())
+
+    def remove_tiled_image(self):
+        if self.tiled_item is not None:
+            self.tiled_item.close()
+            self.removeItem(self.tiled_item)
+            self.tiled_item = None
+
     def setCurrentInstruction(self, instruction):
+        if self.current_instruction == Instructions.Polygon_Instruction:
+            # drop the point following the mouse, and the polygon if nothing was drawn
+            self.polygon_item.removeLastPoint()
+            if self.polygon_item.number_of_points() < 3:
+                self.polygon_item.remove_points()
+                self.removeItem(self.polygon_item)
+                self.added_polygons.remove(self.polygon_item)
         self.current_instruction = instruction
-        self.polygon_item = PolygonAnnotation()
-        self.addItem(self.polygon_item)
-        self.added_polygons.append(self.polygon_item)
+        if instruction == Instructions.Polygon_Instruction:
+            self.polygon_item = PolygonAnnotation()
+            self.addItem(self.polygon_item)
+            self.added_polygons.append(self.polygon_item)
 
     def mousePressEvent(self, event):
         if self.current_instruction == Instructions.Polygon_Instruction:
@@ -182,27 +254,203 @@ class AnnotationScene(QtWidgets.QGraphicsScene):
 
 
 class AnnotationView(QtWidgets.QGraphicsView):
-    factor = 1.05
+    """ View zooming through discrete levels with the wheel, anchored under the cursor.
+
+        While zooming the view draws with fast scaling and without
+        antialiasing, the smooth rendering comes back once input is idle.
+    """
+    quality_hints = QtGui.QPainter.Antialiasing | QtGui.QPainter.SmoothPixmapTransform
+    painted = QtCore.pyqtSignal()
+    # milliseconds without zoom input before drawing smoothly again
+    idle_delay = 150
 
     def __init__(self, parent=None):
         super(AnnotationView, self).__init__(parent)
-        self.setRenderHints(QtGui.QPainter.Antialiasing | QtGui.QPainter.SmoothPixmapTransform)
+        self.setRenderHints(self.quality_hints)
         self.setMouseTracking(True)
+        # zooming keeps the point under the cursor in place itself
+        self.setTransformationAnchor(QtWidgets.QGraphicsView.NoAnchor)
+        self.setResizeAnchor(QtWidgets.QGraphicsView.AnchorViewCenter)
+        # hovering and editing polygons only repaint the rectangles they touch
+        self.setViewportUpdateMode(QtWidgets.QGraphicsView.SmartViewportUpdate)
+        self.viewport().grabGesture(QtCore.Qt.PinchGesture)
+        self.idle_timer = QtCore.QTimer(self, singleShot=True, interval=self.idle_delay,
+                timeout=self.interactionFinished)
+        self._wheel = 0
         QtWidgets.QShortcut(QtGui.QKeySequence.ZoomIn, self, activated=self.zoomIn)
         QtWidgets.QShortcut(QtGui.QKeySequence.ZoomOut, self, activated=self.zoomOut)
 
     @QtCore.pyqtSlot()
     def zoomIn(self):
-        self.zoom(AnnotationView.factor)
+        self.set_zoom(zoom_step(self.current_zoom(), 1))
 
     @QtCore.pyqtSlot()
     def zoomOut(self):
-        self.zoom(1 / AnnotationView.factor)
+        self.set_zoom(zoom_step(self.current_zoom(), -1))
 
     def zoom(self, f):
-        self.scale(f, f)
-        if self.scene() is not None:
-            self.centerOn(self.scene().image_item)
+        """ Multiply the zoom by f around the center of the view """
+        self.set_zoom(self.current_zoom() * f)
+
+    def current_zoom(self):
+        return self.transform().m11()
+
+    def set_zoom(self, scale, anchor=None):
+        """ Zoom to scale keeping the scene point under anchor, a viewport
+            position defaulting to the center, where it is.
+        """
+        if anchor is None:
+            anchor = self.viewport().rect().center()
+        scale = clamp_zoom(scale)
+        if scale == self.current_zoom():
+            return
+        self.interacting()
+        scene_pos = self.mapToScene(anchor)
+        self.setTransform(QtGui.QTransform.fromScale(scale, scale))
+        delta = self.mapFromScene(scene_pos) - anchor
+        self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() + delta.x())
+        self.verticalScrollBar().setValue(self.verticalScrollBar().value() + delta.y())
+
+    def interacting(self):
+        """ Draw fast until the input stops for idle_delay """
+        if self.renderHints() & self.quality_hints:
+            self.setRenderHints(self.renderHints() & ~self.quality_hints)
+        self.idle_timer.start()
+
+    def interactionFinished(self):
+        self.setRenderHints(self.renderHints() | self.quality_hints)
+        self.viewport().update()
+
+    def wheelEvent(self, event):
+        if event.modifiers() & (QtCore.Qt.ShiftModifier | QtCore.Qt.AltModifier):
+            # scroll instead
+            super(AnnotationView, self).wheelEvent(event)
+            return
+        # high resolution wheels and touchpads send fractions of a notch
+        self._wheel += event.angleDelta().y()
+        steps = int(self._wheel / 120)
+        if steps:
+            self._wheel -= steps * 120
+            self.set_zoom(zoom_step(self.current_zoom(), steps), event.pos())
+        event.accept()
+
+    def viewportEvent(self, event):
+        if event.type() == QtCore.QEvent.Gesture:
+            pinch = event.gesture(QtCore.Qt.PinchGesture)
+            if pinch is not None:
+                if pinch.changeFlags() & QtWidgets.QPinchGesture.ScaleFactorChanged:
+                    anchor = self.viewport().mapFromGlobal(pinch.centerPoint().toPoint())
+                    self.set_zoom(self.current_zoom() * pinch.scaleFactor(), anchor)
+                event.accept()
+                return True
+        elif event.type() == QtCore.QEvent.NativeGesture:
+            # trackpad pinches on macOS
+            if event.gestureType() == QtCore.Qt.ZoomNativeGesture:
+                self.set_zoom(self.current_zoom() * (1 + event.value()), event.pos())
+                return True
+        return super(AnnotationView, self).viewportEvent(event)
+
+    def paintEvent(self, event):
+        with span("paint"):
+            super(AnnotationView, self).paintEvent(event)
+        self.painted.emit()
+
+
+class TimingHud(QtWidgets.QLabel):
+    """ Last and 95th percentile duration of every traced stage, over the view """
+
+    def __init__(self, parent=None):
+        super(TimingHud, self).__init__(parent)
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.setStyleSheet("background: rgba(0, 0, 0, 160); color: white; padding: 4px;")
+        self.timer = QtCore.QTimer(self, interval=500, timeout=self.refresh)
+        self.hide()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super(TimingHud, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super(TimingHud, self).hideEvent(event)
+
+    def refresh(self):
+        lines = ["%-16s %8s %8s" % ("stage", "last ms", "p95 ms")]
+        for name, (last, p95, _) in sorted(tracer.stats().items()):
+            lines.append("%-16s %8.2f %8.2f" % (name, last, p95))
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.move(8, 8)
+
+
+class GtIndexBuilder(QtCore.QThread):
+    """ Builds the index of a ground truth loader in the background """
+
+    def __init__(self, loader, parent=None):
+        super(GtIndexBuilder, self).__init__(parent)
+        self.loader = loader
+        self.index = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.index = self.loader.build_index()
+        except (OSError, ValueError) as e:
+            self.error = e
+
+
+class EvaluationRunner(QtCore.QThread):
+    """ Scores the predictions of every listed image against the ground truth in the background """
+
+    def __init__(self, img_dir, gt_source, pred_source, names, parent=None):
+        super(EvaluationRunner, self).__init__(parent)
+        self.img_dir = str(img_dir)
+        self.gt_source = str(gt_source)
+        self.pred_source = str(pred_source)
+        self.names = list(names)
+        self.scores = {}
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import evaluation
+        try:
+            self.scores = evaluation.evaluate(self.img_dir, self.gt_source, self.pred_source, self.names,
+                    cancelled=lambda: self._cancelled)
+        except (OSError, ValueError) as e:
+            self.error = e
+
+
+class TranscriptionIndexer(QtCore.QThread):
+    """ Brings the transcription index of a ground truth folder up to date in the background """
+
+    def __init__(self, gt_dir, parent=None):
+        super(TranscriptionIndexer, self).__init__(parent)
+        self.gt_dir = gt_dir
+        self.parsed = 0
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import sqlite3
+        from transcription_index import TranscriptionIndex
+        # sqlite connections belong to the thread that opened them
+        try:
+            index = TranscriptionIndex(self.gt_dir)
+            try:
+                self.parsed = index.update(cancelled=lambda: self._cancelled)
+            finally:
+                index.close()
+        except (OSError, sqlite3.Error) as e:
+            self.error = e
 
 
 class AnnotationWindow(QtWidgets.QMainWindow):
@@ -215,37 +463,341 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.m_scene = AnnotationScene(self)
         self.m_view.setScene(self.m_scene)
         self.setCentralWidget(self.m_view)
-
-        self.images = []
+        # dragging over empty space selects the ground truth polygons inside the band
+        self.m_view.setDragMode(QtWidgets.QGraphicsView.RubberBandDrag)
+        self.m_view.rubberBandChanged.connect(self.rubberBandChanged)
+        self.rubber_band = None
+        self.hud = TimingHud(self.m_view)
+        # tracing asked for through the environment stays on without the HUD
+        self.trace_at_start = tracer.enabled
+
+        self.images = ImageListModel(self)
+        self.ui.listView_images.setModel(self.images)
+        self.scanner = None
+        self.restore_name = None
+        # folder watching, relisting runs in the background and again if changes came meanwhile
+        self.img_watcher = None
+        self.gt_watcher = None
+        self.lister = None
+        self.relist = False
+        self.gt_signature = None
+        # work put off while the restored session is shown, None once it is
+        self.deferred = None
         self.img_index = 0
         self.img_dir = None
         self.gt_dir = None
-        self.gt = []
-        self.polygons = []
-        self.texts = []
+        self.gt_loader = None
+        self.index_builder = None
+        self.transcriptions = None
+        self.indexer = None
+        self.validation = None
+        self.adjustments = None
+        # detections shown over the ground truth and their scores, by image name
+        self.pred_dir = None
+        self.pred_loader = None
+        self.pred = GroundTruth()
+        self.pred_layer = None
+        self.scores = {}
+        self.evaluator = None
+        # folders the scores are of, changes coming in a burst, like saves, are scored once
+        self.scored_for = None
+        self.evaluate_timer = QtCore.QTimer(self, singleShot=True, interval=500, timeout=self.start_evaluation)
+        # boxes matching the search, by ground truth file name, None without a search
+        self.search_results = None
+        self.gt = GroundTruth()
+        self.gt_file = None
+        self.gt_layer = None
+        # ground truth polygons opened for editing, by their index in self.gt
+        self.edited_polygons = {}
+        # raw bytes of the upcoming images and their ground truth, read ahead for slow storage
+        self.files = read_ahead_from_environment(self)
+        self.loader = ImageLoader(files=self.files, parent=self)
+        self.loader.companions = self.companion_files
+        self.thumbnails = None
+        self.writer = AnnotationWriter(parent=self)
+        self.writer.failed.connect(self.annotationsNotSaved)
+        # right away from the writing thread, a read before the slot ran would get the old bytes
+        self.writer.saved.connect(self.files.invalidate, QtCore.Qt.DirectConnection)
 
         self.createActions()
         self.createMenus()
         self.connect_buttons()
 
-        QtWidgets.QShortcut(QtCore.Qt.Key_Escape, self, activated=partial(self.m_scene.setCurrentInstruction, Instructions.No_Instruction))
+        QtWidgets.QShortcut(QtCore.Qt.Key_Escape, self, activated=self.finish_polygon)
+
+        # writes a crashed session did not finish
+        recovered = self.writer.recover()
+        if recovered:
+            self.statusBar().showMessage("Recovered %d unsaved ground truth files" % len(recovered), 5000)
 
     def ground_truth_dir(self):
         dirName = QFileDialog.getExistingDirectory (self, "Select Images Folder",
                 QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.PicturesLocation),
                 QFileDialog.DontUseNativeDialog)
         if dirName:
-            self.gt_dir = Path(dirName)
+            self.set_gt_dir(dirName)
 
-    def files_with_extension(self, path=".", patterns=("*.jpg", "*.JPG", 
-        "*.jpeg", "*.JPEG", "*.png", "*.PNG")):
-        """ returns file list that satisfy pattern """
-        files = []
-        # define the path
+    def ground_truth_archive(self):
+        fileName, _ = QFileDialog.getOpenFileName(self, "Select Ground Truth File",
+                QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.PicturesLocation),
+                "Archives and JSON files (*.zip *.tar *.json)", options=QFileDialog.DontUseNativeDialog)
+        if fileName:
+            self.set_gt_dir(fileName)
+
+    def set_gt_dir(self, dirName):
+        """ Read the ground truth from dirName, a folder, a ZIP or TAR archive or a JSON file,
+            in the format recognised by gt_loaders.open_loader.
+        """
+        self.gt_dir = Path(dirName)
+        if self.gt_loader is not None:
+            self.gt_loader.close()
+        self.gt_loader = open_loader(self.gt_dir, self.files)
+        self.indexAct.setEnabled(self.gt_loader.indexable)
+        if self.gt_loader.searchable:
+            self.defer(self.index_transcriptions)
+        else:
+            self.stop_transcriptions()
+        self.defer(self.watch_ground_truth)
+        if self.gt_loader.needs_index():
+            self.build_gt_index()
+        else:
+            self.statusBar().showMessage("%s ground truth" % self.gt_loader.name, 5000)
+        self.evaluate()
+
+    def watch_ground_truth(self):
+        """ Show the changes made to the ground truth folder from outside """
+        from folder_watch import FolderWatcher
+        if self.gt_watcher is not None:
+            self.gt_watcher.stop()
+            self.gt_watcher.deleteLater()
+        self.gt_watcher = FolderWatcher(self.gt_dir, parent=self)
+        self.gt_watcher.changed.connect(self.groundTruthChanged)
+        if self.gt_file is not None:
+            self.gt_watcher.watch_file(self.gt_file)
+
+    def defer(self, call):
+        """ Call call once the restored session is on screen, right away otherwise """
+        if self.deferred is None:
+            call()
+        elif call not in self.deferred:
+            self.deferred.append(call)
+
+    def run_deferred(self):
+        calls, self.deferred = self.deferred or [], None
+        for call in calls:
+            call()
+
+    def sessionPainted(self):
+        if self.deferred is not None and self.m_scene.image_item.boundingRect().isEmpty():
+            return
+        self.m_view.painted.disconnect(self.sessionPainted)
+        if self.deferred is not None:
+            # after the paint has reached the screen
+            QtCore.QTimer.singleShot(0, self.run_deferred)
+
+    def predictions_dir(self):
+        dirName = QFileDialog.getExistingDirectory(self, "Select Predictions Folder",
+                str(self.gt_dir.parent) if self.gt_dir is not None else "",
+                QFileDialog.DontUseNativeDialog)
+        if dirName:
+            self.set_pred_dir(dirName)
+
+    def set_pred_dir(self, dirName):
+        """ Draw the detections in dirName over the ground truth and score them """
+        self.pred_dir = Path(dirName)
+        if self.pred_loader is not None:
+            self.pred_loader.close()
+        self.pred_loader = open_loader(self.pred_dir, self.files)
+        current = self.ui.listView_images.currentIndex().data(ImageListModel.PathRole)
+        if current is not None:
+            self.pred = self.pred_loader.load(current)
+            self.show_predictions()
+        self.evaluate()
+
+    def evaluate(self):
+        """ Score the predictions of every image in the background soon, for the H-mean sort.
+            Only the images whose files changed since the last scoring are scored again.
+        """
+        self.evaluate_timer.start()
+
+    def start_evaluation(self):
+        if self.evaluator is not None:
+            # its scores are dropped by evaluated, it stops on its own
+            self.evaluator.cancel()
+            self.evaluator = None
+        folders = (self.img_dir, self.gt_dir, self.pred_dir)
+        if folders != self.scored_for:
+            self.scored_for = folders
+            self.scores = {}
+            self.sortHmeanAct.setEnabled(False)
+        if self.img_dir is None or self.gt_dir is None or self.pred_dir is None or not len(self.images):
+            return
+        self.evaluator = EvaluationRunner(self.img_dir, self.gt_dir, self.pred_dir, self.images.all_names, self)
+        self.evaluator.finished.connect(partial(self.evaluated, self.evaluator))
+        self.evaluator.finished.connect(self.evaluator.deleteLater)
+        self.statusBar().showMessage("Evaluating %s ..." % self.pred_dir.name)
+        self.evaluator.start()
+
+    def evaluated(self, evaluator):
+        import evaluation
+        if evaluator is not self.evaluator:
+            return
+        self.evaluator = None
+        if evaluator.error is not None:
+            self.statusBar().showMessage("Cannot evaluate %s: %s" % (self.pred_dir, evaluator.error), 5000)
+            return
+        self.scores = evaluator.scores
+        self.sortHmeanAct.setEnabled(True)
+        if self.sortHmeanAct.isChecked():
+            self.images.sort_names(key=self.hmean_order())
+        self.statusBar().showMessage("%d images: precision %.3f, recall %.3f, H-mean %.3f" % (
+                (len(self.scores),) + evaluation.overall(self.scores.values())))
+
+    def hmean_order(self):
+        """ Sort key of the image names from the lowest H-mean up, the images not scored go last """
+        import evaluation
+        scores = self.scores
+        return lambda name: (evaluation.hmean_of(scores[name]) if name in scores else 2.0, name)
+
+    def sortByHmean(self, checked):
+        """ List the images from the lowest H-mean up, or by name again """
+        if checked and self.scores:
+            self.images.sort_names(key=self.hmean_order())
+            if len(self.images):
+                self.ui.listView_images.setCurrentIndex(self.images.index(0))
+        else:
+            self.images.sort_names()
+        self.ui.listView_images.scrollTo(self.ui.listView_images.currentIndex())
+
+    def index_transcriptions(self):
+        """ Update the transcription index of the ground truth folder for searching """
+        from transcription_index import TranscriptionIndex
+        self.stop_indexer()
+        if self.transcriptions is not None:
+            self.transcriptions.close()
+        self.transcriptions = TranscriptionIndex(self.gt_dir)
+        self.indexer = TranscriptionIndexer(self.gt_dir, self)
+        self.indexer.finished.connect(partial(self.transcriptionsIndexed, self.indexer))
+        self.indexer.start()
+        self.ui.lineEdit_search.setEnabled(True)
+
+    def stop_transcriptions(self):
+        """ Turn searching off for ground truth formats without a transcription index """
+        self.stop_indexer()
+        if self.transcriptions is not None:
+            self.transcriptions.close()
+            self.transcriptions = None
+        if self.search_results is not None:
+            self.search_results = None
+            self.images.set_filter(None)
+        self.ui.lineEdit_search.setEnabled(False)
+
+    def stop_indexer(self):
+        if self.indexer is not None:
+            self.indexer.cancel()
+            self.indexer.wait()
+            self.indexer = None
+
+    def transcriptionsIndexed(self, indexer):
+        if indexer is not self.indexer:
+            return
+        self.indexer = None
+        if indexer.error is not None:
+            self.statusBar().showMessage("Cannot index transcriptions: %s" % indexer.error, 5000)
+            return
+        if indexer.parsed and self.ui.lineEdit_search.text().strip():
+            # results found while indexing may have missed files
+            self.search()
+
+    def build_gt_index(self):
+        """ Pack the ground truth into an index in the background """
+        if self.gt_loader is None or self.index_builder is not None:
+            return
+        self.index_builder = GtIndexBuilder(self.gt_loader, self)
+        self.index_builder.finished.connect(self.gtIndexBuilt)
+        self.statusBar().showMessage("Indexing %s ..." % self.gt_dir)
+        self.index_builder.start()
+
+    def gtIndexBuilt(self):
+        builder, self.index_builder = self.index_builder, None
+        if builder.loader is not self.gt_loader:
+            if builder.index is not None:
+                builder.index.close()
+            # another ground truth was chosen meanwhile
+            if self.gt_loader is not None and self.gt_loader.needs_index():
+                self.build_gt_index()
+            return
+        if builder.error is not None:
+            self.statusBar().showMessage("Cannot index %s: %s" % (builder.loader.source, builder.error))
+            return
+        self.gt_loader.set_index(builder.index)
+        self.statusBar().showMessage("Indexed the ground truth of %d images" % len(builder.index), 5000)
+        # formats without a file per image had no annotations to show before
+        current = self.ui.listView_images.currentIndex().data(ImageListModel.PathRole)
+        if (current is not None and self.gt_file is None and not self.edited_polygons
+                and not self.m_scene.added_polygons):
+            self.gt = self.gt_loader.load(current)
+            self.show_ground_truth()
+            self.polygonsVisibility()
+            self.textVisibility()
+
+    def validate(self):
+        """ Check the ground truth of the listed images in the validation panel """
+        from validation_panel import ValidationPanel
+        if self.img_dir is None or self.gt_dir is None:
+            return
+        if self.validation is None:
+            self.validation = ValidationPanel(self)
+            self.validation.issueActivated.connect(self.show_issue)
+            self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.validation)
+        self.validation.show()
+        self.validation.start(self.img_dir, self.gt_dir, self.images.all_names)
+
+    def show_issue(self, name, box):
+        """ Open the image of a validation issue and select its box """
+        row = self.images.row_of(self.img_dir / name)
+        if row < 0:
+            self.statusBar().showMessage("%s is not listed" % name, 5000)
+            return
+        if row != self.ui.listView_images.currentIndex().row():
+            self.ui.listView_images.setCurrentIndex(self.images.index(row))
+        if box >= 0 and self.gt_layer is not None and box < len(self.gt):
+            self.gt_layer.set_selected([box])
+            self.m_view.centerOn(self.gt_layer.bounds[box].center())
+
+    def search(self):
+        """ Only list the images whose transcriptions match the search text """
+        query = self.ui.lineEdit_search.text().strip()
+        if self.transcriptions is None:
+            return
+        current = self.ui.listView_images.currentIndex().data(ImageListModel.PathRole)
+        message = ""
+        if not query:
+            if self.search_results is None:
+                return
+            self.search_results = None
+            self.images.set_filter(None)
+        else:
+            start = time.perf_counter()
+            self.search_results = self.transcriptions.search(query)
+            elapsed = time.perf_counter() - start
+            results = self.search_results
+            self.images.set_filter(lambda name: gt_name(name) in results)
+            message = "%d images match, %d boxes, in %.1f ms" % (len(self.images),
+                    sum(len(boxes) for boxes in results.values()), 1e3 * elapsed)
+        # stay on the same image if it is still listed, otherwise show the first match
+        row = self.images.row_of(current) if current is not None else -1
+        if row < 0 and len(self.images):
+            row = 0
+        if row >= 0:
+            self.ui.listView_images.setCurrentIndex(self.images.index(row))
+            self.ui.listView_images.scrollTo(self.images.index(row))
+        self.statusBar().showMessage(message)
+
+    def files_with_extension(self, path="."):
+        """ returns the sorted list of image files under path """
         path = Path(path)
-        for pattern in patterns:
-            files.extend(list(sorted(path.glob(pattern))))
-        return files           
+        return [path / name for name in sorted(scan_images(path))]
 
     @QtCore.pyqtSlot()
     def open(self):
@@ -255,74 +807,433 @@ class AnnotationWindow(QtWidgets.QMainWindow):
                 QFileDialog.DontUseNativeDialog)
 
         if dirName:
-            self.img_dir = Path(dirName)
-            self.images = list(map(str, self.files_with_extension(dirName)))
-            if not self.images :
+            self.open_dir(dirName)
+
+    def open_archive(self):
+        """ Open the images of a ZIP or TAR archive without extracting it """
+        fileName, _ = QFileDialog.getOpenFileName(self, "Select Images Archive",
+                QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.PicturesLocation),
+                "Archives (*.zip *.tar)", options=QFileDialog.DontUseNativeDialog)
+        if fileName:
+            self.open_dir(fileName)
+
+    def open_dir(self, dirName, current=None):
+        """ List the images of dirName in the background, the first one found is opened right away.
+            When current is given that image is opened instead once it is listed.
+        """
+        self.stop_scan()
+        self.stop_watching_images()
+        self.loader.cancel()
+        if self.thumbnails is not None:
+            self.thumbnails.cancel()
+        self.clear_scene()
+        self.img_dir = Path(dirName)
+        self.img_index = 0
+        self.navigation.reset()
+        self.images.reset(self.img_dir)
+        self.search_results = None
+        self.ui.lineEdit_search.clear()
+        self.updateActions()
+        self.restore_name = current
+
+        # an unchanged folder is not scanned again
+        names = read_listing(self.img_dir)
+        if names is not None:
+            self.images.append(names)
+            self.restore_current()
+            self.defer(self.watch_images)
+            self.evaluate()
+            return
+
+        self.scanner = DirectoryScanner(self.img_dir, parent=self)
+        self.scanner.found.connect(partial(self.imagesFound, self.scanner))
+        self.scanner.finished.connect(partial(self.scanFinished, self.scanner))
+        self.scanner.start()
+
+    def restore_current(self):
+        """ Open the image asked for by open_dir if it is listed, otherwise the first one """
+        row = 0
+        if self.restore_name is not None:
+            row = max(0, self.images.row_of(self.img_dir / self.restore_name))
+            self.restore_name = None
+        elif self.ui.listView_images.currentIndex().isValid():
+            return
+        if row < len(self.images) and row != self.ui.listView_images.currentIndex().row():
+            self.ui.listView_images.setCurrentIndex(self.images.index(row))
+
+    def session_state(self):
+        """ What restore_session needs to bring the viewer back to its current state """
+        current = self.ui.listView_images.currentIndex()
+        return {
+            "img_dir": str(self.img_dir) if self.img_dir is not None else None,
+            "gt_dir": str(self.gt_dir) if self.gt_dir is not None else None,
+            "image": current.data(QtCore.Qt.DisplayRole) if current.isValid() else None,
+            "zoom": self.m_view.transform().m11(),
+            "show_polygons": self.ui.checkBox_poly.isChecked(),
+            "show_texts": self.ui.checkBox_text.isChecked(),
+        }
+
+    def restore_session(self, path=None):
+        """ Reopen the folders and the image of the previous run.
+            Watching the folders and indexing the transcriptions wait until the image is painted.
+        """
+        state = load_session(path)
+        self.deferred = []
+        self.ui.checkBox_poly.setChecked(state.get("show_polygons", True))
+        self.ui.checkBox_text.setChecked(state.get("show_texts", True))
+        gt_dir = state.get("gt_dir")
+        if gt_dir and Path(gt_dir).exists():
+            self.set_gt_dir(gt_dir)
+        img_dir = state.get("img_dir")
+        if img_dir and Path(img_dir).exists():
+            self.open_dir(img_dir, state.get("image"))
+            zoom = state.get("zoom")
+            if zoom:
+                self.m_view.setTransform(QtGui.QTransform.fromScale(zoom, zoom))
+                self.m_view.centerOn(self.m_scene.image_item)
+            self.m_view.painted.connect(self.sessionPainted)
+            # in case no image can be shown
+            QtCore.QTimer.singleShot(2000, self.run_deferred)
+        else:
+            self.run_deferred()
+
+    def watch_images(self):
+        """ Keep the list up to date with the images folder once it is listed """
+        from folder_watch import FolderWatcher
+        self.img_watcher = FolderWatcher(self.img_dir, parent=self)
+        self.img_watcher.changed.connect(self.imagesChanged)
+
+    def stop_watching_images(self):
+        if self.img_watcher is not None:
+            self.img_watcher.stop()
+            self.img_watcher.deleteLater()
+            self.img_watcher = None
+        if self.lister is not None:
+            # a listing still running is dropped by imagesListed
+            if self.lister.isRunning():
+                self.lister.finished.connect(self.lister.deleteLater)
+            else:
+                self.lister.deleteLater()
+            self.lister = None
+        self.relist = False
+
+    def companion_files(self, path):
+        """ Ground truth and prediction files read along with the image path """
+        files = []
+        for loader in (self.gt_loader, self.pred_loader):
+            if loader is not None:
+                files.extend(loader.gt_paths(path))
+        return files
+
+    def imagesChanged(self):
+        self.files.expire(self.img_dir)
+        if self.lister is None:
+            # kept while watching, it compares every listing with the previous one
+            self.lister = FolderLister(self.img_dir, self.images.all_names, parent=self)
+            self.lister.changed.connect(partial(self.imagesListed, self.lister))
+            self.lister.finished.connect(partial(self.listerFinished, self.lister))
+        if self.lister.isRunning():
+            self.relist = True
+            return
+        self.lister.start()
+
+    def imagesListed(self, lister, added, removed):
+        """ Apply the difference between the new listing and the previous one to the list """
+        if lister is not self.lister:
+            return
+        self.images.remove_names(removed)
+        self.images.insert_sorted(added)
+        self.statusBar().showMessage("%d images added, %d removed" % (len(added), len(removed)), 3000)
+        if not self.ui.listView_images.currentIndex().isValid() and len(self.images):
+            self.ui.listView_images.setCurrentIndex(self.images.index(0))
+
+    def listerFinished(self, lister):
+        if lister is not self.lister:
+            return
+        if self.relist:
+            self.relist = False
+            self.imagesChanged()
+
+    def groundTruthChanged(self):
+        self.files.expire(self.gt_dir)
+        self.reload_ground_truth()
+        if self.gt_loader.needs_index():
+            self.build_gt_index()
+        if self.gt_loader.searchable:
+            # only the changed files are parsed again
+            self.index_transcriptions()
+        # only the images whose files changed are scored again
+        self.evaluate()
+
+    def reload_ground_truth(self):
+        """ Show the ground truth of the current image again if its file changed on disk """
+        from folder_watch import stat_signature
+        if self.gt_file is None or self.gt_signature == stat_signature(self.gt_file):
+            return
+        # edits in progress win over changes from outside, they are saved over them
+        if self.edited_polygons or self.m_scene.added_polygons or self.writer.pending(self.gt_file) is not None:
+            return
+        self.gt_signature = stat_signature(self.gt_file)
+        self.files.invalidate(self.gt_file)
+        self.gt = self.gt_loader.read(self.gt_file)
+        self.show_ground_truth()
+        self.polygonsVisibility()
+        self.textVisibility()
+
+    def show_ground_truth(self):
+        """ Replace the ground truth layer by one showing self.gt """
+        if self.gt_layer is not None:
+            self.m_scene.removeItem(self.gt_layer)
+        # all polygons and texts are drawn by a single read only item
+        self.gt_layer = GroundTruthLayer(self.gt)
+        self.gt_layer.editRequested.connect(self.edit_polygon)
+        self.gt_layer.selectionChanged.connect(self.polygonsSelected)
+        self.m_scene.addItem(self.gt_layer)
+        if self.search_results is not None and self.gt_file is not None:
+            self.gt_layer.set_selected(self.search_results.get(self.gt_file.name, ()))
+        self.show_predictions()
+
+    def show_predictions(self):
+        """ Replace the predictions layer by one showing self.pred, matched against self.gt.
+            Missed ground truth boxes are drawn red, false positives orange and the
+            boxes left out of the scores as dont care dashed.
+        """
+        if self.pred_layer is not None:
+            self.m_scene.removeItem(self.pred_layer)
+            self.pred_layer = None
+        if self.pred_loader is None:
+            return
+        # needs NumPy, imported once predictions are shown
+        import evaluation
+        self.pred_layer = GroundTruthLayer(self.pred)
+        self.pred_layer.pen = QtGui.QPen(QtGui.QColor("blue"), 2)
+        self.pred_layer.set_texts_visible(False)
+        # the ground truth below stays the one clicked and hovered
+        self.pred_layer.setAcceptedMouseButtons(QtCore.Qt.NoButton)
+        self.pred_layer.setAcceptHoverEvents(False)
+        self.pred_layer.setZValue(self.gt_layer.zValue() + 1 if self.gt_layer is not None else 10)
+        self.m_scene.addItem(self.pred_layer)
+
+        m = evaluation.match(self.gt, self.pred)
+        ignored = QtGui.QPen(QtGui.QColor("gray"), 2, QtCore.Qt.DashLine)
+        pens = {"missed": QtGui.QPen(QtGui.QColor("red"), 3), "ignored": ignored,
+                "false positive": QtGui.QPen(QtGui.QColor("orange"), 3)}
+        self.pred_layer.set_pens({i: pens[status] for i, status in enumerate(m.det_status) if status in pens})
+        if self.gt_layer is not None:
+            self.gt_layer.set_pens({i: pens[status] for i, status in enumerate(m.gt_status) if status in pens})
+        precision, recall, hmean = evaluation.scores(*evaluation.image_score(m))
+        self.statusBar().showMessage("%d matched, %d missed, %d false positives: P %.3f R %.3f H %.3f" % (
+                len(m.pairs), m.gt_status.count("missed"), m.det_status.count("false positive"),
+                precision, recall, hmean))
+
+    def stop_scan(self):
+        """ Cancel the listing of the previously chosen folder """
+        if self.scanner is not None:
+            self.scanner.cancel()
+            self.scanner.wait()
+            self.scanner = None
+
+    def imagesFound(self, scanner, names):
+        if scanner is not self.scanner or scanner.is_cancelled():
+            return
+        self.images.append(names)
+        if self.restore_name is not None:
+            if self.restore_name in names:
+                self.restore_current()
+        elif not self.ui.listView_images.currentIndex().isValid():
+            # selecting the first row opens the image with its annotations
+            self.ui.listView_images.setCurrentIndex(self.images.index(0))
+
+    def scanFinished(self, scanner):
+        if scanner is not self.scanner or scanner.is_cancelled():
+            return
+        self.scanner = None
+        if not len(self.images):
+            if scanner.error is not None:
                 QMessageBox.information(self, "Directory Browser",
-                        "No images under %s. " % dirName)
-                return
-            
-            # populate QlistWidget and select the first row
-            self.ui.listWidget_images.addItems(self.images)
-            self.ui.listWidget_images.setCurrentRow(0)
-            # open the image and fill the screen with image and annotation
-            self.open_image(0)
-    
+                        "Cannot list %s: %s" % (self.img_dir, scanner.error))
+            else:
+                QMessageBox.information(self, "Directory Browser",
+                        "No images under %s. " % self.img_dir)
+            return
+        self.images.sort_names()
+        write_listing(self.img_dir, self.images.all_names)
+        self.restore_current()
+        self.evaluate()
+        self.defer(self.watch_images)
+        self.img_index = self.ui.listView_images.currentIndex().row()
+        self.ui.listView_images.scrollTo(self.ui.listView_images.currentIndex())
+        self.loader.prefetch_around(self.images, self.img_index)
+
     def clear_scene(self):
-        """ Clear previously displayed polygons and texts from the scene"""
-        for poly in self.polygons:
-            poly.remove_points()
-            self.m_scene.removeItem(poly)
-        for text in self.texts:
-            self.m_scene.removeItem(text)
-        for poly in self.m_scene.added_polygons:
-            poly.remove_points()
-            self.m_scene.removeItem(poly)
-        
-        self.m_scene.added_polygons =[]
-        self.texts = []
-        self.polygons = []
-        
+        """ Clear previously displayed polygons and texts from the scene, saving their edits"""
+        with span("clear_scene"):
+            with span("save_annotations"):
+                self.save_annotations()
+            if self.gt_layer is not None:
+                self.m_scene.removeItem(self.gt_layer)
+                self.gt_layer = None
+            if self.pred_layer is not None:
+                self.m_scene.removeItem(self.pred_layer)
+                self.pred_layer = None
+            for poly in self.edited_polygons.values():
+                poly.remove_points()
+                self.m_scene.removeItem(poly)
+            for poly in self.m_scene.added_polygons:
+                poly.remove_points()
+                self.m_scene.removeItem(poly)
+
+            self.m_scene.added_polygons =[]
+            self.edited_polygons = {}
+            self.gt_file = None
+
     def open_image(self, idx):
         """ Load the image on to scene and the annotations it has """
-        self.clear_scene()
-        # load image
-        self.img_index = idx
-        fileName = self.images[idx]
-        image = QImage(fileName)
-        if image.isNull():
-            QMessageBox.information(self, "Image Viewer",
-                    "Cannot load %s." % fileName)
+        with span("open_image"):
+            self.clear_scene()
+            # load image
+            self.img_index = idx
+            fileName = self.images[idx]
+            with span("read_bytes"):
+                data = self.loader.file_bytes(fileName)
+            with span("image_size"):
+                size = image_size(fileName, data)
+            if size.width() * size.height() > LARGE_IMAGE_PIXELS:
+                with span("tiled_image"):
+                    self.m_scene.load_tiled_image(fileName, size)
+                self.adjust_image(QtGui.QImage())
+            else:
+                with span("decode"):
+                    image = self.loader.load(fileName)
+                if image.isNull():
+                    QMessageBox.information(self, "Image Viewer",
+                            "Cannot load %s." % fileName)
+                    return
+                with span("upload"):
+                    self.m_scene.load_image(image)
+                self.adjust_image(image)
+            # decode the neighbours while the user looks at this one
+            self.loader.prefetch_around(self.images, idx)
+
+            if self.pred_loader is not None:
+                with span("read_predictions"):
+                    self.pred = self.pred_loader.load(fileName)
+
+            # load ground truth
+            if self.gt_loader is not None:
+                self.gt_file = self.gt_loader.gt_path(fileName)
+                with span("read_gt"):
+                    self.gt = None
+                    if self.gt_file is not None:
+                        self.gt_signature = self.files.signature(self.gt_file)
+                        # edits that are still on their way to the disk
+                        self.gt = self.writer.pending(self.gt_file)
+                    if self.gt is None:
+                        self.gt = self.gt_loader.load(fileName)
+                if self.gt_watcher is not None:
+                    self.gt_watcher.watch_file(self.gt_file)
+
+                with span("scene_build"):
+                    self.show_ground_truth()
+            elif self.pred_loader is not None:
+                self.gt = GroundTruth()
+                self.show_predictions()
+
+            # check if the user wants to see annotation or not
+            self.polygonsVisibility()
+            self.textVisibility()
+            #  image is loaded so activate buttons and menu links
+            self.updateActions()
+
+    def edit_polygon(self, i):
+        """ Replace the i'th ground truth polygon of the layer by an editable one with grips """
+        if i in self.edited_polygons:
             return
-        
-        self.m_scene.load_image(fileName)
-
-        # load ground truth
-        if self.gt_dir:
-            image_path = Path(fileName)
-            gt_path = self.gt_dir / ("gt_" + image_path.stem + ".txt")
-            self.gt = self.read_icdar2015_gt(gt_path)
-
-            # add annotation
-            for data in self.gt:
-                # add polygon
-                poly_item = PolygonAnnotation()        
-                self.m_scene.addItem(poly_item)
-                for i in range(4):
-                    poly_item.addPoint(QtCore.QPointF(data[2*i],data[2*i+1]))
-                poly_item.make_ineditable()
-                self.polygons.append(poly_item)
-                
-                # add texts
-                text_item = self.m_scene.addText(data[8])
-                text_item.setPos(*poly_item.get_top_left_coord())
-                self.texts.append(text_item)
-
-        # check if the user wants to see annotation or not
-        self.polygonsVisibility()
-        self.textVisibility()
-        #  image is loaded so activate buttons and menu links
-        self.updateActions()
+        points = self.gt.points(i)
+        poly_item = PolygonAnnotation()
+        self.m_scene.addItem(poly_item)
+        for j in range(0, len(points) - 1, 2):
+            poly_item.addPoint(QtCore.QPointF(points[j], points[j+1]))
+        poly_item.text = self.gt.texts[i]
+        poly_item.dirty = False
+        # the layer keeps drawing the label, where the edited polygon is
+        poly_item.edited = partial(self.polygonEdited, i)
+        self.edited_polygons[i] = poly_item
+        self.gt_layer.hide_polygon(i)
+
+    def polygonEdited(self, i, poly_item):
+        if self.gt_layer is not None:
+            self.gt_layer.set_polygon(i, poly_item.scene_polygon())
+
+    def rubberBandChanged(self, rect, from_scene, to_scene):
+        if not rect.isNull():
+            self.rubber_band = QtCore.QRectF(from_scene, to_scene).normalized()
+            return
+        # the drag ended
+        band, self.rubber_band = self.rubber_band, None
+        if (band is not None and self.gt_layer is not None
+                and self.m_scene.current_instruction == Instructions.No_Instruction):
+            self.gt_layer.set_selected(self.gt_layer.polygons_in(band))
+
+    def polygonsSelected(self):
+        selected = sorted(self.gt_layer.selected)
+        if len(selected) == 1:
+            self.statusBar().showMessage("Box %d: %s" % (selected[0], self.gt.texts[selected[0]]))
+        else:
+            self.statusBar().showMessage("%d boxes selected" % len(selected))
+
+    def finish_polygon(self):
+        """ End drawing a polygon and ask for its transcription """
+        drawing = self.m_scene.current_instruction == Instructions.Polygon_Instruction
+        poly_item = self.m_scene.polygon_item if drawing else None
+        self.m_scene.setCurrentInstruction(Instructions.No_Instruction)
+        if poly_item is not None and poly_item in self.m_scene.added_polygons:
+            text, ok = QtWidgets.QInputDialog.getText(self, "Transcription",
+                    "Text of the new polygon (%s if unreadable)" % DONT_CARE, text=DONT_CARE)
+            if ok and text:
+                poly_item.text = text
+
+    def save_annotations(self):
+        """ Write the edited and added polygons of the current image to its ground truth file.
+            Nothing is written when no polygon changed, the write happens in the background.
+        """
+        if self.gt_loader is None:
+            return False
+        edited = {i: poly for i, poly in self.edited_polygons.items() if poly.dirty}
+        drawing = self.m_scene.current_instruction == Instructions.Polygon_Instruction
+        added = [poly for poly in self.m_scene.added_polygons
+                if not (drawing and poly is self.m_scene.polygon_item)]
+        # the ICDAR 2015 format only holds quadrilaterals
+        skipped = [poly for poly in added if poly.number_of_points() != 4]
+        added = [poly for poly in added if poly.number_of_points() == 4]
+        if skipped:
+            self.statusBar().showMessage("%d polygons without 4 points were not saved" % len(skipped), 5000)
+        if not edited and not added:
+            return False
+        if self.gt_file is None or not self.gt_loader.writable:
+            self.statusBar().showMessage("The %s ground truth in %s is read only, the edits were not saved" % (
+                    self.gt_loader.name, self.gt_dir.name), 5000)
+            return False
+
+        gt = GroundTruth()
+        for i, (points, text) in enumerate(self.gt):
+            poly = edited.get(i)
+            gt.append(poly.scene_coords() if poly is not None else points, text)
+        for poly in added:
+            # saved polygons are edits of the ground truth from now on
+            self.edited_polygons[len(gt)] = poly
+            self.m_scene.added_polygons.remove(poly)
+            gt.append(poly.scene_coords(), poly.text)
+        for poly in edited.values():
+            poly.dirty = False
+        for poly in added:
+            poly.dirty = False
+        self.gt = gt
+        self.writer.save(self.gt_file, gt)
+        return True
+
+    def annotationsNotSaved(self, fname, error):
+        QMessageBox.warning(self, "Image Viewer", "Cannot save %s: %s" % (fname, error))
 
     def read_icdar2015_gt(self, fname):
         """ Return annotations inside the file.
@@ -332,19 +1243,127 @@ class AnnotationWindow(QtWidgets.QMainWindow):
             coordinates start from topleft(x1,y1) going clockwise and
             ending at bottom left(x4,y4)  
         """
-
-        df = pd.read_csv(fname, header=None)
-        return df.values.tolist()
+        return icdar_gt.read_icdar2015_gt(fname)
 
     def normalSize(self):
-        # TODO
-        self.m_view.zoom(1)
+        self.m_view.set_zoom(1)
 
     def fitToWindow(self):
         """ Fit image to the screen size """
         self.m_view.fitInView(self.m_scene.image_item, QtCore.Qt.KeepAspectRatio)
         self.m_view.centerOn(self.m_scene.image_item)
 
+    def thumbnailGrid(self, grid):
+        """ Switch the image list between file names and a grid of thumbnails """
+        view = self.ui.listView_images
+        if grid:
+            from thumbnails import ThumbnailProvider, THUMBNAIL_SIZE
+            if self.thumbnails is None:
+                self.thumbnails = ThumbnailProvider(parent=self)
+                # requests of cells scrolled out of sight are dropped, visible ones ask again
+                view.verticalScrollBar().valueChanged.connect(self.thumbnails.cancel)
+            view.setViewMode(QtWidgets.QListView.IconMode)
+            view.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            view.setGridSize(QtCore.QSize(THUMBNAIL_SIZE + 16, THUMBNAIL_SIZE + 32))
+            view.setMovement(QtWidgets.QListView.Static)
+            view.setResizeMode(QtWidgets.QListView.Adjust)
+            view.setWordWrap(False)
+            self.images.set_thumbnails(self.thumbnails)
+            self.resizeDocks([self.ui.dockWidget_11], [3 * (THUMBNAIL_SIZE + 16) + 32], QtCore.Qt.Horizontal)
+        else:
+            self.images.set_thumbnails(None)
+            if self.thumbnails is not None:
+                self.thumbnails.cancel()
+            view.setViewMode(QtWidgets.QListView.ListMode)
+            view.setIconSize(QtCore.QSize())
+            view.setGridSize(QtCore.QSize())
+        view.scrollTo(view.currentIndex())
+
+    def imageAdjustments(self, visible):
+        """ Show the panel adjusting the display of the shown image, the image as it is when hidden """
+        if visible:
+            from adjustments_panel import AdjustmentsPanel
+            if self.adjustments is None:
+                self.adjustments = AdjustmentsPanel(self)
+                # hidden through the action only, which shows the image as it is again
+                self.adjustments.setFeatures(QtWidgets.QDockWidget.DockWidgetMovable
+                        | QtWidgets.QDockWidget.DockWidgetFloatable)
+                self.adjustments.adjusted.connect(self.show_adjusted)
+                self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.adjustments)
+            self.adjustments.show()
+            # null while the image is shown in tiles
+            self.adjust_image(self.m_scene.pixmap_item.image)
+        elif self.adjustments is not None:
+            image = self.adjustments.adjuster.image
+            self.adjustments.set_image(QtGui.QImage())
+            self.adjustments.hide()
+            if not image.isNull():
+                self.m_scene.pixmap_item.set_image(image)
+
+    def adjust_image(self, image):
+        """ Apply the adjustments of the panel to image, just shown, a null image when it is shown in tiles """
+        if self.adjustments is not None and self.adjustAct.isChecked():
+            self.adjustments.set_image(image, min(1.0, self.m_view.current_zoom()))
+
+    def show_adjusted(self, image, full):
+        if full:
+            self.m_scene.pixmap_item.set_image(image)
+        else:
+            self.m_scene.pixmap_item.set_preview(image)
+
+    def timingHud(self, visible):
+        """ Show the stage timings over the image, recording them while shown """
+        tracer.enabled = visible or self.trace_at_start
+        self.hud.setVisible(visible)
+
+    def export_trace(self):
+        """ Save the recorded stage timings as a Chrome trace """
+        if not tracer.events:
+            self.statusBar().showMessage("No timings recorded, show the timing HUD or set IMAGE_VIEWER_TRACE=1", 5000)
+            return
+        fname, _ = QFileDialog.getSaveFileName(self, "Export Trace", "viewer_trace.json",
+                "Chrome trace (*.json)", options=QFileDialog.DontUseNativeDialog)
+        if not fname:
+            return
+        try:
+            tracer.export_chrome_trace(fname)
+        except OSError as e:
+            QMessageBox.warning(self, "Export Trace", "Cannot write %s: %s" % (fname, e))
+            return
+        self.statusBar().showMessage("Saved %d spans to %s" % (len(tracer.events), fname), 5000)
+
+    def closeEvent(self, event):
+        # the edits first, nothing about the session may keep them from the disk
+        self.save_annotations()
+        self.writer.flush()
+        try:
+            save_session(self.session_state())
+        except OSError as e:
+            print("Cannot save the session: %s" % e, file=sys.stderr)
+        self.stop_scan()
+        self.stop_watching_images()
+        self.stop_indexer()
+        if self.validation is not None:
+            self.validation.shutdown()
+        if self.adjustments is not None:
+            self.adjustments.shutdown()
+        self.evaluate_timer.stop()
+        for evaluator in self.findChildren(EvaluationRunner):
+            evaluator.cancel()
+        for evaluator in self.findChildren(EvaluationRunner):
+            # cancelling is polled every 0.1 s
+            evaluator.wait(2000)
+        for lister in self.findChildren(FolderLister):
+            # a single listing of the folder
+            lister.wait(2000)
+        if self.index_builder is not None:
+            self.index_builder.wait()
+        self.loader.shutdown()
+        self.files.shutdown()
+        if self.thumbnails is not None:
+            self.thumbnails.shutdown()
+        super(AnnotationWindow, self).closeEvent(event)
+
     def about(self):
         QMessageBox.about(self, "About Image Viewer",
                 "<p>This <b>Annotation Viewer</b> shows how to load "
@@ -359,13 +1378,27 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.gtAct = QAction("Choose Ground &Truth Folder", self, shortcut="Ctrl+T",
                 triggered=self.ground_truth_dir)
 
+        self.openArchiveAct = QAction("Open Images Ar&chive...", self, shortcut="Ctrl+Shift+O",
+                triggered=self.open_archive)
+
+        self.gtArchiveAct = QAction("Choose Ground Truth Archi&ve or JSON File...", self,
+                triggered=self.ground_truth_archive)
+
+        self.indexAct = QAction("&Index Ground Truth", self, enabled=False,
+                triggered=self.build_gt_index)
+
+        self.predAct = QAction("Choose &Predictions Folder...", self, shortcut="Ctrl+Shift+P",
+                triggered=self.predictions_dir)
+
         self.exitAct = QAction("E&xit", self, shortcut="Ctrl+Q",
                 triggered=self.close)
 
-        self.zoomInAct = QAction("Zoom &In (5%)", self, shortcut="Ctrl++",
+        # a zoom level is 2 ** (1 / ZOOM_STEPS) times the previous one
+        step = 2.0 ** (1.0 / ZOOM_STEPS)
+        self.zoomInAct = QAction("Zoom &In (+%d%%)" % round(100 * (step - 1)), self, shortcut="Ctrl++",
                 enabled=False, triggered=self.m_view.zoomIn)
 
-        self.zoomOutAct = QAction("Zoom &Out (5%)", self, shortcut="Ctrl+-",
+        self.zoomOutAct = QAction("Zoom &Out (-%d%%)" % round(100 * (1 - 1 / step)), self, shortcut="Ctrl+-",
                 enabled=False, triggered=self.m_view.zoomOut)
 
         self.normalSizeAct = QAction("&Normal Size", self, shortcut="Ctrl+S",
@@ -374,11 +1407,31 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.fitToWindowAct = QAction("&Fit to Window", self, enabled=False,
                 shortcut="Ctrl+F", triggered=self.fitToWindow)
 
+        self.thumbnailAct = QAction("&Thumbnail Grid", self, checkable=True,
+                shortcut="Ctrl+Shift+G", toggled=self.thumbnailGrid)
+
+        self.hudAct = QAction("Timing &HUD", self, checkable=True,
+                shortcut="Ctrl+Shift+T", toggled=self.timingHud)
+
+        self.adjustAct = QAction("Image &Adjustments", self, checkable=True,
+                shortcut="Ctrl+Shift+A", toggled=self.imageAdjustments)
+
+        self.validateAct = QAction("&Validate Ground Truth", self, shortcut="Ctrl+Shift+V",
+                enabled=False, triggered=self.validate)
+
+        self.sortHmeanAct = QAction("Sort Images by &H-mean", self, checkable=True, enabled=False,
+                toggled=self.sortByHmean)
+
+        self.traceAct = QAction("Export T&race...", self, triggered=self.export_trace)
+
         self.aboutAct = QAction("&About", self, triggered=self.about)
 
         self.aboutQtAct = QAction("About &Qt", self,
                 triggered=QApplication.instance().aboutQt)
         
+        self.saveAct = QAction("&Save Annotations", self, shortcut="Ctrl+Shift+S",
+                enabled=False, triggered=self.save_annotations)
+
         self.polygonAct = QAction("Insert Polygon", self, shortcut="Ctrl+G", 
                 enabled=False, 
                 triggered=partial(self.m_scene.setCurrentInstruction, 
@@ -388,7 +1441,14 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         """ Create Menus and place Actions inside them"""
         self.fileMenu = QMenu("&File", self)
         self.fileMenu.addAction(self.gtAct)
+        self.fileMenu.addAction(self.gtArchiveAct)
+        self.fileMenu.addAction(self.indexAct)
+        self.fileMenu.addAction(self.validateAct)
+        self.fileMenu.addAction(self.predAct)
         self.fileMenu.addAction(self.openAct)
+        self.fileMenu.addAction(self.openArchiveAct)
+        self.fileMenu.addAction(self.saveAct)
+        self.fileMenu.addAction(self.traceAct)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.exitAct)
 
@@ -398,6 +1458,12 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.viewMenu.addAction(self.normalSizeAct)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.fitToWindowAct)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.thumbnailAct)
+        self.viewMenu.addAction(self.hudAct)
+        self.viewMenu.addAction(self.adjustAct)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.sortHmeanAct)
 
         self.helpMenu = QMenu("&Help", self)
         self.helpMenu.addAction(self.aboutAct)
@@ -419,6 +1485,8 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.normalSizeAct.setEnabled(active)
         self.fitToWindowAct.setEnabled(active)
         self.polygonAct.setEnabled(active)
+        self.saveAct.setEnabled(active and self.gt_dir is not None)
+        self.validateAct.setEnabled(active and self.gt_dir is not None)
 
     def connect_buttons(self):
         """ Specify which item triggers which functions"""
@@ -426,35 +1494,41 @@ class AnnotationWindow(QtWidgets.QMainWindow):
         self.ui.pushButton_zoomout.clicked.connect(self.m_view.zoomOut)
         self.ui.pushButton_prev.clicked.connect(self.prev_image)
         self.ui.pushButton_next.clicked.connect(self.next_image)
-        self.ui.listWidget_images.itemClicked.connect(self.imageSelected)
-        self.ui.listWidget_images.itemSelectionChanged.connect(self.imageSelected)
+        # clicks, key presses and next/prev all change the current row, loads happen there
+        self.navigation = NavigationController(self.ui.listView_images, self.open_image,
+                self.loader, self.images, parent=self)
         self.ui.checkBox_poly.clicked.connect(self.polygonsVisibility)
         self.ui.checkBox_text.clicked.connect(self.textVisibility)
+        # searching waits for a pause in the typing
+        self.search_timer = QtCore.QTimer(self, singleShot=True, interval=200, timeout=self.search)
+        self.ui.lineEdit_search.textChanged.connect(self.search_timer.start)
+        self.ui.lineEdit_search.setEnabled(False)
 
     def polygonsVisibility(self):
-        if self.ui.checkBox_poly.isChecked():
-            for poly in self.polygons:
+        visible = self.ui.checkBox_poly.isChecked()
+        if self.gt_layer is not None:
+            self.gt_layer.set_polygons_visible(visible)
+        if self.pred_layer is not None:
+            self.pred_layer.set_polygons_visible(visible)
+        for poly in self.edited_polygons.values():
+            if visible:
                 poly.make_visible()
-        else:
-            for poly in self.polygons:
+            else:
                 poly.make_invisible()
 
     def textVisibility(self):
-        visible = self.ui.checkBox_text.isChecked()
-        for text in self.texts:
-            text.setVisible(visible)
-
-    def imageSelected(self):
-        self.img_index = self.ui.listWidget_images.currentRow()
-        self.open_image(self.img_index)
+        if self.gt_layer is not None:
+            self.gt_layer.set_texts_visible(self.ui.checkBox_text.isChecked())
 
     def next_image(self):
-        if self.img_index < len(self.images)-1:
-            self.ui.listWidget_images.setCurrentRow(self.img_index+1)
+        row = self.ui.listView_images.currentIndex().row()
+        if row < len(self.images)-1:
+            self.ui.listView_images.setCurrentIndex(self.images.index(row+1))
 
     def prev_image(self):
-        if self.img_index > 0:
-            self.ui.listWidget_images.setCurrentRow(self.img_index-1)
+        row = self.ui.listView_images.currentIndex().row()
+        if row > 0:
+            self.ui.listView_images.setCurrentIndex(self.images.index(row-1))
     
 
 if __name__ == '__main__':
@@ -463,5 +1537,6 @@ if __name__ == '__main__':
     app = QtWidgets.QApplication(sys.argv)
     w = AnnotationWindow()
     w.resize(640, 480)
+    w.restore_session()
     w.show()
     sys.exit(app.exec_())
\ No newline at end of file
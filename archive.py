@@ -0,0 +1,206 @@
+""" Reading datasets straight from ZIP and uncompressed TAR archives.
+
+    A member of an archive is addressed with a path going through the
+    archive as if it was a folder, /data/ch4_training_images.zip/img_1.jpg.
+    The offsets of the members are read from the archive once and cached,
+    members are then read from a memory map of the archive, inflating the
+    deflated ZIP members in memory. Nothing is extracted to the disk.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import tarfile
+import threading
+import weakref
+import zipfile
+import zlib
+from collections import namedtuple
+
+from cache_paths import cache_file
+
+ARCHIVE_SUFFIXES = (".zip", ".tar")
+INDEX_VERSION = 1
+
+_ARCHIVE_IN_PATH = re.compile(r"\.(zip|tar)(?=[/\\]|$)", re.IGNORECASE)
+_ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+
+# what thumbnail and cache keys need from os.stat, for members
+MemberStat = namedtuple("MemberStat", "st_size st_mtime_ns")
+
+
+class ArchiveError(OSError):
+    pass
+
+
+def is_archive(path):
+    path = str(path)
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def split_archive_path(path):
+    """ (archive, member) of a path going through an archive, None for other paths """
+    path = str(path)
+    for match in _ARCHIVE_IN_PATH.finditer(path):
+        archive = path[:match.end()]
+        if os.path.isfile(archive):
+            member = path[match.end() + 1:].replace("\\", "/")
+            return archive, member
+    return None
+
+
+def _zip_members(path, mm):
+    members = []
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            if info.is_dir() or info.flag_bits & 0x1:
+                # folders and encrypted members
+                continue
+            signature, name_len, extra_len = _ZIP_LOCAL_HEADER.unpack_from(mm, info.header_offset)
+            if signature != b"PK\x03\x04":
+                raise ArchiveError("Bad local header for %s in %s" % (info.filename, path))
+            offset = info.header_offset + _ZIP_LOCAL_HEADER.size + name_len + extra_len
+            members.append((info.filename, offset, info.compress_size, info.file_size, info.compress_type))
+    return members
+
+
+def _tar_members(path):
+    members = []
+    try:
+        with tarfile.open(path, "r:") as t:
+            for info in t:
+                if info.isfile():
+                    # tar . creates ./name members
+                    name = info.name[2:] if info.name.startswith("./") else info.name
+                    members.append((name, info.offset_data, info.size, info.size, zipfile.ZIP_STORED))
+    except tarfile.ReadError as e:
+        raise ArchiveError("%s cannot be read in place, only uncompressed tar archives can: %s" % (path, e))
+    return members
+
+
+def _close_archive(f, mm):
+    if isinstance(mm, mmap.mmap):
+        mm.close()
+    f.close()
+
+
+class Archive(object):
+    """ Random access to the members of a ZIP or uncompressed TAR archive.
+
+        The memory map and the file are closed by close, or once the Archive
+        is not used anymore, which is how an Archive replaced in open after
+        its file changed is closed when the readers still using it are done.
+    """
+
+    _open = {}
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """ The shared Archive of path, reopened when the file changed """
+        path = os.path.abspath(str(path))
+        st = os.stat(path)
+        with cls._open_lock:
+            archive = cls._open.get(path)
+            if archive is None or archive.mtime_ns != st.st_mtime_ns or archive.size != st.st_size:
+                archive = cls._open[path] = cls(path)
+            return archive
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, "rb")
+        st = os.fstat(self._file.fileno())
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self._finalizer = weakref.finalize(self, _close_archive, self._file, self._mm)
+        self.members = {}
+        for name, offset, csize, size, method in self._member_index():
+            self.members[name] = (offset, csize, size, method)
+        self._by_basename = {}
+        for name in self.members:
+            self._by_basename.setdefault(name.rsplit("/", 1)[-1], []).append(name)
+
+    def _member_index(self):
+        """ Member offsets from the cached index, built when the archive changed """
+        index_file = str(cache_file("archives", self.path, ".json"))
+        try:
+            with open(index_file, encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached["version"], cached["mtime_ns"], cached["size"]) == (INDEX_VERSION, self.mtime_ns, self.size):
+                return cached["members"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        if self.path.lower().endswith(".zip"):
+            try:
+                members = _zip_members(self.path, self._mm)
+            except (zipfile.BadZipFile, struct.error) as e:
+                raise ArchiveError("Cannot read %s: %s" % (self.path, e))
+        else:
+            members = _tar_members(self.path)
+        try:
+            with open(index_file + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "mtime_ns": self.mtime_ns, "size": self.size,
+                        "members": members}, f)
+            os.replace(index_file + ".tmp", index_file)
+        except OSError:
+            pass
+        return members
+
+    def close(self):
+        self._finalizer()
+
+    def names(self):
+        """ Names of the file members in archive order """
+        return list(self.members)
+
+    def find(self, name):
+        """ Member called name, or the only one with the base name of name, or None """
+        if name in self.members:
+            return name
+        found = self._by_basename.get(name.rsplit("/", 1)[-1], ())
+        return found[0] if len(found) == 1 else None
+
+    def stat(self, name):
+        member = self.find(name)
+        if member is None:
+            raise FileNotFoundError("No member %s in %s" % (name, self.path))
+        return MemberStat(self.members[member][2], self.mtime_ns)
+
+    def read(self, name):
+        """ Content of the member called name """
+        member = self.find(name)
+        if member is None:
+            raise FileNotFoundError("No member %s in %s" % (name, self.path))
+        offset, csize, size, method = self.members[member]
+        data = self._mm[offset:offset + csize]
+        if method == zipfile.ZIP_STORED:
+            return data
+        if method == zipfile.ZIP_DEFLATED:
+            data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(data, size)
+            if len(data) != size:
+                raise ArchiveError("Corrupt member %s in %s" % (member, self.path))
+            return data
+        # rarely used methods go through zipfile
+        with zipfile.ZipFile(self.path) as z:
+            return z.read(member)
+
+
+def read_bytes(path):
+    """ Content of a file or of an archive member """
+    split = split_archive_path(path)
+    if split is None:
+        with open(str(path), "rb") as f:
+            return f.read()
+    archive, member = split
+    return Archive.open(archive).read(member)
+
+
+def stat_path(path):
+    """ os.stat of a file, size and archive modification time of an archive member """
+    split = split_archive_path(path)
+    if split is None:
+        return os.stat(str(path))
+    archive, member = split
+    return Archive.open(archive).stat(member)
@@ -0,0 +1,226 @@
+""" Render ground truth overlays of a whole image folder without opening the viewer.
+
+    python batch_export.py IMG_DIR GT_DIR OUT_DIR [--workers N] [--format jpg]
+    python batch_export.py IMG_DIR GT_DIR OUT_DIR --contact-sheet 6x4
+
+    Images are rendered by a pool of worker processes with the same drawing
+    code as the viewer. Existing outputs newer than their inputs are kept, so
+    an interrupted export continues where it stopped when run again. Contact
+    sheet pages are also rendered again when the images on them changed,
+    which is told by the digest of their names kept next to every page.
+"""
+import argparse
+import glob
+import hashlib
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtGui
+
+from gt_layer import label_rects_of, paint_annotations, polygons_of
+from icdar_gt import gt_name, read_icdar2015_gt
+from image_list import scan_images
+
+_app = None
+
+
+def _init_worker():
+    """ Every worker process needs its own application for fonts and image plugins """
+    global _app
+    if QtGui.QGuiApplication.instance() is None:
+        _app = QtGui.QGuiApplication([sys.argv[0], "-platform", "offscreen"])
+
+
+def render_overlay(image_path, gt_path, show_polygons=True, show_texts=True):
+    """ The image with its ground truth drawn like the viewer does, None if it cannot be read """
+    image = QtGui.QImage(image_path)
+    if image.isNull():
+        return None
+    image = image.convertToFormat(QtGui.QImage.Format_RGB32)
+    gt = read_icdar2015_gt(gt_path) if gt_path else None
+    if gt:
+        font = QtGui.QFont()
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        paint_annotations(painter, polygons_of(gt), gt.texts, label_rects_of(gt, font), font,
+                QtGui.QPen(QtGui.QColor("green"), 2), show_polygons, show_texts)
+        painter.end()
+    return image
+
+
+def _save(image, path):
+    """ Write through a temporary file so an interrupted run never leaves a partial output """
+    tmp = "%s.part%s" % os.path.splitext(path)
+    if not image.save(tmp):
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def _is_done(output, inputs):
+    try:
+        done = os.stat(output).st_mtime
+    except OSError:
+        return False
+    for path in inputs:
+        try:
+            if os.stat(path).st_mtime > done:
+                return False
+        except OSError:
+            pass
+    return True
+
+
+def output_name(name, fmt):
+    """ Name of the overlay of the image called name, keeping its extension so a.jpg and a.png do not collide """
+    return name.replace("/", "_") + "." + fmt
+
+
+def members_digest(items, options):
+    """ Digest of the images on a contact sheet page and of how they are drawn """
+    members = [options["polygons"], options["texts"], options["thumb"]] + list(items)
+    return hashlib.sha1(repr(members).encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def _members_path(output):
+    return output + ".members"
+
+
+def _read_members(output):
+    try:
+        with open(_members_path(output), encoding="ascii") as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def _write_members(output, digest):
+    path = _members_path(output)
+    tmp = path + ".part"
+    try:
+        with open(tmp, "w", encoding="ascii") as f:
+            f.write(digest + "\n")
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    return True
+
+
+def export_image(task):
+    """ Render one overlay, returns (name, status, seconds) """
+    image_path, gt_path, output, options = task
+    start = time.perf_counter()
+    if not options["force"] and _is_done(output, (image_path, gt_path)):
+        return os.path.basename(image_path), "skipped", 0.0
+    image = render_overlay(image_path, gt_path, options["polygons"], options["texts"])
+    if image is None or not _save(image, output):
+        return os.path.basename(image_path), "failed", time.perf_counter() - start
+    return os.path.basename(image_path), "done", time.perf_counter() - start
+
+
+def export_sheet(task):
+    """ Render one contact sheet page of thumbnails, returns (name, status, seconds) """
+    items, output, options = task
+    start = time.perf_counter()
+    name = os.path.basename(output)
+    digest = members_digest(items, options)
+    if (not options["force"] and _read_members(output) == digest
+            and _is_done(output, [p for pair in items for p in pair])):
+        return name, "skipped", 0.0
+    cols, rows, thumb = options["cols"], options["rows"], options["thumb"]
+    label_height = 16
+    sheet = QtGui.QImage(cols * thumb, rows * (thumb + label_height), QtGui.QImage.Format_RGB32)
+    sheet.fill(QtGui.QColor("white"))
+    painter = QtGui.QPainter(sheet)
+    painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+    for i, (image_path, gt_path) in enumerate(items):
+        x, y = (i % cols) * thumb, (i // cols) * (thumb + label_height)
+        image = render_overlay(image_path, gt_path, options["polygons"], options["texts"])
+        if image is not None:
+            image = image.scaled(thumb, thumb, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+            painter.drawImage(x + (thumb - image.width()) // 2, y + (thumb - image.height()) // 2, image)
+        painter.setPen(QtGui.QColor("black"))
+        painter.drawText(QtCore.QRectF(x, y + thumb, thumb, label_height),
+                QtCore.Qt.AlignCenter | QtCore.Qt.TextSingleLine, os.path.basename(image_path))
+    painter.end()
+    status = "done" if _save(sheet, output) and _write_members(output, digest) else "failed"
+    return name, status, time.perf_counter() - start
+
+
+def make_tasks(args, images):
+    options = {"force": args.force, "polygons": not args.no_polygons, "texts": not args.no_texts}
+    pairs = [(os.path.join(args.img_dir, name), os.path.join(args.gt_dir, gt_name(name)))
+            for name in images]
+    if not args.contact_sheet:
+        return export_image, [(image, gt, os.path.join(args.out_dir, output_name(name, args.format)), options)
+                for name, (image, gt) in zip(images, pairs)]
+    cols, rows = (int(v) for v in args.contact_sheet.lower().split("x"))
+    options.update(cols=cols, rows=rows, thumb=args.thumb)
+    per_page = cols * rows
+    pages = int(math.ceil(len(pairs) / float(per_page)))
+    return export_sheet, [(pairs[p * per_page:(p + 1) * per_page],
+            os.path.join(args.out_dir, "sheet_%05d.%s" % (p, args.format)), options)
+            for p in range(pages)]
+
+
+def remove_stale_sheets(out_dir, pages, fmt):
+    """ Remove the pages past the last one, left by an export of more images """
+    for path in glob.glob(os.path.join(glob.escape(out_dir), "sheet_*.%s" % fmt)):
+        page = os.path.basename(path)[len("sheet_"):-len(fmt) - 1]
+        if page.isdigit() and int(page) >= pages:
+            for stale in (path, _members_path(path)):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("img_dir")
+    parser.add_argument("gt_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+            help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--format", choices=("png", "jpg"), default="png")
+    parser.add_argument("--contact-sheet", metavar="COLSxROWS",
+            help="write pages of thumbnails instead of one overlay per image")
+    parser.add_argument("--thumb", type=int, default=256, help="thumbnail size of contact sheets")
+    parser.add_argument("--no-polygons", action="store_true")
+    parser.add_argument("--no-texts", action="store_true")
+    parser.add_argument("--force", action="store_true", help="render outputs that already exist again")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every rendered output")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    images = sorted(scan_images(args.img_dir))
+    function, tasks = make_tasks(args, images)
+    if args.contact_sheet:
+        remove_stale_sheets(args.out_dir, len(tasks), args.format)
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    busy = 0.0
+    start = last_report = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(max(1, args.workers), initializer=_init_worker) as pool:
+        for i, (name, status, seconds) in enumerate(pool.imap_unordered(function, tasks), 1):
+            counts[status] += 1
+            busy += seconds
+            if args.verbose or status == "failed":
+                print("%s %s %.1f ms" % (status, name, 1e3 * seconds))
+            now = time.perf_counter()
+            if now - last_report > 5 or i == len(tasks):
+                last_report = now
+                rendered = max(counts["done"] + counts["failed"], 1)
+                print("[%d/%d] %.1f outputs/s, %.1f ms per output per worker" % (i, len(tasks),
+                        i / (now - start), 1e3 * busy / rendered), flush=True)
+    print("done %(done)d, skipped %(skipped)d, failed %(failed)d" % counts)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+""" Time the image adjustments at full resolution and at the resolution of a preview.
+
+    python benchmarks/bench_adjust.py [--size WxH] [--scale S] [--repeat N]
+
+    The image is random noise over a gradient, the timings do not depend on
+    the content except for the equalization histograms.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def noise_image(width, height):
+    import numpy as np
+    from PyQt5 import QtGui
+    from image_adjust import pixels
+
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 128, width, dtype=np.float32)
+    px = pixels(image, writable=True)
+    for start in range(0, height, 256):
+        band = px[start:start + 256]
+        band[...] = rng.integers(0, 64, band.shape, dtype=np.uint8)
+        band[..., :3] += gradient[None, :, None].astype(np.uint8)
+        band[..., 3] = 255
+    return image
+
+
+def bench(name, image, function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(image)
+        times.append(time.perf_counter() - start)
+    print("%-22s %6.1f MP %9.1f ms" % (name, image.width() * image.height() / 1e6, 1e3 * min(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="4000x3000", help="image size (default: 4000x3000)")
+    parser.add_argument("--scale", type=float, default=0.25, help="display scale of the preview (default: 0.25)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from PyQt5 import QtCore
+    from image_adjust import IDENTITY, apply_tone, equalize
+
+    width, height = (int(v) for v in args.size.split("x"))
+    full = noise_image(width, height)
+    preview = full.scaled(max(1, int(width * args.scale)), max(1, int(height * args.scale)),
+            QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+    settings = [
+        ("brightness/contrast", IDENTITY._replace(brightness=0.1, contrast=1.5)),
+        ("gamma", IDENTITY._replace(gamma=0.6)),
+        ("red channel", IDENTITY._replace(channel="red")),
+        ("grayscale", IDENTITY._replace(grayscale=True)),
+    ]
+    for image in (preview, full):
+        for name, adjustments in settings:
+            bench(name, image, lambda image: apply_tone(image, adjustments), args.repeat)
+        bench("equalize", image, equalize, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
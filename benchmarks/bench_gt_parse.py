@@ -0,0 +1,61 @@
+""" Compare loading ICDAR 2015 ground truth with pandas, the text parser and the index.
+
+    python benchmarks/bench_gt_parse.py GT_DIR [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icdar_gt import GtIndex, read_icdar2015_gt
+
+
+def read_with_pandas(fname):
+    """ The former implementation of AnnotationWindow.read_icdar2015_gt """
+    import pandas as pd
+    return pd.read_csv(fname, header=None).values.tolist()
+
+
+def bench(name, load, names, repeat):
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for fname in names:
+            try:
+                load(fname)
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    calls = repeat * len(names)
+    print("%-8s %8.1f us/file %10.0f files/s  %d failures" % (name,
+            1e6 * elapsed / calls, calls / elapsed, failures // repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("gt_dir")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = sorted(n for n in os.listdir(args.gt_dir) if n.endswith(".txt"))
+    paths = [os.path.join(args.gt_dir, n) for n in names]
+    print("%d ground truth files" % len(names))
+
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+    print("import pandas %.1f ms" % (1e3 * (time.perf_counter() - start)))
+    bench("pandas", read_with_pandas, paths, args.repeat)
+    bench("parser", read_icdar2015_gt, paths, args.repeat)
+
+    start = time.perf_counter()
+    index = GtIndex.build(args.gt_dir)
+    print("index build %.1f ms" % (1e3 * (time.perf_counter() - start)))
+    bench("index", index.get, names, args.repeat)
+    bench("index*", lambda name: index.get(name, check=False), names, args.repeat)
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
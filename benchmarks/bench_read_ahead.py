@@ -0,0 +1,94 @@
+""" Time stepping through images on simulated network storage, with and without read-ahead.
+
+    python benchmarks/bench_read_ahead.py [--latency S] [--bandwidth MB/s] [--dwell MS]
+            [--images N] [--size WxH] [--boxes N] [--img-dir DIR --gt-dir DIR]
+
+    Every file system call of the viewer goes through byte_cache.SlowFileSystem,
+    which waits --latency seconds and reads at --bandwidth. The headless viewer
+    shows every image for --dwell milliseconds, like someone checking them, and
+    the time taken by next_image is reported with the number of stats and reads
+    made on the GUI thread.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def step_through(app, img_dir, gt_dir, fs, read_ahead, dwell):
+    from PyQt5 import QtTest
+    from annotation_and_image_viewer import AnnotationWindow
+
+    w = AnnotationWindow()
+    w.files.fs = fs
+    if not read_ahead:
+        w.loader.ahead = w.loader.behind = w.loader.read_ahead = 0
+    w.set_gt_dir(gt_dir)
+    w.open_dir(img_dir)
+    while w.scanner is not None:
+        app.processEvents()
+        time.sleep(0.01)
+    w.ui.listView_images.setCurrentIndex(w.images.index(0))
+    QtTest.QTest.qWait(dwell)
+
+    gui = threading.get_ident()
+    calls = {"stat": 0, "read": 0}
+    stat, read = fs.stat, fs.read
+
+    def counted(kind, call):
+        def wrapper(path):
+            if threading.get_ident() == gui:
+                calls[kind] += 1
+            return call(path)
+        return wrapper
+
+    fs.stat, fs.read = counted("stat", stat), counted("read", read)
+    times = []
+    for _ in range(len(w.images) - 1):
+        start = time.perf_counter()
+        w.next_image()
+        times.append(time.perf_counter() - start)
+        QtTest.QTest.qWait(dwell)
+    fs.stat, fs.read = stat, read
+    w.close()
+    return sorted(times), calls
+
+
+def main():
+    from synthetic import add_arguments
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per call (default: 0.02)")
+    parser.add_argument("--bandwidth", type=float, default=50, help="MB/s (default: 50)")
+    parser.add_argument("--dwell", type=int, default=300, help="milliseconds per image (default: 300)")
+    add_arguments(parser)
+    parser.add_argument("--img-dir")
+    parser.add_argument("--gt-dir")
+    args = parser.parse_args()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["XDG_CACHE_HOME"] = os.path.join(tmp, "cache")
+        from PyQt5 import QtWidgets
+        from byte_cache import SlowFileSystem
+        from synthetic import dataset_from_args
+
+        app = QtWidgets.QApplication(sys.argv[:1])
+        img_dir, gt_dir = args.img_dir, args.gt_dir
+        if img_dir is None:
+            img_dir, gt_dir = dataset_from_args(os.path.join(tmp, "data"), args)
+        print("%-12s %9s %9s %9s %11s %11s" % ("", "p50 ms", "p90 ms", "max ms", "GUI stats", "GUI reads"))
+        for read_ahead in (False, True):
+            fs = SlowFileSystem(args.latency, args.bandwidth * 1e6)
+            times, calls = step_through(app, img_dir, gt_dir, fs, read_ahead, args.dwell)
+            print("%-12s %9.1f %9.1f %9.1f %11d %11d" % ("read-ahead" if read_ahead else "cold reads",
+                    1e3 * times[len(times) // 2], 1e3 * times[int(len(times) * 0.9)], 1e3 * times[-1],
+                    calls["stat"], calls["read"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+""" Time from process start to the image of the restored session on screen.
+
+    python benchmarks/bench_startup.py [IMG_DIR GT_DIR] [--runs N] [--budget MS]
+
+    Without folders a small synthetic dataset is made. The viewer is started
+    in fresh processes with a session pointing at the dataset, using a
+    temporary cache folder, and the exit status is 1 when the median startup
+    time is over the budget or a feature module was imported before the
+    image was painted. tests/test_startup.py runs the same check.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# default budget from process start to the restored image painted, in milliseconds
+BUDGET = 300
+# modules of features used later, imported on first use
+LAZY_MODULES = ("evaluation", "validation_panel", "adjustments_panel", "image_adjust", "transcription_index",
+        "folder_watch", "thumbnails", "tiled_image", "numpy", "sqlite3", "pandas")
+
+CHILD = r"""
+import json, sys, time
+start = time.time()
+sys.path.insert(0, sys.argv[1])
+from PyQt5 import QtWidgets
+import annotation_and_image_viewer as viewer
+imported = time.time()
+app = QtWidgets.QApplication(sys.argv[:1])
+w = viewer.AnnotationWindow()
+w.resize(640, 480)
+created = time.time()
+w.restore_session()
+w.show()
+deadline = time.time() + 10
+while w.m_scene.pixmap_item.pixmap().isNull() and w.m_scene.tiled_item is None:
+    app.processEvents()
+    if time.time() > deadline:
+        sys.exit("no image shown")
+w.m_view.viewport().repaint()
+shown = time.time()
+print(json.dumps({"start": start, "import": imported, "window": created, "shown": shown,
+        "modules": sorted(sys.modules)}))
+w.close()
+"""
+
+
+def run_once(env):
+    launched = time.time()
+    out = subprocess.run([sys.executable, "-c", CHILD, ROOT], env=env, check=True,
+            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    times = json.loads(out.splitlines()[-1])
+    return {
+        "interpreter": times["start"] - launched,
+        "import": times["import"] - times["start"],
+        "window": times["window"] - times["import"],
+        "restore": times["shown"] - times["window"],
+        "total": times["shown"] - launched,
+        "modules": times["modules"],
+    }
+
+
+def measure(tmp, img_dir=None, gt_dir=None, runs=5):
+    """ (cold run, following runs) of the viewer restoring a session on img_dir and gt_dir,
+        with files and caches under the folder tmp
+    """
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.join(tmp, "cache"))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ.update(env)
+    from session import save_session
+    from synthetic import make_dataset
+
+    if img_dir is None:
+        img_dir, gt_dir = make_dataset(os.path.join(tmp, "data"), n_images=200)
+    names = sorted(os.listdir(img_dir))
+    save_session({"img_dir": os.path.abspath(img_dir),
+            "gt_dir": os.path.abspath(gt_dir) if gt_dir else None,
+            "image": names[len(names) // 2], "zoom": 1.0,
+            "show_polygons": True, "show_texts": True})
+
+    # the first run lists the folder, the following ones reuse the listing
+    cold = run_once(env)
+    return cold, [run_once(env) for _ in range(runs)]
+
+
+def eager_modules(run):
+    """ The feature modules imported before the image was painted """
+    return sorted(set(LAZY_MODULES) & set(run["modules"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("img_dir", nargs="?")
+    parser.add_argument("gt_dir", nargs="?")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=BUDGET, help="milliseconds (default: %d)" % BUDGET)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cold, runs = measure(tmp, args.img_dir, args.gt_dir, args.runs)
+
+    print("%-12s %8s %8s" % ("phase", "cold", "median"))
+    for phase in ("interpreter", "import", "window", "restore", "total"):
+        print("%-12s %6.1f ms %6.1f ms" % (phase, 1e3 * cold[phase],
+                1e3 * statistics.median(run[phase] for run in runs)))
+    status = 0
+    eager = eager_modules(runs[-1])
+    if eager:
+        print("imported before the first paint: %s" % ", ".join(eager))
+        status = 1
+    total = 1e3 * statistics.median(run["total"] for run in runs)
+    if total > args.budget:
+        print("startup %.1f ms is over the %.0f ms budget" % (total, args.budget))
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    sys.exit(main())
@@ -0,0 +1,259 @@
+""" Latency of the viewer hot paths on a synthetic dataset, with a comparison of runs.
+
+    python benchmarks/bench_viewer.py run [--images N] [--size WxH] [--boxes N]
+            [--text-len N] [--repeat N] [-o RESULTS.json]
+    python benchmarks/bench_viewer.py compare OLD.json NEW.json [--threshold PCT]
+
+    `run` makes a dataset in a temporary folder (or uses --img-dir/--gt-dir),
+    drives a headless AnnotationWindow through the real code paths and writes
+    the latency percentiles of every step and the peak RSS as JSON.
+    `compare` flags the steps whose median or 90th percentile got slower by
+    more than the threshold and exits with status 1 if there is any.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# differences below this many milliseconds are noise whatever the ratio
+MIN_DIFFERENCE_MS = 0.05
+
+
+def percentile(values, p):
+    """ Nearest rank percentile of sorted values """
+    index = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples):
+    values = sorted(1e3 * s for s in samples)
+    return {
+        "n": len(values),
+        "mean_ms": sum(values) / len(values),
+        "min_ms": values[0],
+        "p50_ms": percentile(values, 50),
+        "p90_ms": percentile(values, 90),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1],
+    }
+
+
+class Recorder(object):
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        yield
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+    def results(self):
+        return {name: summarize(samples) for name, samples in self.samples.items()}
+
+
+def peak_rss_mb():
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def bench(app, img_dir, gt_dir, repeat, recorder):
+    from PyQt5 import QtTest
+    import annotation_and_image_viewer as viewer
+    from gt_layer import GroundTruthLayer, label_rects_of
+    from image_cache import decode_image
+    from icdar_gt import gt_name, load_gt
+
+    def settle():
+        app.processEvents()
+
+    w = viewer.AnnotationWindow()
+    w.resize(1024, 768)
+    w.show()
+    settle()
+
+    for _ in range(repeat):
+        with recorder.time("files_with_extension"):
+            paths = w.files_with_extension(img_dir)
+    for path in paths:
+        with recorder.time("read_icdar2015_gt"):
+            w.read_icdar2015_gt(os.path.join(gt_dir, gt_name(path)))
+
+    # parts of open_image on their own
+    font = GroundTruthLayer(w.gt).font
+    for path in paths:
+        with recorder.time("open_image.decode"):
+            decode_image(str(path))
+        gt = load_gt(gt_dir, gt_name(path))
+        with recorder.time("open_image.text_placement"):
+            label_rects_of(gt, font)
+        with recorder.time("open_image.scene_build"):
+            layer = GroundTruthLayer(gt)
+            w.m_scene.addItem(layer)
+        w.m_scene.removeItem(layer)
+
+    w.set_gt_dir(gt_dir)
+    if w.indexer is not None:
+        w.indexer.wait()
+    w.open_dir(img_dir)
+    while w.scanner is not None:
+        settle()
+    settle()
+
+    # whole image changes with a cold decode cache, painted
+    def quiesce():
+        w.loader.cancel()
+        w.loader.pool.waitForDone()
+        w.loader.cache.clear()
+        settle()
+
+    for row in range(len(w.images)):
+        quiesce()
+        with recorder.time("open_image"):
+            w.open_image(row)
+            w.m_view.viewport().repaint()
+        with recorder.time("clear_scene"):
+            w.clear_scene()
+    w.open_image(0)
+    settle()
+
+    for i in range(repeat * 10):
+        with recorder.time("zoom"):
+            w.m_view.zoom(1.25 if i % 2 == 0 else 0.8)
+            w.m_view.viewport().repaint()
+    for i in range(repeat * 5):
+        w.normalSize()
+        with recorder.time("fitToWindow"):
+            w.fitToWindow()
+            w.m_view.viewport().repaint()
+
+    # one step at a time, waiting out the navigation debounce between steps
+    wait = w.navigation.timer.interval() + 20
+    w.ui.listView_images.setCurrentIndex(w.images.index(0))
+    for name, step in (("next_image", w.next_image), ("prev_image", w.prev_image)):
+        for _ in range(len(w.images) - 1):
+            QtTest.QTest.qWait(wait)
+            with recorder.time(name):
+                step()
+                w.m_view.viewport().repaint()
+    w.close()
+
+
+def run(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        # journal, listings and indexes go to the temporary folder
+        os.environ["XDG_CACHE_HOME"] = os.path.join(tmp, "cache")
+        from PyQt5 import QtCore, QtWidgets
+        from synthetic import dataset_from_args
+
+        app = QtWidgets.QApplication(sys.argv[:1])
+        img_dir, gt_dir = args.img_dir, args.gt_dir
+        if img_dir is None:
+            start = time.perf_counter()
+            img_dir, gt_dir = dataset_from_args(os.path.join(tmp, "data"), args)
+            print("dataset made in %.1fs" % (time.perf_counter() - start), file=sys.stderr)
+        recorder = Recorder()
+        bench(app, img_dir, gt_dir, args.repeat, recorder)
+
+    report = {
+        "meta": {
+            "images": args.images if args.img_dir is None else None,
+            "size": list(args.size) if args.img_dir is None else None,
+            "boxes": args.boxes if args.img_dir is None else None,
+            "text_len": args.text_len if args.img_dir is None else None,
+            "img_dir": args.img_dir,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "qt": QtCore.QT_VERSION_STR,
+            "machine": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": recorder.results(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print_results(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+def print_results(report):
+    print("%-28s %6s %9s %9s %9s %9s" % ("step", "n", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    for name, r in sorted(report["results"].items()):
+        print("%-28s %6d %9.2f %9.2f %9.2f %9.2f" % (name, r["n"], r["p50_ms"], r["p90_ms"],
+                r["p99_ms"], r["max_ms"]))
+    print("peak RSS %.1f MB" % report["peak_rss_mb"])
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    limit = 1 + args.threshold / 100.0
+    regressions = 0
+    print("%-28s %-6s %9s %9s %8s" % ("step", "stat", "old ms", "new ms", "change"))
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        if name not in old["results"] or name not in new["results"]:
+            print("%-28s only in %s" % (name, "new" if name in new["results"] else "old"))
+            continue
+        for stat in ("p50_ms", "p90_ms"):
+            a, b = old["results"][name][stat], new["results"][name][stat]
+            change = (b - a) / a if a > 0 else 0.0
+            flag = ""
+            if b > a * limit and b - a > MIN_DIFFERENCE_MS:
+                flag = "REGRESSION"
+                regressions += 1
+            elif a > b * limit and a - b > MIN_DIFFERENCE_MS:
+                flag = "faster"
+            print("%-28s %-6s %9.2f %9.2f %+7.1f%% %s" % (name, stat[:3], a, b, 100 * change, flag))
+    a, b = old["peak_rss_mb"], new["peak_rss_mb"]
+    flag = ""
+    if b > a * limit:
+        flag = "REGRESSION"
+        regressions += 1
+    print("%-28s %-6s %9.1f %9.1f %+7.1f%% %s" % ("peak RSS (MB)", "", a, b, 100 * (b - a) / a, flag))
+    if regressions:
+        print("%d regressions over %g%%" % (regressions, args.threshold))
+        return 1
+    return 0
+
+
+def main():
+    from synthetic import add_arguments
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="benchmark this tree")
+    add_arguments(run_parser)
+    run_parser.add_argument("--img-dir", help="use this dataset instead of a synthetic one")
+    run_parser.add_argument("--gt-dir")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("-o", "--output", help="JSON file of the results")
+    compare_parser = commands.add_parser("compare", help="flag regressions between two runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=10, help="percent")
+    args = parser.parse_args()
+    if args.command == "run":
+        return run(args)
+    if args.command == "compare":
+        return compare(args)
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    sys.exit(main())
@@ -0,0 +1,107 @@
+""" Synthetic ICDAR 2015 style datasets for the benchmarks.
+
+    python benchmarks/synthetic.py OUT_DIR [--images N] [--size WxH] [--boxes N] [--text-len N]
+
+    OUT_DIR/img holds JPEG images with a noisy background and drawn text boxes,
+    OUT_DIR/gt the gt_<stem>.txt files describing the boxes. The content only
+    depends on the seed so runs on different trees see the same data.
+"""
+import argparse
+import os
+import random
+import string
+
+from PyQt5 import QtCore, QtGui
+
+# some transcriptions are don't care boxes or contain commas, as in the real dataset
+DONT_CARE_RATE = 0.15
+COMMA_RATE = 0.05
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def make_background(width, height, rng):
+    """ Gradient with noise so JPEG decoding does work comparable to photos """
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    painter = QtGui.QPainter(image)
+    gradient = QtGui.QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QtGui.QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    gradient.setColorAt(1, QtGui.QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    painter.fillRect(0, 0, width, height, gradient)
+    for _ in range(width * height // 2000):
+        painter.setPen(QtGui.QColor(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        x, y = rng.randrange(width), rng.randrange(height)
+        painter.drawLine(x, y, x + rng.randrange(-20, 20), y + rng.randrange(-20, 20))
+    painter.end()
+    return image
+
+
+def make_boxes(width, height, n_boxes, text_len, rng):
+    """ (points, text) of n_boxes slightly rotated quadrilaterals inside the image """
+    boxes = []
+    for _ in range(n_boxes):
+        w = rng.randint(20, max(21, width // 6))
+        h = rng.randint(10, max(11, height // 20))
+        x = rng.randint(0, max(0, width - w - 1))
+        y = rng.randint(0, max(0, height - h - 1))
+        skew = rng.randint(-h // 3, h // 3)
+        points = [x, y + skew, x + w, y, x + w, y + h, x, y + h + skew]
+        if rng.random() < DONT_CARE_RATE:
+            text = "###"
+        else:
+            text = "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(text_len))
+            if rng.random() < COMMA_RATE:
+                text = text[:text_len // 2] + "," + text[text_len // 2:]
+        boxes.append((points, text))
+    return boxes
+
+
+def make_dataset(folder, n_images=100, size=(1280, 720), n_boxes=20, text_len=8, seed=0):
+    """ Write the dataset under folder and return its image and ground truth folders """
+    rng = random.Random(seed)
+    img_dir = os.path.join(str(folder), "img")
+    gt_dir = os.path.join(str(folder), "gt")
+    os.makedirs(img_dir, exist_ok=True)
+    os.makedirs(gt_dir, exist_ok=True)
+    width, height = size
+    # a few backgrounds are enough, the boxes drawn on them differ
+    backgrounds = [make_background(width, height, rng) for _ in range(min(n_images, 4))]
+    for i in range(n_images):
+        boxes = make_boxes(width, height, n_boxes, text_len, rng)
+        image = backgrounds[i % len(backgrounds)].copy()
+        painter = QtGui.QPainter(image)
+        painter.setPen(QtGui.QPen(QtGui.QColor("white"), 2))
+        for points, _ in boxes:
+            painter.drawPolygon(QtGui.QPolygonF([QtCore.QPointF(points[j], points[j + 1])
+                    for j in range(0, 8, 2)]))
+        painter.end()
+        image.save(os.path.join(img_dir, "img_%d.jpg" % i), "JPG", 90)
+        with open(os.path.join(gt_dir, "gt_img_%d.txt" % i), "w", encoding="utf-8-sig", newline="") as f:
+            for points, text in boxes:
+                f.write(",".join(str(v) for v in points) + "," + text + "\r\n")
+    return img_dir, gt_dir
+
+
+def add_arguments(parser):
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--size", type=parse_size, default=(1280, 720), help="WIDTHxHEIGHT")
+    parser.add_argument("--boxes", type=int, default=20, help="boxes per image")
+    parser.add_argument("--text-len", type=int, default=8, help="characters per transcription")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def dataset_from_args(folder, args):
+    return make_dataset(folder, args.images, args.size, args.boxes, args.text_len, args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    add_arguments(parser)
+    args = parser.parse_args()
+    img_dir, gt_dir = dataset_from_args(args.out_dir, args)
+    print(img_dir)
+    print(gt_dir)
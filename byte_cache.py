@@ -0,0 +1,381 @@
+""" Reading the raw bytes of files ahead of time, for datasets on slow network storage.
+
+    On NFS a single stat or open can take tens of milliseconds, and the viewer
+    reading an image and its ground truth file on the GUI thread freezes for
+    as long. ReadAhead fetches the files the user is about to look at in a
+    small pool of threads and keeps their bytes in a ByteCache, the decoders
+    and ground truth parsers then take them from memory.
+
+    Cached bytes are checked against the (mtime, size) of their file, with a
+    stat made at most every `fresh_for` seconds per file, about as long as NFS
+    clients cache file attributes themselves. Files known to change, like
+    the ground truth files the viewer writes, are invalidated. The optional
+    DiskTier keeps copies on the local disk within a size budget so that
+    files fetched in an earlier session do not go over the network again.
+    SlowFileSystem adds latency to every call to try all of this on a local disk.
+"""
+import os
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from PyQt5 import QtCore
+
+from archive import read_bytes, stat_path
+from cache_paths import cache_file, cache_root
+
+# default memory budget of the cached bytes
+DEFAULT_BUDGET = 128 * 1024 * 1024
+# default size budget of the local disk copies
+DEFAULT_DISK_BUDGET = 2 * 1024 * 1024 * 1024
+# larger files are read from their path when needed, never held in memory
+MAX_FILE_SIZE = 64 * 1024 * 1024
+
+# signature is the (mtime, size) of the file, None if it does not exist,
+# data None when it was not read, checked the time of the last stat
+Entry = namedtuple("Entry", "signature data checked")
+
+
+def signature_of(st):
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FileSystem(object):
+    """ Files and archive members, read straight from where they are """
+
+    def stat(self, path):
+        return stat_path(path)
+
+    def read(self, path):
+        return read_bytes(path)
+
+
+class SlowFileSystem(FileSystem):
+    """ Stand-in for network storage over the local files, for tests and benchmarks.
+        Every call waits `latency` seconds and reads are limited to `bandwidth`
+        bytes per second, calls are counted by kind in `calls`.
+    """
+
+    def __init__(self, latency=0.02, bandwidth=None, base=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.base = base if base is not None else FileSystem()
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def stat(self, path):
+        self._count("stat")
+        time.sleep(self.latency)
+        return self.base.stat(path)
+
+    def read(self, path):
+        self._count("read")
+        data = self.base.read(path)
+        time.sleep(self.latency + (len(data) / float(self.bandwidth) if self.bandwidth else 0.0))
+        return data
+
+
+class DiskTier(object):
+    """ Copies of files on the local disk, each starting with the (mtime, size) of
+        the file it was copied from. The least recently used copies are removed
+        beyond `budget` bytes, using a copy sets its modification time.
+    """
+    HEADER = struct.Struct("<qq")
+
+    def __init__(self, budget=DEFAULT_DISK_BUDGET):
+        self.budget = budget
+        self.folder = cache_root() / "bytes"
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # copy file name: size, least recently used first
+        self._copies = OrderedDict()
+        with os.scandir(str(self.folder)) as entries:
+            found = [(entry.stat().st_mtime_ns, entry.name, entry.stat().st_size) for entry in entries
+                    if entry.is_file() and not entry.name.endswith(".tmp")]
+        for _, name, size in sorted(found):
+            self._copies[name] = size
+        self.size = sum(self._copies.values())
+        self._evict()
+
+    def get(self, path, signature):
+        """ The copy of path if it was made from the file with the given signature, None otherwise """
+        copy = cache_file("bytes", path)
+        try:
+            with open(str(copy), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < DiskTier.HEADER.size or DiskTier.HEADER.unpack_from(data) != tuple(signature):
+            return None
+        try:
+            os.utime(str(copy))
+        except OSError:
+            pass
+        with self._lock:
+            if copy.name in self._copies:
+                self._copies.move_to_end(copy.name)
+        return data[DiskTier.HEADER.size:]
+
+    def put(self, path, signature, data):
+        """ Keep a copy of the content of path, read from the file with the given signature """
+        size = DiskTier.HEADER.size + len(data)
+        if size > self.budget:
+            return
+        copy = cache_file("bytes", path)
+        tmp = "%s.%d.tmp" % (copy, threading.get_ident())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(DiskTier.HEADER.pack(*signature))
+                f.write(data)
+            os.replace(tmp, str(copy))
+        except OSError:
+            return
+        with self._lock:
+            self.size += size - self._copies.pop(copy.name, 0)
+            self._copies[copy.name] = size
+            self._evict()
+
+    def _evict(self):
+        while self._copies and self.size > self.budget:
+            name, size = self._copies.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(str(self.folder / name))
+            except OSError:
+                pass
+
+
+class ByteCache(object):
+    """ Thread safe LRU of file contents in memory bounded by a budget in bytes """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        """ The Entry of path or None, marking it as most recently used """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+
+    def put(self, path, entry):
+        """ Store the entry and evict the least recently used ones exceeding the budget """
+        nbytes = len(entry.data) if entry.data is not None else 0
+        if nbytes > self.budget:
+            entry = entry._replace(data=None)
+            nbytes = 0
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None and old.data is not None:
+                self.size -= len(old.data)
+            self._entries[path] = entry
+            self.size += nbytes
+            while self.size > self.budget:
+                _, evicted = self._entries.popitem(last=False)
+                if evicted.data is not None:
+                    self.size -= len(evicted.data)
+
+    def remove(self, path):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None and old.data is not None:
+                self.size -= len(old.data)
+
+    def expire(self, prefix):
+        """ Make the entries of the paths starting with prefix need a stat before they are used again """
+        with self._lock:
+            for path, entry in self._entries.items():
+                if path.startswith(prefix):
+                    self._entries[path] = entry._replace(checked=float("-inf"))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FetchTask(QtCore.QRunnable):
+    """ Fetches a single file into the cache in a worker thread """
+
+    def __init__(self, reader, path):
+        super(FetchTask, self).__init__()
+        self.setAutoDelete(False)
+        self.reader = reader
+        self.path = path
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.reader._fetch(self.path)
+        except OSError:
+            pass
+        finally:
+            self.reader._finish(self)
+
+
+class ReadAhead(QtCore.QObject):
+    """ Reads files through the cache and fetches the ones asked for by prefetch
+        in the background, at most `concurrency` at a time.
+    """
+
+    def __init__(self, fs=None, cache=None, disk=None, concurrency=4, fresh_for=10.0,
+            max_file_size=MAX_FILE_SIZE, parent=None):
+        super(ReadAhead, self).__init__(parent)
+        self.fs = fs if fs is not None else FileSystem()
+        self.cache = cache if cache is not None else ByteCache()
+        self.disk = disk
+        self.fresh_for = fresh_for
+        self.max_file_size = max_file_size
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, concurrency))
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _finish(self, task):
+        with self._lock:
+            if self._pending.get(task.path) is task:
+                del self._pending[task.path]
+        task.done.set()
+
+    def _entry(self, path, want_data):
+        """ Entry of path, stat and read again when it is not known to be current """
+        entry = self.cache.get(path)
+        now = time.monotonic()
+        if entry is not None and now - entry.checked < self.fresh_for and (entry.data is not None
+                or entry.signature is None or not want_data or entry.signature[1] > self.max_file_size):
+            return entry
+        try:
+            signature = signature_of(self.fs.stat(path))
+        except FileNotFoundError:
+            entry = Entry(None, None, now)
+            self.cache.put(path, entry)
+            return entry
+        if entry is not None and entry.signature == signature and (entry.data is not None or not want_data):
+            entry = entry._replace(checked=now)
+        else:
+            data = None
+            if want_data and signature[1] <= self.max_file_size:
+                data = self.disk.get(path, signature) if self.disk is not None else None
+                if data is None:
+                    data = self.fs.read(path)
+                    if len(data) != signature[1]:
+                        # changed between the stat and the read
+                        signature = (None, len(data))
+                    elif self.disk is not None:
+                        self.disk.put(path, signature, data)
+            entry = Entry(signature, data, now)
+        self.cache.put(path, entry)
+        return entry
+
+    def _fetch(self, path):
+        return self._entry(path, True)
+
+    def _wait_pending(self, path):
+        """ Let a queued or running fetch of path finish, or drop it when it did not start """
+        with self._lock:
+            task = self._pending.get(path)
+        if task is None:
+            return
+        if self.pool.tryTake(task):
+            # not started yet, reading here is faster than waiting for a worker
+            with self._lock:
+                self._pending.pop(path, None)
+            task.done.set()
+        else:
+            task.done.wait()
+
+    def read(self, path):
+        """ Content of the file path, fetching it at most once while it does not change """
+        path = str(path)
+        self._wait_pending(path)
+        entry = self._fetch(path)
+        if entry.signature is None:
+            raise FileNotFoundError("No such file: %s" % path)
+        if entry.data is None:
+            # too large to be cached
+            return self.fs.read(path)
+        return entry.data
+
+    def signature(self, path):
+        """ (mtime, size) of the file path, None if it does not exist, like folder_watch.stat_signature """
+        path = str(path)
+        self._wait_pending(path)
+        try:
+            return self._entry(path, False).signature
+        except OSError:
+            return None
+
+    def cached_signature(self, path):
+        """ signature of path if it is known to be current without any I/O, False otherwise """
+        entry = self.cache.get(str(path))
+        if entry is None or time.monotonic() - entry.checked >= self.fresh_for:
+            return False
+        return entry.signature
+
+    def invalidate(self, path):
+        """ Forget the content of path, after it was written to """
+        self.cache.remove(str(path))
+
+    def expire(self, folder):
+        """ Check the files of folder again before using their bytes, after the folder changed """
+        self.cache.expire(os.path.join(str(folder), ""))
+
+    def prefetch(self, paths):
+        """ Fetch the given paths in the background, in the given order of priority.
+            Queued fetches of paths that are not wanted anymore are cancelled.
+        """
+        wanted = []
+        now = time.monotonic()
+        for path in paths:
+            path = str(path)
+            entry = self.cache.get(path)
+            if (entry is None or now - entry.checked >= self.fresh_for or entry.data is None
+                    and entry.signature is not None and entry.signature[1] <= self.max_file_size):
+                wanted.append(path)
+        wanted_set = set(wanted)
+        with self._lock:
+            for path, task in list(self._pending.items()):
+                if path not in wanted_set and self.pool.tryTake(task):
+                    del self._pending[path]
+                    task.done.set()
+            tasks = []
+            for priority, path in enumerate(reversed(wanted)):
+                if path in self._pending:
+                    continue
+                task = FetchTask(self, path)
+                self._pending[path] = task
+                tasks.append((priority, task))
+        for priority, task in tasks:
+            self.pool.start(task, priority)
+
+    def cancel(self):
+        """ Drop all queued fetches """
+        self.prefetch([])
+
+    def shutdown(self):
+        """ Cancel queued fetches and wait for the running ones """
+        self.cancel()
+        self.pool.waitForDone()
+
+
+def read_ahead_from_environment(parent=None):
+    """ ReadAhead set up from the environment:
+        IMAGE_VIEWER_DISK_CACHE_MB   size of the local disk tier, none when unset or 0
+        IMAGE_VIEWER_FS_LATENCY      seconds added to every file system call, to try slow storage out
+    """
+    disk_mb = float(os.environ.get("IMAGE_VIEWER_DISK_CACHE_MB", "") or 0)
+    latency = float(os.environ.get("IMAGE_VIEWER_FS_LATENCY", "") or 0)
+    return ReadAhead(fs=SlowFileSystem(latency) if latency > 0 else None,
+            disk=DiskTier(int(disk_mb * 1024 * 1024)) if disk_mb > 0 else None, parent=parent)
@@ -0,0 +1,20 @@
+import hashlib
+import os
+from pathlib import Path
+
+
+def cache_root():
+    """ Folder holding the caches and indexes of the viewer """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "image_viewer"
+
+
+def cache_file(kind, source, suffix=""):
+    """ Path of the cache file of the given kind built from the source path.
+        The parent folder is created if needed.
+    """
+    source = os.path.abspath(str(source))
+    digest = hashlib.sha1(source.encode("utf-8", "surrogateescape")).hexdigest()[:20]
+    folder = cache_root() / kind
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder / (digest + suffix)
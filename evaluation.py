@@ -0,0 +1,358 @@
+""" Scoring text detections against the ground truth like the ICDAR 2015 localisation task.
+
+    python evaluation.py IMG_DIR GT_DIR PRED_DIR [--workers N] [--worst 20]
+
+    A detection matches a ground truth box when their polygons overlap with an
+    IoU above 0.5, every box being matched once at most. Detections lying
+    mostly inside a don't care region are ignored and don't care boxes are not
+    missed. Precision, recall and their harmonic mean, the H-mean, are given
+    for every image and for the whole dataset.
+
+    The IoU of all the pairs of boxes of an image is computed at once with
+    NumPy: pairs whose bounding boxes do not overlap are left out, the others
+    are clipped against each other together (Sutherland-Hodgman, which needs
+    one polygon of the pair to be convex, QPolygonF is used when neither is).
+    The dataset is scored by a pool of worker processes and the scores are
+    cached, only images whose ground truth or predictions changed are scored
+    again, in the calling process when they are few.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from archive import stat_path
+from cache_paths import cache_file
+from gt_loaders import open_loader
+from icdar_gt import DONT_CARE
+from image_list import scan_images
+
+IOU_THRESHOLD = 0.5
+# share of a detection inside don't care regions above which it is ignored
+DONT_CARE_OVERLAP = 0.5
+CHUNK_SIZE = 256
+CACHE_VERSION = 1
+
+# matched boxes, ground truth and detections counted, don't care ones left out
+ImageScore = namedtuple("ImageScore", "matched n_gt n_det")
+# per box: "matched", "missed" or "ignored" for the ground truth,
+# "matched", "false positive" or "ignored" for the detections
+Match = namedtuple("Match", "pairs gt_status det_status")
+
+
+def scores(matched, n_gt, n_det):
+    """ (precision, recall, H-mean) as the ICDAR 2015 script computes them """
+    if n_gt == 0:
+        recall = 1.0
+        precision = 0.0 if n_det else 1.0
+    else:
+        recall = matched / float(n_gt)
+        precision = matched / float(n_det) if n_det else 0.0
+    hmean = 0.0 if precision + recall == 0 else 2 * precision * recall / (precision + recall)
+    return precision, recall, hmean
+
+
+def hmean_of(score):
+    return scores(*score)[2]
+
+
+def overall(image_scores):
+    """ (precision, recall, H-mean) of a dataset, from the ImageScore of its images """
+    matched = sum(score.matched for score in image_scores)
+    n_gt = sum(score.n_gt for score in image_scores)
+    n_det = sum(score.n_det for score in image_scores)
+    return scores(matched, n_gt, n_det)
+
+
+def polygons(gt):
+    """ (k, n, 2) array of the points of the boxes padded with their last point and (k,) point counts """
+    boxes = [np.asarray(points, dtype=np.float64).reshape(-1, 2) for points, _ in gt]
+    counts = np.array([len(box) for box in boxes], dtype=np.intp)
+    width = max(counts.max() if len(boxes) else 0, 1)
+    padded = np.zeros((len(boxes), width, 2))
+    for k, box in enumerate(boxes):
+        if len(box):
+            padded[k, :len(box)] = box
+            padded[k, len(box):] = box[-1]
+    return padded, counts
+
+
+def _next_points(points, counts):
+    """ The point after every point of the polygons, wrapping around at their count """
+    m = points.shape[1]
+    following = (np.arange(m)[None, :] + 1) % np.maximum(counts, 1)[:, None]
+    return np.take_along_axis(points, following[:, :, None], axis=1)
+
+
+def areas(points, counts):
+    """ Signed shoelace areas, positive for clockwise points with y pointing down """
+    nxt = _next_points(points, counts)
+    valid = np.arange(points.shape[1])[None, :] < counts[:, None]
+    cross = points[..., 0] * nxt[..., 1] - nxt[..., 0] * points[..., 1]
+    return 0.5 * np.where(valid, cross, 0).sum(axis=1)
+
+
+def convex(points, counts):
+    """ Whether every polygon turns the same way at all its points """
+    nxt = _next_points(points, counts)
+    after = _next_points(nxt, counts)
+    turn = ((nxt[..., 0] - points[..., 0]) * (after[..., 1] - nxt[..., 1])
+            - (nxt[..., 1] - points[..., 1]) * (after[..., 0] - nxt[..., 0]))
+    valid = np.arange(points.shape[1])[None, :] < counts[:, None]
+    return ~((valid & (turn > 1e-9)).any(axis=1) & (valid & (turn < -1e-9)).any(axis=1))
+
+
+def bounds(points):
+    """ (k, 4) min x, min y, max x, max y of the polygons, the padding repeats points """
+    return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+
+
+def _side(a, b, orientation, points):
+    """ Positive for the points inside the edges a[k] -> b[k] of clockwise or counter clockwise polygons """
+    return orientation[:, None] * ((b[:, None, 0] - a[:, None, 0]) * (points[..., 1] - a[:, None, 1])
+            - (b[:, None, 1] - a[:, None, 1]) * (points[..., 0] - a[:, None, 0]))
+
+
+def clip(subject, subject_counts, clipper, clipper_counts):
+    """ Intersections of the subject polygons with the convex clipper polygons, pair by pair.
+        Returns the points and counts of the intersections, Sutherland-Hodgman on all pairs at once.
+    """
+    orientation = np.sign(areas(clipper, clipper_counts))
+    points, counts = subject, subject_counts.copy()
+    rows = np.arange(len(points))[:, None]
+    for e in range(clipper.shape[1]):
+        active = e < clipper_counts
+        a = clipper[:, e]
+        b = clipper[np.arange(len(clipper)), (e + 1) % np.maximum(clipper_counts, 1)]
+        nxt = _next_points(points, counts)
+        # positive inside the clipping edge, the pairs whose clipper has fewer edges keep everything
+        s_cur = np.where(active[:, None], _side(a, b, orientation, points), 1.0)
+        s_nxt = np.where(active[:, None], _side(a, b, orientation, nxt), 1.0)
+        in_cur, in_nxt = s_cur >= 0, s_nxt >= 0
+        valid = np.arange(points.shape[1])[None, :] < counts[:, None]
+        crossing = (in_cur != in_nxt) & valid
+        t = np.where(crossing, s_cur / np.where(crossing, s_cur - s_nxt, 1.0), 0.0)
+        cut = points + t[..., None] * (nxt - points)
+        # for the edge from every point to the next: where it crosses, then the next point if inside
+        candidates = np.stack([cut, nxt], axis=2).reshape(len(points), -1, 2)
+        keep = np.stack([crossing, in_nxt & valid], axis=2).reshape(len(points), -1)
+        order = np.argsort(~keep, axis=1, kind="stable")
+        counts = keep.sum(axis=1)
+        width = max(int(counts.max()) if len(counts) else 0, 1)
+        points = candidates[rows, order[:, :width]]
+    return points, counts
+
+
+def intersection_areas(a_points, a_counts, b_points, b_counts):
+    """ Areas of the intersections of the polygons a[k] and b[k] """
+    result = np.zeros(len(a_points))
+    a_convex, b_convex = convex(a_points, a_counts), convex(b_points, b_counts)
+    by_b = b_convex
+    by_a = ~b_convex & a_convex
+    if by_b.any():
+        points, counts = clip(a_points[by_b], a_counts[by_b], b_points[by_b], b_counts[by_b])
+        result[by_b] = np.abs(areas(points, counts))
+    if by_a.any():
+        points, counts = clip(b_points[by_a], b_counts[by_a], a_points[by_a], a_counts[by_a])
+        result[by_a] = np.abs(areas(points, counts))
+    for k in np.flatnonzero(~a_convex & ~b_convex):
+        result[k] = _qt_intersection_area(a_points[k, :a_counts[k]], b_points[k, :b_counts[k]])
+    return result
+
+
+def _qt_intersection_area(a, b):
+    """ Area of the intersection of two polygons neither of which is convex """
+    from PyQt5 import QtCore, QtGui
+    paths = []
+    for points in (a, b):
+        path = QtGui.QPainterPath()
+        path.addPolygon(QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in points]))
+        path.closeSubpath()
+        paths.append(path)
+    total = 0.0
+    # the intersection may be made of several polygons
+    for polygon in paths[0].intersected(paths[1]).toFillPolygons():
+        points = [(p.x(), p.y()) for p in polygon]
+        total += abs(0.5 * sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])))
+    return total
+
+
+def overlaps(gt, det):
+    """ (intersection areas, ground truth areas, detection areas) of all the pairs of boxes,
+        the intersections as a (len(gt), len(det)) matrix.
+    """
+    g_points, g_counts = polygons(gt)
+    d_points, d_counts = polygons(det)
+    g_area = np.abs(areas(g_points, g_counts))
+    d_area = np.abs(areas(d_points, d_counts))
+    inter = np.zeros((len(gt), len(det)))
+    if not len(gt) or not len(det):
+        return inter, g_area, d_area
+    gb, db = bounds(g_points), bounds(d_points)
+    # only pairs whose bounding boxes overlap can intersect
+    candidates = ((gb[:, None, 0] < db[None, :, 2]) & (db[None, :, 0] < gb[:, None, 2])
+            & (gb[:, None, 1] < db[None, :, 3]) & (db[None, :, 1] < gb[:, None, 3])
+            & (g_area[:, None] > 0) & (d_area[None, :] > 0))
+    gi, di = np.nonzero(candidates)
+    if len(gi):
+        inter[gi, di] = intersection_areas(g_points[gi], g_counts[gi], d_points[di], d_counts[di])
+    return inter, g_area, d_area
+
+
+def match(gt, det):
+    """ Match the detections det to the ground truth gt, both GroundTruth, as a Match """
+    inter, g_area, d_area = overlaps(gt, det)
+    dont_care = np.array([text == DONT_CARE for text in gt.texts], dtype=bool)
+    gt_status = ["ignored" if dc else "missed" for dc in dont_care]
+    det_status = ["false positive"] * len(det)
+    if len(det) and dont_care.any():
+        inside = inter[dont_care].sum(axis=0) / np.maximum(d_area, 1e-9)
+        for d in np.flatnonzero(inside > DONT_CARE_OVERLAP):
+            det_status[d] = "ignored"
+    union = g_area[:, None] + d_area[None, :] - inter
+    iou = np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+    pairs = []
+    # in ground truth then detection order, like the ICDAR 2015 script
+    for g, d in zip(*np.nonzero(iou > IOU_THRESHOLD)):
+        if gt_status[g] == "missed" and det_status[d] == "false positive":
+            gt_status[g] = det_status[d] = "matched"
+            pairs.append((int(g), int(d)))
+    return Match(pairs, gt_status, det_status)
+
+
+def image_score(m):
+    return ImageScore(len(m.pairs), sum(status != "ignored" for status in m.gt_status),
+            sum(status != "ignored" for status in m.det_status))
+
+
+_loaders = None
+
+
+def _init_worker(gt_source, pred_source):
+    global _loaders
+    _loaders = (open_loader(gt_source), open_loader(pred_source))
+
+
+def score_chunk(task):
+    """ Worker side of evaluate: [(name, image path)] -> [(name, ImageScore)] """
+    gt_loader, pred_loader = _loaders
+    return [(name, image_score(match(gt_loader.load(path), pred_loader.load(path)))) for name, path in task]
+
+
+def _signature(loader, image_path):
+    path = loader.gt_path(image_path)
+    try:
+        st = stat_path(path if path is not None else loader.source)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def evaluate(img_dir, gt_source, pred_source, names=None, workers=None, cancelled=None):
+    """ {image name: ImageScore} of the images of img_dir, scored by a pool of worker
+        processes. Scores cached by an earlier run are kept when the ground truth
+        and prediction files of the image did not change, up to CHUNK_SIZE
+        images left to score are scored without starting processes.
+        cancelled is polled about every 0.1 s, the scores so far are returned once it is true.
+    """
+    names = sorted(scan_images(img_dir)) if names is None else list(names)
+    gt_loader, pred_loader = open_loader(gt_source), open_loader(pred_source)
+    cache = str(cache_file("evaluations", pred_source, ".json"))
+    try:
+        with open(cache, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["version"] != CACHE_VERSION or cached["gt"] != os.path.abspath(str(gt_source)):
+            cached = {}
+        else:
+            cached = cached["images"]
+    except (OSError, ValueError, KeyError):
+        cached = {}
+
+    results = {}
+    entries = {}
+    todo = []
+    for i, name in enumerate(names):
+        if i % CHUNK_SIZE == 0 and cancelled is not None and cancelled():
+            gt_loader.close()
+            pred_loader.close()
+            return results
+        path = os.path.join(str(img_dir), name)
+        signature = [_signature(gt_loader, path), _signature(pred_loader, path)]
+        entry = cached.get(name)
+        if entry is not None and entry[0] == signature:
+            results[name] = ImageScore(*entry[1])
+            entries[name] = entry
+        else:
+            todo.append((name, path))
+            entries[name] = [signature, None]
+    if len(todo) <= CHUNK_SIZE:
+        # starting processes takes longer than scoring a few images, like the ones just saved
+        for name, path in todo:
+            if cancelled is not None and cancelled():
+                break
+            score = image_score(match(gt_loader.load(path), pred_loader.load(path)))
+            results[name] = score
+            entries[name][1] = list(score)
+        todo = []
+    gt_loader.close()
+    pred_loader.close()
+
+    if todo:
+        workers = min(workers or os.cpu_count() or 1, max(1, len(todo) // CHUNK_SIZE))
+        chunks = [todo[i:i + CHUNK_SIZE] for i in range(0, len(todo), CHUNK_SIZE)]
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker,
+                initargs=(str(gt_source), str(pred_source))) as pool:
+            scoring = pool.imap_unordered(score_chunk, chunks)
+            remaining = len(chunks)
+            while remaining:
+                if cancelled is not None and cancelled():
+                    pool.terminate()
+                    return results
+                try:
+                    scored = scoring.next(timeout=0.1)
+                except multiprocessing.TimeoutError:
+                    continue
+                remaining -= 1
+                for name, score in scored:
+                    results[name] = score
+                    entries[name][1] = list(score)
+    try:
+        with open(cache + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "gt": os.path.abspath(str(gt_source)),
+                    "images": {name: entry for name, entry in entries.items() if entry[1] is not None}}, f)
+        os.replace(cache + ".tmp", cache)
+    except OSError:
+        pass
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("img_dir")
+    parser.add_argument("gt_dir", help="ground truth folder, archive or JSON file")
+    parser.add_argument("pred_dir", help="predictions in one of the ground truth formats")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+            help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--worst", type=int, default=20, metavar="N", help="list the N images with the lowest H-mean")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = evaluate(args.img_dir, args.gt_dir, args.pred_dir, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    for name in sorted(results, key=lambda name: (hmean_of(results[name]), name))[:args.worst]:
+        precision, recall, hmean = scores(*results[name])
+        print("%s\tP %.3f\tR %.3f\tH %.3f" % (name, precision, recall, hmean))
+    precision, recall, hmean = overall(results.values())
+    print("%d images in %.1f s: precision %.4f, recall %.4f, H-mean %.4f" % (len(results), elapsed,
+            precision, recall, hmean))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+""" Noticing changes to the image and ground truth folders while they are shown.
+
+    QFileSystemWatcher is backed by inotify on Linux. Where a path cannot be
+    watched that way, its modification time is polled instead. Changes are
+    reported at most once per `delay` so that a folder receiving files
+    continuously is relisted in batches instead of once per file.
+"""
+import os
+
+from PyQt5 import QtCore
+
+from archive import stat_path
+
+
+def stat_signature(path):
+    """ (mtime, size) of a file or archive member, None if it does not exist """
+    try:
+        st = stat_path(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FolderWatcher(QtCore.QObject):
+    """ Emits `changed` after the folder, or the single file set with
+        watch_file, was modified.
+    """
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, path, delay=300, poll_interval=2000, parent=None):
+        super(FolderWatcher, self).__init__(parent)
+        self.path = str(path)
+        self.file = None
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._touched)
+        self.watcher.fileChanged.connect(self._file_touched)
+        # changes within the delay are reported together, the timer is not restarted
+        # by later changes so a steady stream of files is still reported
+        self.timer = QtCore.QTimer(self, singleShot=True, interval=delay, timeout=self.changed)
+        self.poll_timer = QtCore.QTimer(self, interval=poll_interval, timeout=self._poll)
+        self.polled = {}
+        self._watch(self.path)
+
+    def _watch(self, path):
+        if not self.watcher.addPath(path):
+            self.polled[path] = stat_signature(path)
+            self.poll_timer.start()
+
+    def watch_file(self, path):
+        """ Also watch path, replacing the file watched before """
+        if self.file is not None:
+            self.watcher.removePath(self.file)
+            self.polled.pop(self.file, None)
+        self.file = str(path) if path is not None else None
+        if self.file is not None and os.path.exists(self.file):
+            self._watch(self.file)
+
+    def _touched(self, path=None):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def _file_touched(self, path):
+        # editors replacing the file make the watch go away with the old file
+        if path == self.file and path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+        self._touched()
+
+    def _poll(self):
+        for path, signature in list(self.polled.items()):
+            current = stat_signature(path)
+            if current != signature:
+                self.polled[path] = current
+                self._touched()
+
+    def stop(self):
+        self.timer.stop()
+        self.poll_timer.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
@@ -0,0 +1,237 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from spatial_index import GridIndex, rect_box
+
+# margin QGraphicsTextItem leaves around its text, labels are placed the same way
+TEXT_MARGIN = 4
+# labels smaller than this many device pixels are not drawn
+MIN_LABEL_PIXELS = 6
+
+
+def top_left_coord(points):
+    """ Top left corner of a polygon given as flat x1,y1,x2,y2,... coordinates """
+    minx, miny = points[0], points[1]
+    for i in range(2, len(points) - 1, 2):
+        x, y = points[i], points[i + 1]
+        if x < minx and y < miny:
+            minx, miny = x, y
+    return (minx, miny)
+
+
+def polygons_of(gt):
+    """ QPolygonF of every box of the ground truth """
+    polygons = []
+    for points, _ in gt:
+        polygons.append(QtGui.QPolygonF([QtCore.QPointF(points[i], points[i + 1])
+                for i in range(0, len(points) - 1, 2)]))
+    return polygons
+
+
+def paint_annotations(painter, polygons, texts, label_rects, font, pen, show_polygons=True,
+        show_texts=True, skip=(), brushes=None, polygon_indices=None, label_indices=None, pens=None):
+    """ Draw the polygons and their labels, shared by the viewer and the exporters.
+        polygon_indices and label_indices restrict the drawing to some boxes,
+        the boxes in skip are left out, polygon and label,
+        pens and brushes give the boxes drawn differently from the others.
+    """
+    if show_polygons:
+        painter.setPen(pen)
+        painter.setBrush(QtCore.Qt.NoBrush)
+        indices = range(len(polygons)) if polygon_indices is None else polygon_indices
+        for i in indices:
+            if i in skip:
+                continue
+            if pens:
+                painter.setPen(pens.get(i, pen))
+            brush = brushes.get(i) if brushes else None
+            if brush is not None:
+                painter.setBrush(brush)
+                painter.drawPolygon(polygons[i])
+                painter.setBrush(QtCore.Qt.NoBrush)
+            else:
+                painter.drawPolygon(polygons[i])
+    if show_texts:
+        painter.setFont(font)
+        painter.setPen(QtGui.QColor("black"))
+        indices = range(len(label_rects)) if label_indices is None else label_indices
+        for i in indices:
+            if i in skip:
+                continue
+            painter.drawText(label_rects[i], QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop, texts[i])
+
+
+def label_rect(points, text, metrics):
+    """ Where the label of a box is drawn, at the top left of its polygon """
+    x, y = top_left_coord(points)
+    return QtCore.QRectF(x + TEXT_MARGIN, y + TEXT_MARGIN, metrics.width(text) + 1, metrics.height())
+
+
+def label_rects_of(gt, font):
+    """ Where the labels of the boxes are drawn """
+    metrics = QtGui.QFontMetricsF(font)
+    return [label_rect(points, text, metrics) for points, text in gt]
+
+
+def grid_cell_size(bounds):
+    """ Grid cell size fitting the typical box, twice the median box side """
+    if not bounds:
+        return 64.0
+    sides = sorted(max(r.width(), r.height()) for r in bounds)
+    return max(16.0, 2 * sides[len(sides) // 2])
+
+
+class GroundTruthLayer(QtWidgets.QGraphicsObject):
+    """ Read only display of all ground truth polygons and labels of an image.
+
+        A single item paints every box, hover highlighting and hit testing
+        are done on the polygons directly instead of through scene items,
+        looking them up in a grid over their bounding boxes. Only the boxes
+        in the exposed area are painted and labels too small to be read at
+        the current zoom are skipped.
+        Double clicking a polygon asks for it to be edited with grips, the
+        layer then only draws its label, moved there by set_polygon.
+    """
+    editRequested = QtCore.pyqtSignal(int)
+    selectionChanged = QtCore.pyqtSignal()
+
+    def __init__(self, gt, parent=None):
+        super(GroundTruthLayer, self).__init__(parent)
+        self.gt = gt
+        self.font = QtGui.QFont()
+        self.pen = QtGui.QPen(QtGui.QColor("green"), 2)
+        self.hover_brush = QtGui.QBrush(QtGui.QColor(255, 0, 0, 100))
+        self.selected_brush = QtGui.QBrush(QtGui.QColor(0, 120, 255, 90))
+        self.polygons = polygons_of(gt)
+        self.bounds = [polygon.boundingRect() for polygon in self.polygons]
+        self.label_rects = label_rects_of(gt, self.font)
+        self.label_height = QtGui.QFontMetricsF(self.font).height()
+        self.show_polygons = True
+        self.show_texts = True
+        self.hidden = set()
+        # pens of the boxes not drawn with self.pen
+        self.pens = {}
+        self.selected = set()
+        self.hovered = -1
+
+        cell_size = grid_cell_size(self.bounds)
+        self.index = GridIndex(cell_size)
+        self.label_index = GridIndex(cell_size)
+        rect = QtCore.QRectF()
+        for i, (bounds, label) in enumerate(zip(self.bounds, self.label_rects)):
+            self.index.insert(i, rect_box(bounds))
+            self.label_index.insert(i, rect_box(label))
+            rect = rect.united(bounds).united(label)
+        # room for the pen and the hover fill
+        self._rect = rect.adjusted(-2, -2, 2, 2)
+        self.setZValue(9)
+        self.setAcceptHoverEvents(True)
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def boundingRect(self):
+        return self._rect
+
+    def polygon_at(self, pos):
+        """ Index of the visible polygon under pos or -1, the last one when they overlap """
+        for i in sorted(self.index.query_point(pos.x(), pos.y()), reverse=True):
+            if self.polygons[i].containsPoint(pos, QtCore.Qt.OddEvenFill):
+                return i
+        return -1
+
+    def polygons_in(self, rect):
+        """ Indices of the visible polygons inside rect, as selected with a rubber band """
+        return sorted(i for i in self.index.query(rect_box(rect)) if rect.contains(self.bounds[i]))
+
+    def set_pens(self, pens):
+        """ Draw the boxes of the given indices with their own pen, {index: QPen} """
+        self.pens = pens
+        self.update()
+
+    def set_polygons_visible(self, visible):
+        self.show_polygons = visible
+        self.update()
+
+    def set_texts_visible(self, visible):
+        self.show_texts = visible
+        self.update()
+
+    def set_polygon(self, i, polygon):
+        """ Move the i'th polygon and its label, the spatial indices are updated for it only """
+        self.update(self.bounds[i].adjusted(-2, -2, 2, 2))
+        self.update(self.label_rects[i])
+        self.polygons[i] = polygon
+        self.bounds[i] = polygon.boundingRect()
+        points = [c for point in polygon for c in (point.x(), point.y())]
+        self.label_rects[i] = label_rect(points, self.gt.texts[i], QtGui.QFontMetricsF(self.font))
+        if i not in self.hidden:
+            self.index.update(i, rect_box(self.bounds[i]))
+        self.label_index.update(i, rect_box(self.label_rects[i]))
+        rect = self._rect.united(self.bounds[i].adjusted(-2, -2, 2, 2)).united(self.label_rects[i])
+        if rect != self._rect:
+            self.prepareGeometryChange()
+            self._rect = rect
+        self.update(self.bounds[i].adjusted(-2, -2, 2, 2))
+        self.update(self.label_rects[i])
+
+    def hide_polygon(self, i):
+        """ Stop drawing the i'th polygon, it is shown by an editable item instead """
+        self.hidden.add(i)
+        self.index.remove(i)
+        self.selected.discard(i)
+        self.update(self.bounds[i].adjusted(-2, -2, 2, 2))
+
+    def set_selected(self, indices):
+        """ Highlight the given polygons """
+        indices = set(indices) - self.hidden
+        if indices == self.selected:
+            return
+        for i in self.selected ^ indices:
+            self.update(self.bounds[i].adjusted(-2, -2, 2, 2))
+        self.selected = indices
+        self.selectionChanged.emit()
+
+    def _set_hovered(self, i):
+        if i == self.hovered:
+            return
+        for j in (self.hovered, i):
+            if j >= 0:
+                self.update(self.bounds[j].adjusted(-2, -2, 2, 2))
+        self.hovered = i
+        self.setCursor(QtGui.QCursor(QtCore.Qt.PointingHandCursor if i >= 0 else QtCore.Qt.CrossCursor))
+
+    def hoverMoveEvent(self, event):
+        if self.show_polygons:
+            self._set_hovered(self.polygon_at(event.pos()))
+        super(GroundTruthLayer, self).hoverMoveEvent(event)
+
+    def hoverLeaveEvent(self, event):
+        self._set_hovered(-1)
+        super(GroundTruthLayer, self).hoverLeaveEvent(event)
+
+    def mousePressEvent(self, event):
+        # let clicks outside of the polygons go to the items below
+        i = self.polygon_at(event.pos())
+        if i < 0 or not self.show_polygons:
+            event.ignore()
+            return
+        self.set_selected([i])
+
+    def mouseDoubleClickEvent(self, event):
+        i = self.polygon_at(event.pos())
+        if i >= 0 and self.show_polygons:
+            self._set_hovered(-1)
+            self.editRequested.emit(i)
+        else:
+            event.ignore()
+
+    def paint(self, painter, option, widget=None):
+        exposed = rect_box(option.exposedRect)
+        brushes = dict.fromkeys(self.selected, self.selected_brush)
+        if self.hovered >= 0:
+            brushes[self.hovered] = self.hover_brush
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        readable = self.label_height * lod >= MIN_LABEL_PIXELS
+        # hidden polygons are left out of the index, their labels are still drawn
+        paint_annotations(painter, self.polygons, self.gt.texts, self.label_rects, self.font,
+                self.pen, self.show_polygons, self.show_texts and readable, (), brushes,
+                polygon_indices=sorted(self.index.query(exposed)),
+                label_indices=sorted(self.label_index.query(exposed)) if readable else (), pens=self.pens)
@@ -0,0 +1,331 @@
+""" Loaders reading the ground truth of an image in the layouts of the text datasets.
+
+    ICDAR 2015   gt_img_1.txt       x1,y1,x2,y2,x3,y3,x4,y4,Text
+    ICDAR 2013   gt_img_1.txt       left, top, right, bottom, "Text"   (commas are optional)
+    Total-Text   poly_gt_img1.txt   x: [[x1 x2 ...]], y: [[y1 y2 ...]], ornt: [u'c'], transcriptions: [u'Text']
+    Detections   res_img_1.txt      x1,y1,x2,y2,x3,y3,x4,y4[,Text]     (ICDAR 2015 results)
+    COCO-Text    one JSON file for all the images, see json_gt
+
+    open_loader picks the first registered loader recognising the ground
+    truth folder, archive or file. The formats with one file per image
+    are told apart by the first ground truth file found.
+"""
+import os
+import re
+from pathlib import Path
+
+from archive import Archive, is_archive, read_bytes
+from icdar_gt import DONT_CARE, GroundTruth, GtIndex, finite_coords, gt_name, load_gt, parse_icdar2015_gt
+from json_gt import JsonGtIndex
+
+LOADERS = []
+
+
+def register_loader(cls):
+    """ Class decorator adding a loader to the ones open_loader chooses from """
+    LOADERS.append(cls)
+    return cls
+
+
+def open_loader(source, files=None):
+    """ Loader for the ground truth in source, ICDAR 2015 when no format recognises it.
+        files is a byte_cache.ReadAhead to read the ground truth files through.
+    """
+    for cls in LOADERS:
+        if cls.detect(source):
+            return cls(source, files)
+    return Icdar2015Loader(source, files)
+
+
+def first_gt_file(source):
+    """ (name, content as text) of the first .txt file of a folder or archive, None if there is none """
+    try:
+        if is_archive(source):
+            archive = Archive.open(source)
+            name = next((name for name in archive.names() if name.endswith(".txt")), None)
+            data = archive.read(name) if name is not None else None
+        else:
+            with os.scandir(str(source)) as entries:
+                path = next((entry.path for entry in entries
+                        if entry.name.endswith(".txt") and entry.is_file()), None)
+            name = os.path.basename(path) if path is not None else None
+            data = read_bytes(path) if path is not None else None
+    except OSError:
+        return None
+    if data is None:
+        return None
+    return name.rsplit("/", 1)[-1], data.decode("utf-8-sig", errors="replace")
+
+
+class GtLoader(object):
+    """ Ground truth of the images of a dataset """
+    name = ""
+    # edits can be saved in this format
+    writable = False
+    # transcriptions can be indexed for searching, see transcription_index
+    searchable = False
+    # the format has an index, built with build_index and used once given to set_index
+    indexable = False
+
+    def __init__(self, source, files=None):
+        self.source = Path(source)
+        self.files = files
+
+    @classmethod
+    def detect(cls, source):
+        """ Whether source holds ground truth in this format """
+        return False
+
+    def gt_path(self, image_path):
+        """ The file of the annotations of the image, None if it does not have one of its own """
+        return None
+
+    def gt_paths(self, image_path):
+        """ The files gt_path may choose from, to be read ahead """
+        path = self.gt_path(image_path)
+        return [path] if path is not None else []
+
+    def load(self, image_path):
+        """ Annotations of the image as a GroundTruth """
+        raise NotImplementedError
+
+    def file_bytes(self, path):
+        """ Content of a ground truth file, through the read-ahead cache when there is one """
+        if self.files is not None:
+            return self.files.read(path)
+        return read_bytes(path)
+
+    def needs_index(self):
+        """ Whether the annotations cannot be read before an index is built """
+        return False
+
+    def build_index(self):
+        """ Build the index of the ground truth and return it, may run in a worker thread """
+        raise NotImplementedError
+
+    def set_index(self, index):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PerFileLoader(GtLoader):
+    """ Formats with one ground truth file per image, in a folder or an archive """
+    # names of the ground truth file of an image with the given stem, the first existing one is read
+    patterns = ("gt_%s.txt",)
+
+    @classmethod
+    def detect(cls, source):
+        if not (os.path.isdir(str(source)) or is_archive(source)):
+            return False
+        sample = first_gt_file(source)
+        return sample is not None and cls.recognise(*sample)
+
+    @classmethod
+    def recognise(cls, name, text):
+        """ Whether the file called name with the content text is a ground truth file in this format """
+        return False
+
+    def gt_paths(self, image_path):
+        stem = Path(image_path).stem
+        return [self.source / (pattern % stem) for pattern in self.patterns]
+
+    def gt_path(self, image_path):
+        paths = self.gt_paths(image_path)
+        if len(paths) > 1 and not is_archive(self.source):
+            for path in paths:
+                if self.files.signature(path) is not None if self.files is not None else path.exists():
+                    return path
+        return paths[0]
+
+    def load(self, image_path):
+        return self.read(self.gt_path(image_path))
+
+    def read(self, path):
+        """ Annotations in the ground truth file path, none if it does not exist """
+        try:
+            data = self.file_bytes(path)
+        except FileNotFoundError:
+            return GroundTruth()
+        return self.parse(data.decode("utf-8-sig", errors="replace"))
+
+    def parse(self, text):
+        raise NotImplementedError
+
+
+@register_loader
+class JsonLoader(GtLoader):
+    """ COCO-Text and COCO style JSON files, read through a JsonGtIndex.
+
+        The annotations of an image are a byte range of one file of often
+        hundreds of megabytes, read from an open file instead of going
+        through files: caching the whole file would exceed the memory budget
+        and a single range is too small to be worth fetching ahead.
+    """
+    name = "COCO-Text"
+    indexable = True
+
+    def __init__(self, source, files=None):
+        super(JsonLoader, self).__init__(source, files)
+        self.index = JsonGtIndex.open_for(self.source)
+        self._file = None
+
+    @classmethod
+    def detect(cls, source):
+        return str(source).lower().endswith(".json") and os.path.isfile(str(source))
+
+    def load(self, image_path):
+        if self.index is None or not self.index.is_current(self.source):
+            # the offsets of an index of another version of the file are meaningless, it is rebuilt
+            return GroundTruth()
+        if self._file is not None and not os.path.samestat(os.fstat(self._file.fileno()), os.stat(str(self.source))):
+            # replaced since it was opened
+            self.close_file()
+        if self._file is None:
+            self._file = open(str(self.source), "rb")
+        try:
+            return self.index.read(self._file, Path(image_path).name)
+        except ValueError:
+            # replaced again since the index was checked
+            return GroundTruth()
+
+    def needs_index(self):
+        return self.index is None or not self.index.is_current(self.source)
+
+    def build_index(self):
+        return JsonGtIndex.build(self.source)
+
+    def set_index(self, index):
+        if self.index is not None:
+            self.index.close()
+        self.index = index
+        # the file may have been replaced
+        self.close_file()
+
+    def close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self.close_file()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+_TOTAL_TEXT_BOX = re.compile(r"x: \[\[([^\]]*)\]\],\s*y: \[\[([^\]]*)\]\],\s*ornt: \[u?'[^']*'\],"
+        r"\s*transcriptions: \[u?(['\"])(.*?)\3\]")
+
+
+@register_loader
+class TotalTextLoader(PerFileLoader):
+    """ Total-Text curved polygons with any number of vertices """
+    name = "Total-Text"
+    patterns = ("poly_gt_%s.txt", "gt_%s.txt")
+
+    @classmethod
+    def recognise(cls, name, text):
+        return "x: [[" in text
+
+    def parse(self, text):
+        gt = GroundTruth()
+        # long coordinate lists are wrapped over several lines
+        for match in _TOTAL_TEXT_BOX.finditer(text):
+            try:
+                xs = [float(v) for v in match.group(1).split()]
+                ys = [float(v) for v in match.group(2).split()]
+            except ValueError:
+                continue
+            if len(xs) != len(ys) or len(xs) < 3 or not finite_coords(xs + ys):
+                continue
+            text = match.group(4)
+            gt.append([c for point in zip(xs, ys) for c in point], DONT_CARE if text == "#" else text)
+        return gt
+
+
+_ICDAR2013_BOX = re.compile(r"^\s*(-?[\d.]+)[,\s]\s*(-?[\d.]+)[,\s]\s*(-?[\d.]+)[,\s]\s*(-?[\d.]+)[,\s]\s*\"(.*)\"\s*$")
+
+
+@register_loader
+class Icdar2013Loader(PerFileLoader):
+    """ ICDAR 2013 axis aligned boxes """
+    name = "ICDAR 2013"
+
+    @classmethod
+    def recognise(cls, name, text):
+        line = next((line for line in text.splitlines() if line.strip()), "")
+        return _ICDAR2013_BOX.match(line) is not None
+
+    def parse(self, text):
+        gt = GroundTruth()
+        for line in text.splitlines():
+            match = _ICDAR2013_BOX.match(line)
+            if match is None:
+                continue
+            try:
+                left, top, right, bottom = (float(v) for v in match.group(1, 2, 3, 4))
+            except ValueError:
+                continue
+            if not finite_coords((left, top, right, bottom)):
+                continue
+            gt.append((left, top, right, top, right, bottom, left, bottom), match.group(5))
+        return gt
+
+
+@register_loader
+class Icdar2015ResultsLoader(PerFileLoader):
+    """ Detections submitted to the ICDAR 2015 localisation task, res_img_1.txt files of
+        x1,y1,...,x4,y4 lines, a transcription or a confidence may follow.
+    """
+    name = "ICDAR 2015 results"
+    patterns = ("res_%s.txt",)
+
+    @classmethod
+    def recognise(cls, name, text):
+        return name.startswith("res_")
+
+    def parse(self, text):
+        return parse_icdar2015_gt(text)
+
+
+class Icdar2015Loader(PerFileLoader):
+    """ ICDAR 2015 quadrilaterals, the format edits are saved in.
+        Not registered, it is what open_loader falls back to.
+    """
+    name = "ICDAR 2015"
+    searchable = True
+
+    def __init__(self, source, files=None):
+        super(Icdar2015Loader, self).__init__(source, files)
+        # archives are indexed by their member table already
+        self.writable = self.indexable = not is_archive(self.source)
+        # use the index built in an earlier session if there is one
+        self.index = GtIndex.open_for(self.source) if self.indexable else None
+
+    @classmethod
+    def recognise(cls, name, text):
+        return True
+
+    def gt_path(self, image_path):
+        return self.source / gt_name(image_path)
+
+    def read(self, path):
+        return load_gt(self.source, Path(path).name, self.index, self.files)
+
+    def parse(self, text):
+        return parse_icdar2015_gt(text)
+
+    def build_index(self):
+        return GtIndex.build(self.source)
+
+    def set_index(self, index):
+        if self.index is not None:
+            self.index.close()
+        self.index = index
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
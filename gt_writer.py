@@ -0,0 +1,169 @@
+""" Writing edited annotations back to the ground truth files.
+
+    Saves are handed to a background thread which records them in a journal
+    before replacing the ground truth file atomically, the caller never waits
+    for the disk. When the viewer is stopped before a write completed, the
+    journal still holds it and the write is redone the next time the viewer
+    starts.
+"""
+import json
+import os
+import threading
+from array import array
+
+from PyQt5 import QtCore
+
+from cache_paths import cache_root
+from icdar_gt import GroundTruth, write_icdar2015_gt
+
+
+class Journal(object):
+    """ Append only log of the pending writes, one JSON object per line """
+
+    def __init__(self, path=None):
+        self.path = str(path) if path is not None else str(cache_root() / "gt_journal.jsonl")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.seq = 0
+
+    def _append(self, record):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def next_seq(self):
+        """ Sequence number of the next write """
+        with self._lock:
+            self.seq += 1
+            return self.seq
+
+    def record(self, seq, fname, gt):
+        """ Log the write number seq of gt to fname """
+        record = {"seq": seq, "file": fname, "coords": list(gt.coords), "texts": gt.texts}
+        if gt.starts is not None:
+            record["starts"] = list(gt.starts)
+        self._append(record)
+
+    def done(self, seq):
+        self._append({"done": seq})
+
+    def pending(self):
+        """ The latest unfinished write of every file, as {fname: GroundTruth} """
+        writes, done = {}, set()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line may have been cut by a crash
+                        continue
+                    if "done" in record:
+                        done.add(record["done"])
+                    else:
+                        writes[record["seq"]] = record
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            # the writes redone are logged again after these
+            self.seq = max([self.seq] + list(writes) + list(done))
+        latest = {}
+        for seq in sorted(writes):
+            record = writes[seq]
+            if seq in done:
+                latest.pop(record["file"], None)
+            else:
+                starts = array("I", record["starts"]) if "starts" in record else None
+                latest[record["file"]] = GroundTruth(array("f", record["coords"]), record["texts"], starts)
+        return latest
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class WriteTask(QtCore.QRunnable):
+    def __init__(self, writer, fname):
+        super(WriteTask, self).__init__()
+        self.writer = writer
+        self.fname = fname
+
+    def run(self):
+        self.writer._write(self.fname)
+
+
+class AnnotationWriter(QtCore.QObject):
+    """ Writes ground truth files in a background thread.
+
+        Only files that are handed to `save` are written. A file saved again
+        before its previous write started is written once, with the latest
+        content, and `pending` gives that content to readers meanwhile.
+    """
+    saved = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str, str)
+
+    def __init__(self, journal=None, parent=None):
+        super(AnnotationWriter, self).__init__(parent)
+        self.journal = journal if journal is not None else Journal()
+        self.pool = QtCore.QThreadPool(self)
+        # a single writer keeps the writes of a file in order
+        self.pool.setMaxThreadCount(1)
+        self._queued = {}
+        self._lock = threading.Lock()
+
+    def save(self, fname, gt):
+        """ Write gt to fname without blocking the caller, the journal is written by the writer thread """
+        fname = str(fname)
+        gt = gt.copy()
+        seq = self.journal.next_seq()
+        with self._lock:
+            queued = fname in self._queued
+            self._queued[fname] = (seq, gt)
+        if not queued:
+            self.pool.start(WriteTask(self, fname))
+
+    def pending(self, fname):
+        """ Content of fname which is not written yet, or None """
+        with self._lock:
+            entry = self._queued.get(str(fname))
+        return entry[1].copy() if entry is not None else None
+
+    def _write(self, fname):
+        with self._lock:
+            seq, gt = self._queued[fname]
+        try:
+            self.journal.record(seq, fname, gt)
+            write_icdar2015_gt(fname, gt)
+        except OSError as e:
+            with self._lock:
+                if self._queued.get(fname, (None,))[0] == seq:
+                    del self._queued[fname]
+            self.failed.emit(fname, str(e))
+            return
+        self.journal.done(seq)
+        with self._lock:
+            if self._queued[fname][0] == seq:
+                del self._queued[fname]
+                if not self._queued:
+                    self.journal.clear()
+            else:
+                # saved again while writing, write the newer content too
+                self.pool.start(WriteTask(self, fname))
+        self.saved.emit(fname)
+
+    def recover(self):
+        """ Redo the writes a previous session did not finish, returns their files """
+        # the journal is cleared once they are written again
+        pending = self.journal.pending()
+        for fname, gt in pending.items():
+            self.save(fname, gt)
+        return list(pending)
+
+    def flush(self):
+        """ Wait until every saved file is written """
+        self.pool.waitForDone()
@@ -0,0 +1,306 @@
+""" Reading ICDAR 2015 ground truth files.
+
+    Every line of a ground truth file describes one word
+    x1,y1,x2,y2,x3,y3,x4,y4,Text
+    coordinates start from topleft(x1,y1) going clockwise and
+    ending at bottom left(x4,y4). The text may contain commas and the
+    files usually start with a UTF-8 byte order mark. Words whose text
+    is ### are "don't care" regions.
+
+    A whole ground truth folder can be packed once into a single binary
+    index file which is memory mapped, so loading the annotations of an
+    image is a dictionary lookup instead of parsing a text file.
+"""
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from archive import read_bytes
+from cache_paths import cache_file
+
+DONT_CARE = "###"
+COORDS_PER_BOX = 8
+# largest coordinate a float32 holds, larger ones would be stored as inf
+MAX_COORD = 3.4e38
+
+
+def finite_coords(values):
+    """ Whether every coordinate is a number the float32 coordinates of GroundTruth can hold """
+    return all(math.isfinite(v) and abs(v) <= MAX_COORD for v in values)
+
+
+def gt_name(image_path):
+    """ Name of the ground truth file of an image, gt_<stem>.txt """
+    return "gt_" + Path(image_path).stem + ".txt"
+
+
+class GroundTruth(object):
+    """ Annotations of one image, the coordinates of all boxes packed in one
+        float array and the transcriptions in a list.
+
+        Boxes are quadrilaterals unless starts is given, it then holds the
+        offset in coords of every box followed by len(coords) so that boxes
+        can have any number of vertices.
+    """
+    __slots__ = ("coords", "texts", "starts")
+
+    def __init__(self, coords=None, texts=None, starts=None):
+        self.coords = coords if coords is not None else array("f")
+        self.texts = texts if texts is not None else []
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for i in range(len(self.texts)):
+            yield self.points(i), self.texts[i]
+
+    def points(self, i):
+        """ Flat x1,y1,x2,y2,... coordinates of the i'th box """
+        if self.starts is None:
+            return self.coords[COORDS_PER_BOX * i:COORDS_PER_BOX * (i + 1)]
+        return self.coords[self.starts[i]:self.starts[i + 1]]
+
+    def is_dont_care(self, i):
+        return self.texts[i] == DONT_CARE
+
+    def append(self, points, text):
+        if self.starts is None and len(points) != COORDS_PER_BOX:
+            self.starts = array("I", range(0, len(self.coords) + 1, COORDS_PER_BOX))
+        self.coords.extend(points)
+        self.texts.append(text)
+        if self.starts is not None:
+            self.starts.append(len(self.coords))
+
+    def copy(self):
+        starts = array("I", self.starts) if self.starts is not None else None
+        return GroundTruth(array("f", self.coords), list(self.texts), starts)
+
+
+def parse_icdar2015_gt(data):
+    """ Parse the content of a ground truth file given as bytes or str """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8-sig", errors="replace")
+    elif data.startswith("\ufeff"):
+        data = data[1:]
+    coords = array("f")
+    texts = []
+    for line in data.splitlines():
+        fields = line.split(",", COORDS_PER_BOX)
+        if len(fields) == COORDS_PER_BOX:
+            fields.append("")
+        elif len(fields) < COORDS_PER_BOX:
+            continue
+        try:
+            values = [float(v) for v in fields[:COORDS_PER_BOX]]
+        except ValueError:
+            continue
+        if not finite_coords(values):
+            continue
+        coords.extend(values)
+        texts.append(fields[COORDS_PER_BOX])
+    return GroundTruth(coords, texts)
+
+
+def read_icdar2015_gt(fname):
+    """ Return the annotations inside the file, no annotations if it does not exist """
+    try:
+        data = read_bytes(fname)
+    except FileNotFoundError:
+        return GroundTruth()
+    return parse_icdar2015_gt(data)
+
+
+def format_icdar2015_gt(gt):
+    """ Text of a ground truth file with the given annotations """
+    lines = []
+    for points, text in gt:
+        # hundredths of a pixel whatever the image size, %g would keep 6 significant digits
+        values = [str(int(v)) if float(v).is_integer() else ("%.2f" % v).rstrip("0").rstrip(".") for v in points]
+        lines.append(",".join(values) + "," + text)
+    return "".join(line + "\r\n" for line in lines)
+
+
+def write_icdar2015_gt(fname, gt):
+    """ Replace the file by the given annotations atomically, readers see either
+        the old or the new content, never a partially written file.
+    """
+    fname = str(fname)
+    tmp = "%s.%d.tmp" % (fname, os.getpid())
+    with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(format_icdar2015_gt(gt))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fname)
+
+
+class GtIndex(object):
+    """ Memory mapped index of all ground truth files of a folder.
+
+        Layout: a header, a table of (mtime, size, first box, box count, name)
+        entries, the float32 coordinates of all boxes, the uint32 offsets of
+        the transcriptions and the UTF-8 transcriptions themselves.
+    """
+    MAGIC = b"ICDARGT1"
+    HEADER = struct.Struct("<8s2sIIQQQQ")
+    ENTRY = struct.Struct("<qqIIH")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.gt_dir = None
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, byteorder, n_files, self.n_boxes, table, self._coords,
+                self._offsets, self._blob) = GtIndex.HEADER.unpack_from(self._mm, 0)
+        if magic != GtIndex.MAGIC or byteorder != sys.byteorder[:2].encode():
+            self.close()
+            raise ValueError("%s is not a ground truth index" % path)
+        self.entries = {}
+        pos = table
+        for _ in range(n_files):
+            mtime, size, first, count, name_len = GtIndex.ENTRY.unpack_from(self._mm, pos)
+            pos += GtIndex.ENTRY.size
+            name = self._mm[pos:pos + name_len].decode("utf-8", "surrogateescape")
+            pos += name_len
+            self.entries[name] = (mtime, size, first, count)
+        gt_dir_len, = struct.unpack_from("<H", self._mm, pos)
+        self.gt_dir = self._mm[pos + 2:pos + 2 + gt_dir_len].decode("utf-8", "surrogateescape")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    @staticmethod
+    def index_path(gt_dir):
+        return cache_file("gt_index", gt_dir, ".bin")
+
+    @classmethod
+    def open_for(cls, gt_dir):
+        """ Open the index of gt_dir if it was built before, None otherwise """
+        path = cls.index_path(gt_dir)
+        if not path.exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    @classmethod
+    def build(cls, gt_dir, path=None, progress=None):
+        """ Parse every gt_*.txt file of gt_dir into a new index and open it """
+        gt_dir = os.path.abspath(str(gt_dir))
+        path = Path(path) if path is not None else cls.index_path(gt_dir)
+        table = bytearray()
+        coords = array("f")
+        offsets = array("I", [0])
+        blob = bytearray()
+        n_files = 0
+        with os.scandir(gt_dir) as entries:
+            for entry in entries:
+                if not (entry.name.endswith(".txt") and entry.is_file()):
+                    continue
+                st = entry.stat()
+                gt = read_icdar2015_gt(entry.path)
+                name = entry.name.encode("utf-8", "surrogateescape")
+                table += GtIndex.ENTRY.pack(st.st_mtime_ns, st.st_size,
+                        len(offsets) - 1, len(gt), len(name)) + name
+                coords.extend(gt.coords)
+                for text in gt.texts:
+                    blob += text.encode("utf-8", "surrogateescape")
+                    offsets.append(len(blob))
+                n_files += 1
+                if progress is not None:
+                    progress(n_files)
+        name = gt_dir.encode("utf-8", "surrogateescape")
+        table += struct.pack("<H", len(name)) + name
+
+        table_pos = GtIndex.HEADER.size
+        coords_pos = table_pos + len(table)
+        coords_pos += -coords_pos % 8
+        offsets_pos = coords_pos + len(coords) * coords.itemsize
+        blob_pos = offsets_pos + len(offsets) * offsets.itemsize
+        header = GtIndex.HEADER.pack(GtIndex.MAGIC, sys.byteorder[:2].encode(), n_files,
+                len(offsets) - 1, table_pos, coords_pos, offsets_pos, blob_pos)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(table)
+            f.write(b"\0" * (coords_pos - table_pos - len(table)))
+            coords.tofile(f)
+            offsets.tofile(f)
+            f.write(blob)
+        os.replace(tmp, path)
+        return cls(path)
+
+    def get(self, name, check=True, signature=None):
+        """ Annotations of the ground truth file called name.
+            Returns None if the file is not indexed or, when check is set,
+            has changed since the index was built. signature gives the
+            (mtime, size) of a path when the files are not stat'ed directly.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        mtime, size, first, count = entry
+        if check:
+            path = os.path.join(self.gt_dir, name)
+            if signature is not None:
+                current = signature(path)
+            else:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    return None
+                current = (st.st_mtime_ns, st.st_size)
+            if current != (mtime, size):
+                return None
+        view = memoryview(self._mm)
+        start = self._coords + first * COORDS_PER_BOX * 4
+        coords = array("f", view[start:start + count * COORDS_PER_BOX * 4].cast("f"))
+        offsets = view[self._offsets + first * 4:self._offsets + (first + count + 1) * 4].cast("I")
+        texts = [bytes(view[self._blob + offsets[i]:self._blob + offsets[i + 1]]).decode(
+                "utf-8", "surrogateescape") for i in range(count)]
+        offsets.release()
+        view.release()
+        return GroundTruth(coords, texts)
+
+
+def load_gt(gt_dir, name, index=None, files=None):
+    """ Annotations of the file name of gt_dir, from the index when it is up to date.
+        files is a byte_cache.ReadAhead to look at and read the file through.
+    """
+    path = os.path.join(str(gt_dir), name)
+    if index is not None:
+        gt = index.get(name, signature=files.signature if files is not None else None)
+        if gt is not None:
+            return gt
+    if files is None:
+        return read_icdar2015_gt(path)
+    try:
+        return parse_icdar2015_gt(files.read(path))
+    except FileNotFoundError:
+        return GroundTruth()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build the index of an ICDAR 2015 ground truth folder")
+    parser.add_argument("gt_dir")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    index = GtIndex.build(args.gt_dir)
+    print("indexed %d files, %d boxes in %.2fs -> %s" % (len(index), index.n_boxes,
+            time.perf_counter() - start, index.path))
@@ -0,0 +1,333 @@
+""" Display adjustments of the shown image: brightness, contrast, gamma, a single
+    channel or grayscale, and contrast limited adaptive histogram equalization.
+
+    The pixels of the 32 bit QImages the viewer decodes are worked on in place
+    with NumPy, through arrays viewing the QImage buffers: the source is read
+    from its buffer and the result written straight into the buffer of the
+    QImage that is shown, a band of rows at a time to keep temporaries small.
+    ImageAdjuster computes them in a worker thread, at the resolution the image
+    is displayed at first and then at full resolution, and caches both per
+    image and setting. Equalization does not depend on the other settings and
+    is cached on its own, moving a slider only applies a lookup table.
+"""
+import sys
+from collections import namedtuple
+
+import numpy as np
+from PyQt5 import QtCore, QtGui
+
+from image_cache import ImageCache
+
+# memory budget of the adjusted images, previews and equalized images
+DEFAULT_BUDGET = 256 * 1024 * 1024
+# rows processed at a time
+BAND = 256
+# displayed at a larger scale, the image is adjusted at full resolution right away
+PREVIEW_MAX_SCALE = 0.5
+# tiles per side and clip limit of the equalization
+TILES = 8
+CLIP_LIMIT = 2.0
+
+# brightness is added to values in [0, 1], contrast scales them around 0.5,
+# channel is "rgb", "red", "green" or "blue", a single channel is shown gray
+Adjustments = namedtuple("Adjustments", "brightness contrast gamma channel grayscale equalize")
+IDENTITY = Adjustments(0.0, 1.0, 1.0, "rgb", False, False)
+
+# byte offsets of red, green, blue and alpha in a 32 bit pixel, stored as 0xAARRGGBB
+if sys.byteorder == "little":
+    _RED, _GREEN, _BLUE, _ALPHA = 2, 1, 0, 3
+    _COLORS = slice(0, 3)
+else:
+    _RED, _GREEN, _BLUE, _ALPHA = 1, 2, 3, 0
+    _COLORS = slice(1, 4)
+_CHANNELS = {"red": _RED, "green": _GREEN, "blue": _BLUE}
+_FORMATS = (QtGui.QImage.Format_RGB32, QtGui.QImage.Format_ARGB32, QtGui.QImage.Format_ARGB32_Premultiplied)
+
+
+def pixels(image, writable=False):
+    """ (height, width, 4) uint8 array viewing the buffer of a 32 bit QImage, no copy made.
+        Only a writable view detaches the image from the buffers it shares.
+    """
+    bits = image.bits() if writable else image.constBits()
+    bits.setsize(image.bytesPerLine() * image.height())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)
+
+
+def as_32bit(image):
+    """ image itself if it is one of the 32 bit formats worked on, a converted copy otherwise """
+    if image.format() in _FORMATS:
+        return image
+    return image.convertToFormat(QtGui.QImage.Format_RGB32)
+
+
+def tone_curve(adjustments):
+    """ Lookup table of the brightness, contrast and gamma adjustments of 8 bit values """
+    x = np.arange(256, dtype=np.float32) / 255
+    y = np.clip((x - 0.5) * adjustments.contrast + 0.5 + adjustments.brightness, 0.0, 1.0)
+    y **= 1.0 / adjustments.gamma
+    return np.round(y * 255).astype(np.uint8)
+
+
+def luma(band):
+    """ 8 bit Rec. 601 luma of a band of pixels """
+    y = band[..., _RED] * np.uint16(77)
+    y += band[..., _GREEN] * np.uint16(150)
+    y += band[..., _BLUE] * np.uint16(29)
+    y += np.uint16(128)
+    return (y >> 8).astype(np.uint8)
+
+
+def _new_image(image):
+    result = QtGui.QImage(image.width(), image.height(), image.format())
+    return result, pixels(result, writable=True)
+
+
+def apply_tone(image, adjustments):
+    """ New QImage of image with the tone curve and the channel selection applied.
+
+        Colors go through a table of 16 bit values, two channels per lookup.
+        A single channel or the luma goes through a table of whole gray pixels.
+    """
+    image = as_32bit(image)
+    src = pixels(image)
+    result, dst = _new_image(image)
+    lut = tone_curve(adjustments)
+    channel = _CHANNELS.get(adjustments.channel)
+    single = channel is not None or adjustments.grayscale
+    if single:
+        table = lut.astype(np.uint32) * np.uint32(0x010101) | np.uint32(0xFF000000)
+    else:
+        values = np.arange(65536)
+        table = lut[values & 0xFF].astype(np.uint16) | lut[values >> 8].astype(np.uint16) << 8
+    keep_alpha = image.hasAlphaChannel() or not single
+    for start in range(0, image.height(), BAND):
+        s, d = src[start:start + BAND], dst[start:start + BAND]
+        if single:
+            plane = s[..., channel] if channel is not None else luma(s)
+            np.take(table, plane, out=d.view(np.uint32)[..., 0], mode="clip")
+        else:
+            np.take(table, s.view(np.uint16), out=d.view(np.uint16), mode="clip")
+        if keep_alpha:
+            d[..., _ALPHA] = s[..., _ALPHA]
+    return result
+
+
+def _tile_edges(n, tiles):
+    edges = np.linspace(0, n, tiles + 1).round().astype(np.intp)
+    centres = (edges[:-1] + edges[1:] - 1) / 2.0
+    return edges, centres
+
+
+def _interpolation(n, centres):
+    """ For each of n positions, the two nearest tiles and the weight of the second one """
+    pos = np.arange(n, dtype=np.float32)
+    last = len(centres) - 1
+    first = np.clip(np.searchsorted(centres, pos, side="right") - 1, 0, last)
+    second = np.minimum(first + 1, last)
+    span = np.where(second > first, centres[second] - centres[first], 1.0)
+    weight = np.clip((pos - centres[first]) / span, 0.0, 1.0).astype(np.float32)
+    return first, second, weight
+
+
+def equalization_tables(plane, tiles=TILES, clip_limit=CLIP_LIMIT):
+    """ Clipped histogram equalization lookup tables of the tiles of an 8 bit plane,
+        a (tiles_y, tiles_x, 256) float32 array
+    """
+    h, w = plane.shape
+    ty, tx = max(1, min(tiles, h)), max(1, min(tiles, w))
+    ys, _ = _tile_edges(h, ty)
+    xs, _ = _tile_edges(w, tx)
+    tables = np.empty((ty, tx, 256), dtype=np.float32)
+    for i in range(ty):
+        for j in range(tx):
+            tile = plane[ys[i]:ys[i + 1], xs[j]:xs[j + 1]]
+            hist = np.bincount(tile.ravel(), minlength=256).astype(np.float32)
+            # the counts above the limit are spread over all the values, bounding the contrast gain
+            limit = max(1.0, clip_limit * tile.size / 256.0)
+            excess = np.maximum(hist - limit, 0.0).sum()
+            hist = np.minimum(hist, limit) + excess / 256.0
+            cdf = np.cumsum(hist)
+            tables[i, j] = cdf * (255.0 / cdf[-1])
+    return tables
+
+
+def equalize(image, tiles=TILES, clip_limit=CLIP_LIMIT):
+    """ New QImage of image with contrast limited adaptive histogram equalization.
+
+        The tables are built from the luma of tiles of the image and applied
+        to every color channel, interpolated bilinearly between the centres
+        of the neighbouring tiles, which keeps the hues.
+    """
+    image = as_32bit(image)
+    src = pixels(image)
+    h, w = image.height(), image.width()
+    plane = np.empty((h, w), dtype=np.uint8)
+    for start in range(0, h, BAND):
+        plane[start:start + BAND] = luma(src[start:start + BAND])
+    tables = equalization_tables(plane, tiles, clip_limit)
+    ty, tx = tables.shape[:2]
+    flat = tables.reshape(-1)
+    _, cy = _tile_edges(h, ty)
+    _, cx = _tile_edges(w, tx)
+    y0, y1, wy = _interpolation(h, cy)
+    x0, x1, wx = _interpolation(w, cx)
+    result, dst = _new_image(image)
+    for start in range(0, h, BAND):
+        rows = slice(start, start + BAND)
+        # offsets of the tables of the four neighbouring tiles of every pixel
+        t00 = ((y0[rows, None] * tx + x0[None, :]) * 256).astype(np.int32)
+        t01 = ((y0[rows, None] * tx + x1[None, :]) * 256).astype(np.int32)
+        t10 = ((y1[rows, None] * tx + x0[None, :]) * 256).astype(np.int32)
+        t11 = ((y1[rows, None] * tx + x1[None, :]) * 256).astype(np.int32)
+        a, b = wy[rows, None], wx[None, :]
+        s, d = src[rows], dst[rows]
+        for c in (_RED, _GREEN, _BLUE):
+            v = s[..., c]
+            top = flat[t00 + v] * (1 - b) + flat[t01 + v] * b
+            bottom = flat[t10 + v] * (1 - b) + flat[t11 + v] * b
+            value = top * (1 - a) + bottom * a
+            value += 0.5
+            d[..., c] = value.astype(np.uint8)
+        d[..., _ALPHA] = s[..., _ALPHA]
+    return result
+
+
+def adjust(image, adjustments):
+    """ New QImage of image with the adjustments applied """
+    if adjustments.equalize:
+        image = equalize(image)
+    return apply_tone(image, adjustments._replace(equalize=False))
+
+
+class _AdjustSignals(QtCore.QObject):
+    # image key, adjustments, result and whether it is at full resolution
+    ready = QtCore.pyqtSignal(object, object, QtGui.QImage, bool)
+    finished = QtCore.pyqtSignal()
+
+
+class AdjustTask(QtCore.QRunnable):
+    """ Adjusts an image in a worker thread, a preview of the given size first when there is one """
+
+    def __init__(self, adjuster, image, adjustments, preview_size):
+        super(AdjustTask, self).__init__()
+        self.adjuster = adjuster
+        self.image = image
+        self.adjustments = adjustments
+        self.preview_size = preview_size
+
+    def run(self):
+        adjuster = self.adjuster
+        key = self.image.cacheKey()
+        try:
+            if self.preview_size is not None:
+                preview = adjuster.render(self.image, self.adjustments, self.preview_size)
+                adjuster.signals.ready.emit(key, self.adjustments, preview, False)
+                if adjuster.wanted is not None:
+                    # the slider moved on, the full resolution would be stale when done
+                    return
+            full = adjuster.render(self.image, self.adjustments)
+            adjuster.signals.ready.emit(key, self.adjustments, full, True)
+        finally:
+            adjuster.signals.finished.emit()
+
+
+class ImageAdjuster(QtCore.QObject):
+    """ Applies Adjustments to the shown image in a worker thread.
+
+        `adjusted` is emitted with a preview at display resolution first, then
+        with the full resolution image. Requests made while one is computed
+        are coalesced, only the latest is computed next.
+    """
+    adjusted = QtCore.pyqtSignal(QtGui.QImage, bool)
+
+    def __init__(self, cache=None, parent=None):
+        super(ImageAdjuster, self).__init__(parent)
+        self.cache = cache if cache is not None else ImageCache(DEFAULT_BUDGET)
+        self.image = QtGui.QImage()
+        self.adjustments = IDENTITY
+        self.scale = 1.0
+        self.running = None
+        # (image, adjustments, preview size) to compute once the running task is done
+        self.wanted = None
+        self.signals = _AdjustSignals()
+        self.signals.ready.connect(self._ready)
+        self.signals.finished.connect(self._finished)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+    def render(self, image, adjustments, size=None):
+        """ image adjusted at full resolution, or scaled to size, through the cache """
+        key = (image.cacheKey(), size, adjustments)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        base = image
+        if size is not None:
+            base = self.cache.get((key[0], size, None))
+            if base is None:
+                base = image.scaled(size[0], size[1], QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+                self.cache.put((key[0], size, None), base)
+        if adjustments.equalize:
+            equalized = self.cache.get((key[0], size, "equalized"))
+            if equalized is None:
+                equalized = equalize(base)
+                self.cache.put((key[0], size, "equalized"), equalized)
+            base = equalized
+        result = apply_tone(base, adjustments._replace(equalize=False))
+        self.cache.put(key, result)
+        return result
+
+    def set_image(self, image, scale=1.0):
+        """ Adjust image, displayed at scale, with the current adjustments """
+        self.image = image
+        self.request(self.adjustments, scale)
+
+    def request(self, adjustments, scale=None):
+        """ Adjust the image with the given adjustments, displayed at scale """
+        self.adjustments = adjustments
+        if scale is not None:
+            self.scale = scale
+        if self.image.isNull():
+            return
+        if adjustments == IDENTITY:
+            self.wanted = None
+            self.adjusted.emit(self.image, True)
+            return
+        key = self.image.cacheKey()
+        full = self.cache.get((key, None, adjustments))
+        if full is not None:
+            self.wanted = None
+            self.adjusted.emit(full, True)
+            return
+        size = None
+        if self.scale < PREVIEW_MAX_SCALE:
+            size = (max(1, int(round(self.image.width() * self.scale))),
+                    max(1, int(round(self.image.height() * self.scale))))
+            preview = self.cache.get((key, size, adjustments))
+            if preview is not None:
+                self.adjusted.emit(preview, False)
+        self.wanted = (self.image, adjustments, size)
+        if self.running is None:
+            self._start()
+
+    def _start(self):
+        image, adjustments, size = self.wanted
+        self.wanted = None
+        self.running = AdjustTask(self, image, adjustments, size)
+        self.pool.start(self.running)
+
+    def _ready(self, key, adjustments, image, full):
+        if key != self.image.cacheKey() or adjustments != self.adjustments:
+            return
+        self.adjusted.emit(image, full)
+
+    def _finished(self):
+        self.running = None
+        if self.wanted is not None:
+            self._start()
+
+    def shutdown(self):
+        """ Drop the waiting request and wait for the running one """
+        self.wanted = None
+        self.pool.waitForDone()
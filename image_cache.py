@@ -0,0 +1,284 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+
+from archive import split_archive_path, stat_path, Archive
+from tracing import span
+
+# default memory budget of the decoded image cache in bytes
+DEFAULT_BUDGET = 512 * 1024 * 1024
+# images with more pixels are shown tiled instead of being decoded at once
+LARGE_IMAGE_PIXELS = 40 * 1000 * 1000
+
+
+def image_key(path, files=None):
+    """ Cache key of an image file, its path together with its modification time.
+        files is the byte_cache.ReadAhead the file is read through, if any.
+    """
+    path = str(path)
+    if files is not None:
+        signature = files.signature(path)
+        return (path, signature[0] if signature is not None else None)
+    try:
+        return (path, stat_path(path).st_mtime_ns)
+    except OSError:
+        return (path, None)
+
+
+def image_nbytes(image):
+    """ Number of bytes used by the pixels of a QImage """
+    if hasattr(image, "sizeInBytes"):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+def image_reader(path, data=None):
+    """ QImageReader of an image file or of an image inside an archive,
+        reading data instead when the bytes of the file are given.
+    """
+    if data is None:
+        split = split_archive_path(path)
+        if split is None:
+            return QtGui.QImageReader(str(path))
+        try:
+            data = Archive.open(split[0]).read(split[1])
+        except OSError:
+            return QtGui.QImageReader()
+    buffer = QtCore.QBuffer()
+    buffer.setData(data)
+    buffer.open(QtCore.QIODevice.ReadOnly)
+    reader = QtGui.QImageReader(buffer)
+    # the reader does not own its device
+    reader.buffer = buffer
+    return reader
+
+
+def image_size(path, data=None):
+    """ Size of an image read from the file header, without decoding pixels """
+    return image_reader(path, data).size()
+
+
+def is_large_image(path, data=None):
+    size = image_size(path, data)
+    return size.width() * size.height() > LARGE_IMAGE_PIXELS
+
+
+def decode_image(path, data=None):
+    """ Decode the image file into a QImage in a format QPixmap can use without conversion """
+    image = image_reader(path, data).read()
+    if image.isNull():
+        return image
+    if image.hasAlphaChannel():
+        return image.convertToFormat(QtGui.QImage.Format_ARGB32_Premultiplied)
+    return image.convertToFormat(QtGui.QImage.Format_RGB32)
+
+
+class ImageCache(object):
+    """ Thread safe LRU cache of decoded QImages bounded by a memory budget in bytes """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._images
+
+    def get(self, key):
+        """ Return the cached image of key or None, marking it as most recently used """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        """ Store the image and evict the least recently used ones exceeding the budget """
+        nbytes = image_nbytes(image)
+        if image.isNull() or nbytes > self.budget:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.size -= image_nbytes(old)
+            self._images[key] = image
+            self.size += nbytes
+            while self.size > self.budget:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= image_nbytes(evicted)
+
+    def set_budget(self, budget):
+        """ Change the memory budget, evicting images if needed """
+        with self._lock:
+            self.budget = budget
+            while self._images and self.size > self.budget:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= image_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+
+class DecodeTask(QtCore.QRunnable):
+    """ Decodes a single image file in a worker thread and stores it in the cache """
+
+    def __init__(self, loader, path):
+        super(DecodeTask, self).__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.path = path
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            # the file is only looked at here, on network storage that is slow too
+            key = self.loader.key(self.path)
+            if key in self.loader.cache:
+                return
+            data = self.loader.file_bytes(self.path)
+            # large images are shown tiled, decoding them whole would only waste memory
+            if not is_large_image(self.path, data):
+                with span("prefetch_decode"):
+                    image = decode_image(self.path, data)
+                self.loader.cache.put(key, image)
+        finally:
+            self.loader._finish(self)
+
+
+class ImageLoader(QtCore.QObject):
+    """ Loads images through the cache and decodes the neighbours of the
+        current image in the background so that stepping to them is instant.
+
+        With a byte_cache.ReadAhead as files, the images are read through it
+        and the bytes of the `read_ahead` next images, and of the files
+        `companions` gives for them like their ground truth, are fetched
+        further ahead than the decodes go.
+    """
+    imageDecoded = QtCore.pyqtSignal(str)
+
+    def __init__(self, cache=None, ahead=3, behind=2, files=None, read_ahead=8, parent=None):
+        super(ImageLoader, self).__init__(parent)
+        self.cache = cache if cache is not None else ImageCache()
+        self.ahead = ahead
+        self.behind = behind
+        self.files = files
+        self.read_ahead = read_ahead
+        # function of an image path giving the paths of other files read along with it
+        self.companions = None
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(4, QtCore.QThread.idealThreadCount() - 1)))
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _finish(self, task):
+        with self._lock:
+            if self._pending.get(task.path) is task:
+                del self._pending[task.path]
+        task.done.set()
+        self.imageDecoded.emit(task.path)
+
+    def key(self, path):
+        return image_key(path, self.files)
+
+    def file_bytes(self, path):
+        """ Bytes of the image file from the read-ahead cache, None to read it from its path """
+        if self.files is None:
+            return None
+        signature = self.files.signature(path)
+        if signature is None or signature[1] > self.files.max_file_size:
+            return None
+        try:
+            return self.files.read(path)
+        except OSError:
+            return None
+
+    def load(self, path):
+        """ Return the decoded image of path, decoding it at most once """
+        path = str(path)
+        key = self.key(path)
+        image = self.cache.get(key)
+        if image is not None:
+            return image
+        with self._lock:
+            task = self._pending.get(path)
+        if task is not None:
+            if self.pool.tryTake(task):
+                # not started yet, decoding here is faster than waiting for a worker
+                with self._lock:
+                    self._pending.pop(path, None)
+                task.done.set()
+            else:
+                task.done.wait()
+                image = self.cache.get(key)
+                if image is not None:
+                    return image
+        image = decode_image(path, self.file_bytes(path))
+        self.cache.put(key, image)
+        return image
+
+    def prefetch(self, paths):
+        """ Decode the given paths in the background, in the given order of priority.
+            Queued decodes of paths that are not wanted anymore are cancelled.
+        """
+        wanted = []
+        for path in paths:
+            path = str(path)
+            # files not looked at lately are checked by the task, not here
+            signature = self.files.cached_signature(path) if self.files is not None else None
+            if signature is False or self.key(path) not in self.cache:
+                wanted.append(path)
+        wanted_set = set(wanted)
+        with self._lock:
+            for path, task in list(self._pending.items()):
+                if path not in wanted_set and self.pool.tryTake(task):
+                    del self._pending[path]
+                    task.done.set()
+            tasks = []
+            for priority, path in enumerate(reversed(wanted)):
+                if path in self._pending:
+                    continue
+                task = DecodeTask(self, path)
+                self._pending[path] = task
+                tasks.append((priority, task))
+        for priority, task in tasks:
+            self.pool.start(task, priority)
+
+    def prefetch_around(self, paths, index):
+        """ Prefetch the next `ahead` and previous `behind` entries of paths around index,
+            and read the bytes of the next `read_ahead` ones
+        """
+        order = []
+        for step in range(1, max(self.ahead, self.behind) + 1):
+            if step <= self.ahead and index + step < len(paths):
+                order.append(paths[index + step])
+            if step <= self.behind and index - step >= 0:
+                order.append(paths[index - step])
+        if self.files is not None:
+            files = []
+            ahead = [paths[i] for i in range(index, min(len(paths), index + self.read_ahead + 1))]
+            for path in order + [path for path in ahead if path not in order]:
+                files.append(path)
+                if self.companions is not None:
+                    files.extend(self.companions(path))
+            self.files.prefetch(files)
+        self.prefetch(order)
+
+    def cancel(self):
+        """ Drop all queued decodes and reads """
+        self.prefetch([])
+        if self.files is not None:
+            self.files.cancel()
+
+    def shutdown(self):
+        """ Cancel queued decodes and wait for the running ones """
+        self.cancel()
+        self.pool.waitForDone()
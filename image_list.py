@@ -0,0 +1,317 @@
+import bisect
+import os
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+
+from archive import Archive, is_archive
+from cache_paths import cache_file
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def is_image_name(name, extensions=IMAGE_EXTENSIONS):
+    return os.path.splitext(name)[1].lower() in extensions
+
+
+def scan_images(path, extensions=IMAGE_EXTENSIONS):
+    """ Yield the names of the image files directly under path in directory order.
+        A single os.scandir pass, file types come from the directory entries.
+        For an archive, the image members anywhere in it are listed instead.
+    """
+    if is_archive(path):
+        for name in Archive.open(path).names():
+            if is_image_name(name, extensions):
+                yield name
+        return
+    with os.scandir(str(path)) as entries:
+        for entry in entries:
+            if is_image_name(entry.name, extensions) and entry.is_file():
+                yield entry.name
+
+
+def read_listing(path):
+    """ Image names of path saved by write_listing, or None when the folder
+        changed since, which is seen from its modification time.
+    """
+    try:
+        mtime = os.stat(str(path)).st_mtime_ns
+        with open(str(cache_file("listings", path, ".txt")), encoding="utf-8", errors="surrogateescape") as f:
+            if f.readline().rstrip("\n") != str(mtime):
+                return None
+            return f.read().splitlines()
+    except (OSError, ValueError):
+        return None
+
+
+def write_listing(path, names):
+    """ Save the image names of path so they are not scanned again while it does not change """
+    try:
+        mtime = os.stat(str(path)).st_mtime_ns
+        listing = str(cache_file("listings", path, ".txt"))
+        with open(listing + ".tmp", "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.write("%d\n" % mtime)
+            for name in names:
+                f.write(name + "\n")
+        os.replace(listing + ".tmp", listing)
+    except OSError:
+        pass
+
+
+class ImageListModel(QtCore.QAbstractListModel):
+    """ List of the images of a folder.
+
+        Only the file names relative to the folder are stored, full paths and
+        display strings are built when a view asks for them. The model can be
+        indexed like the list of full paths it replaces. A filter hides the
+        names it rejects, rows and indexing then only cover the shown names.
+    """
+    PathRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super(ImageListModel, self).__init__(parent)
+        self.root = None
+        self.names = []
+        self.all_names = self.names
+        self.filter = None
+        # order of the names other than by name, see sort_names
+        self.sort_key = None
+        self.thumbnails = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, row):
+        return os.path.join(self.root, self.names[row])
+
+    def __iter__(self):
+        for name in self.names:
+            yield os.path.join(self.root, name)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        if role == Qt.DisplayRole:
+            return self.names[index.row()]
+        if role in (Qt.ToolTipRole, ImageListModel.PathRole):
+            return self[index.row()]
+        if role == Qt.DecorationRole and self.thumbnails is not None:
+            return self.thumbnails.thumbnail(self[index.row()], index.row())
+        return None
+
+    def set_thumbnails(self, provider):
+        """ Show thumbnails from provider as decorations, or none if it is None """
+        if self.thumbnails is not None:
+            self.thumbnails.thumbnailReady.disconnect(self.thumbnailReady)
+        self.thumbnails = provider
+        if provider is not None:
+            provider.thumbnailReady.connect(self.thumbnailReady)
+        if self.names:
+            self.dataChanged.emit(self.index(0), self.index(len(self.names) - 1), [Qt.DecorationRole])
+
+    def thumbnailReady(self, path, row):
+        if not (0 <= row < len(self.names)) or self[row] != path:
+            row = self.row_of(path)
+            if row < 0:
+                return
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def reset(self, root):
+        """ Empty the list and make root the folder of the following names """
+        self.beginResetModel()
+        self.root = str(root) if root is not None else None
+        self.names = []
+        self.all_names = self.names
+        self.filter = None
+        self.sort_key = None
+        self.endResetModel()
+
+    def set_filter(self, keep):
+        """ Only show the names for which keep(name) is true, all of them if keep is None """
+        self.beginResetModel()
+        self.filter = keep
+        if keep is None:
+            self.names = self.all_names
+        else:
+            self.names = [name for name in self.all_names if keep(name)]
+        self.endResetModel()
+
+    def append(self, names):
+        """ Append a batch of file names at the end of the list """
+        if self.filter is not None:
+            self.all_names.extend(names)
+            names = [name for name in names if self.filter(name)]
+        if not names:
+            return
+        first = len(self.names)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(names) - 1)
+        self.names.extend(names)
+        self.endInsertRows()
+
+    def insert_sorted(self, names):
+        """ Insert new names at their place in the sorted list, neighbouring names in one go """
+        if self.sort_key is not None:
+            self.append(names)
+            self.sort_names(self.sort_key)
+            return
+        names = sorted(names)
+        if self.filter is not None:
+            for name in names:
+                bisect.insort(self.all_names, name)
+            names = [name for name in names if self.filter(name)]
+        i = 0
+        while i < len(names):
+            row = bisect.bisect_left(self.names, names[i])
+            j = i + 1
+            if row < len(self.names):
+                while j < len(names) and names[j] < self.names[row]:
+                    j += 1
+            else:
+                j = len(names)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row + j - i - 1)
+            self.names[row:row] = names[i:j]
+            self.endInsertRows()
+            i = j
+
+    def _runs(self, names, gone):
+        """ (first, last) rows of the runs of consecutive names in gone, found by
+            bisection while names is sorted by name, which is only the case without sort_key
+        """
+        if self.sort_key is not None:
+            rows = [row for row, name in enumerate(names) if name in gone]
+        else:
+            rows = []
+            for name in gone:
+                row = bisect.bisect_left(names, name)
+                if row < len(names) and names[row] == name:
+                    rows.append(row)
+            rows.sort()
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        return runs
+
+    def remove_names(self, names):
+        """ Remove the given names, consecutive rows in one go """
+        gone = set(names)
+        if self.filter is not None:
+            for first, last in reversed(self._runs(self.all_names, gone)):
+                del self.all_names[first:last + 1]
+        # from the end so the rows of the earlier runs stay valid
+        for first, last in reversed(self._runs(self.names, gone)):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self.names[first:last + 1]
+            self.endRemoveRows()
+
+    def sort_names(self, key=None):
+        """ Sort the names keeping selections and the current index on the same files.
+            key orders them by something else than the name until sorted without one again.
+        """
+        self.sort_key = key
+        names = self.names
+        self.layoutAboutToBeChanged.emit()
+        order = sorted(range(len(names)), key=(lambda row: key(names[row])) if key else names.__getitem__)
+        new_row = [0] * len(order)
+        for row, old in enumerate(order):
+            new_row[old] = row
+        self.names = [self.names[old] for old in order]
+        if self.filter is None:
+            self.all_names = self.names
+        else:
+            self.all_names.sort(key=key)
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(persistent,
+                [self.index(new_row[index.row()]) for index in persistent])
+        self.layoutChanged.emit()
+
+    def row_of(self, path):
+        """ Row of the given full path or -1 """
+        try:
+            return self.names.index(os.path.relpath(str(path), self.root))
+        except ValueError:
+            return -1
+
+
+class FolderLister(QtCore.QThread):
+    """ Lists all the images of a folder in a background thread, each time it is started,
+        and delivers the names added and removed since the previous listing through `changed`.
+        The listing cache is written from the thread as well.
+    """
+    # added names, removed names
+    changed = QtCore.pyqtSignal(list, list)
+
+    def __init__(self, path, names, extensions=IMAGE_EXTENSIONS, parent=None):
+        """ names are the ones listed before, the set is made in the thread """
+        super(FolderLister, self).__init__(parent)
+        self.path = str(path)
+        self.extensions = extensions
+        self.error = None
+        self._names = list(names)
+
+    def run(self):
+        try:
+            listed = set(scan_images(self.path, self.extensions))
+        except OSError as e:
+            self.error = e
+            return
+        self.error = None
+        if not isinstance(self._names, set):
+            self._names = set(self._names)
+        added = sorted(listed - self._names)
+        removed = sorted(self._names - listed)
+        if not added and not removed:
+            return
+        self._names = listed
+        write_listing(self.path, sorted(listed))
+        self.changed.emit(added, removed)
+
+
+class DirectoryScanner(QtCore.QThread):
+    """ Lists the images of a folder in a background thread.
+
+        Names are delivered in batches through `found`, the first one as soon
+        as the first image is seen so it can be shown while the scan goes on.
+    """
+    found = QtCore.pyqtSignal(list)
+
+    def __init__(self, path, extensions=IMAGE_EXTENSIONS, interval=0.05, parent=None):
+        super(DirectoryScanner, self).__init__(parent)
+        self.path = str(path)
+        self.extensions = extensions
+        self.interval = interval
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        batch = []
+        last = 0.0
+        try:
+            for name in scan_images(self.path, self.extensions):
+                if self._cancelled:
+                    return
+                batch.append(name)
+                now = time.monotonic()
+                if now - last >= self.interval:
+                    self.found.emit(batch)
+                    batch = []
+                    last = now
+        except OSError as e:
+            self.error = e
+        if batch and not self._cancelled:
+            self.found.emit(batch)
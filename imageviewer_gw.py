@@ -2,36 +2,21 @@
 
 # Form implementation generated from reading ui file 'imageviewer_gw.ui'
 #
-# Created by: PyQt5 UI code generator 5.10.1
+# Created by: PyQt5 UI code generator 5.15.11
 #
-# WARNING! All changes made in this file will be lost!
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
         MainWindow.resize(856, 557)
         self.centralwidget = QtWidgets.QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
-        self.verticalLayout_5 = QtWidgets.QVBoxLayout(self.centralwidget)
-        self.verticalLayout_5.setObjectName("verticalLayout_5")
-        self.verticalLayout = QtWidgets.QVBoxLayout()
-        self.verticalLayout.setObjectName("verticalLayout")
-        self.scrollArea = QtWidgets.QScrollArea(self.centralwidget)
-        self.scrollArea.setWidgetResizable(True)
-        self.scrollArea.setObjectName("scrollArea")
-        self.scrollAreaWidgetContents = QtWidgets.QWidget()
-        self.scrollAreaWidgetContents.setGeometry(QtCore.QRect(0, 0, 473, 491))
-        self.scrollAreaWidgetContents.setObjectName("scrollAreaWidgetContents")
-        self.verticalLayout_2 = QtWidgets.QVBoxLayout(self.scrollAreaWidgetContents)
-        self.verticalLayout_2.setObjectName("verticalLayout_2")
-        self.graphicsView = QtWidgets.QGraphicsView(self.scrollAreaWidgetContents)
-        self.graphicsView.setObjectName("graphicsView")
-        self.verticalLayout_2.addWidget(self.graphicsView)
-        self.scrollArea.setWidget(self.scrollAreaWidgetContents)
-        self.verticalLayout.addWidget(self.scrollArea)
-        self.verticalLayout_5.addLayout(self.verticalLayout)
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
         self.menubar.setGeometry(QtCore.QRect(0, 0, 856, 22))
@@ -83,9 +68,15 @@ class Ui_MainWindow(object):
         self.dockWidgetContents_11.setObjectName("dockWidgetContents_11")
         self.verticalLayout_9 = QtWidgets.QVBoxLayout(self.dockWidgetContents_11)
         self.verticalLayout_9.setObjectName("verticalLayout_9")
-        self.listWidget_images = QtWidgets.QListWidget(self.dockWidgetContents_11)
-        self.listWidget_images.setObjectName("listWidget_images")
-        self.verticalLayout_9.addWidget(self.listWidget_images)
+        self.lineEdit_search = QtWidgets.QLineEdit(self.dockWidgetContents_11)
+        self.lineEdit_search.setClearButtonEnabled(True)
+        self.lineEdit_search.setObjectName("lineEdit_search")
+        self.verticalLayout_9.addWidget(self.lineEdit_search)
+        self.listView_images = QtWidgets.QListView(self.dockWidgetContents_11)
+        self.listView_images.setLayoutMode(QtWidgets.QListView.Batched)
+        self.listView_images.setUniformItemSizes(True)
+        self.listView_images.setObjectName("listView_images")
+        self.verticalLayout_9.addWidget(self.listView_images)
         self.dockWidget_11.setWidget(self.dockWidgetContents_11)
         MainWindow.addDockWidget(QtCore.Qt.DockWidgetArea(1), self.dockWidget_11)
 
@@ -103,4 +94,4 @@ class Ui_MainWindow(object):
         self.checkBox_poly.setText(_translate("MainWindow", "Show Poly"))
         self.checkBox_text.setText(_translate("MainWindow", "Show Text"))
         self.dockWidget_11.setWindowTitle(_translate("MainWindow", "Image Files"))
-
+        self.lineEdit_search.setPlaceholderText(_translate("MainWindow", "Search transcriptions"))
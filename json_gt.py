@@ -0,0 +1,296 @@
+""" Reading the ground truth of datasets kept in one large JSON file.
+
+    COCO-Text holds the annotations of all its images in a single JSON file
+    of hundreds of megabytes
+    {"imgs": {"36": {"id": 36, "file_name": "COCO_train2014_000000000036.jpg", ...}, ...},
+     "anns": {"1": {"image_id": 36, "mask": [x1, y1, ...], "bbox": [x, y, w, h],
+                    "utf8_string": "text", "legibility": "legible", ...}, ...},
+     "imgToAnns": {...}, ...}
+    and COCO style files list them in "images" and "annotations" arrays
+    instead, with "segmentation" or "points" polygons and "text" transcriptions.
+
+    The file is read once, a chunk at a time, to find where the annotations
+    of every image are in it. These byte ranges are saved in an index file,
+    showing an image then only reads and decodes its own annotations.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from cache_paths import cache_file
+from icdar_gt import DONT_CARE, GroundTruth, finite_coords
+
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+_NUMBER = frozenset("0123456789.eE+-")
+
+
+class _Scanner(object):
+    """ Reads JSON values one after the other from a file read in chunks.
+
+        The bytes are decoded as Latin-1 so that a character is a byte and
+        positions in the text are file offsets. The JSON syntax is ASCII so
+        this does not change the structure, only non ASCII strings have to
+        be decoded again, see _utf8.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        # file offset of self.text[0]
+        self.base = 0
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.base += self.pos
+        self.text = self.text[self.pos:] + chunk.decode("latin-1")
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ The next character which is not white space, "" at the end of the file """
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        """ Consume the next character, one of chars """
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError("Expected %r at offset %d, found %r" % (chars, self.base + self.pos, c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        """ The next value decoded, with its start and end offsets in the file """
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except ValueError:
+                # the value goes on in the next chunk
+                if not self._fill():
+                    raise
+                continue
+            # so may a number ending the chunk, 1.5 may have been read as 1
+            if (isinstance(value, (int, float)) and (end == len(self.text) or self.text[end] in _NUMBER)
+                    and self._fill()):
+                continue
+            start = self.base + self.pos
+            self.pos = end
+            return value, start, self.base + end
+
+
+def iter_members(f, chunk_size=CHUNK_SIZE):
+    """ Yield (key, member, value, start, end) for every member of the objects and
+        every item of the arrays found at the top level of the JSON document in
+        the binary file f. key is the top level key, member the key of the value
+        inside an object or None, start and end its offsets in the file. Top level
+        values which are neither objects nor arrays are yielded with no member.
+        Only one value is decoded at a time, never the whole document.
+    """
+    scanner = _Scanner(f, chunk_size)
+    scanner.expect("{")
+    if scanner.peek() == "}":
+        return
+    while True:
+        key = _utf8(scanner.value()[0])
+        scanner.expect(":")
+        opening = scanner.peek()
+        if opening in ("{", "["):
+            closing = "}" if opening == "{" else "]"
+            scanner.pos += 1
+            if scanner.peek() == closing:
+                scanner.pos += 1
+            else:
+                while True:
+                    member = None
+                    if opening == "{":
+                        member = _utf8(scanner.value()[0])
+                        scanner.expect(":")
+                    value, start, end = scanner.value()
+                    yield key, member, value, start, end
+                    if scanner.expect("," + closing) == closing:
+                        break
+        else:
+            value, start, end = scanner.value()
+            yield key, None, value, start, end
+        if scanner.expect(",}") == "}":
+            return
+
+
+def _utf8(s):
+    """ A string decoded by the scanner as Latin-1, decoded as UTF-8 """
+    if not isinstance(s, str) or s.isascii():
+        return s
+    try:
+        return s.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        # \u escapes were already decoded
+        return s
+
+
+def parse_annotation(ann, gt):
+    """ Append the box of a COCO-Text or COCO style annotation to gt """
+    points = ann.get("mask") or ann.get("points")
+    segmentation = ann.get("segmentation")
+    if not points and segmentation:
+        points = segmentation[0] if isinstance(segmentation[0], list) else segmentation
+    if not points or len(points) < 6:
+        bbox = ann.get("bbox")
+        if not bbox:
+            return
+        x, y, w, h = bbox[:4]
+        points = [x, y, x + w, y, x + w, y + h, x, y + h]
+    points = points[:len(points) // 2 * 2]
+    if not finite_coords(points):
+        return
+    text = ann.get("utf8_string", ann.get("text", ann.get("transcription", "")))
+    if ann.get("legibility") == "illegible" or not text:
+        text = DONT_CARE
+    gt.append(points, text)
+
+
+class JsonGtIndex(object):
+    """ Memory mapped index of the annotations of every image in a JSON ground truth file.
+
+        Layout: a header with the modification time and size of the JSON file,
+        a table of (first range, range count, name) entries, one per image
+        file name, and the uint64 (start, end) byte ranges of the annotations.
+    """
+    MAGIC = b"JSONGT01"
+    HEADER = struct.Struct("<8s2sqqIIQ")
+    ENTRY = struct.Struct("<IIH")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, byteorder, self.mtime_ns, self.size, n_images, n_ranges,
+                ranges) = JsonGtIndex.HEADER.unpack_from(self._mm, 0)
+        if magic != JsonGtIndex.MAGIC or byteorder != sys.byteorder[:2].encode():
+            self.close()
+            raise ValueError("%s is not a JSON ground truth index" % path)
+        self.entries = {}
+        pos = JsonGtIndex.HEADER.size
+        for _ in range(n_images):
+            first, count, name_len = JsonGtIndex.ENTRY.unpack_from(self._mm, pos)
+            pos += JsonGtIndex.ENTRY.size
+            self.entries[self._mm[pos:pos + name_len].decode("utf-8", "surrogateescape")] = (first, count)
+            pos += name_len
+        self._ranges = memoryview(self._mm)[ranges:ranges + n_ranges * 16].cast("Q")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def close(self):
+        if hasattr(self, "_ranges"):
+            self._ranges.release()
+        self._mm.close()
+        self._file.close()
+
+    def is_current(self, json_path):
+        """ Whether json_path did not change since the index was built """
+        try:
+            st = os.stat(str(json_path))
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == (self.mtime_ns, self.size)
+
+    @staticmethod
+    def index_path(json_path):
+        return cache_file("json_gt_index", json_path, ".bin")
+
+    @classmethod
+    def open_for(cls, json_path):
+        """ Open the index of json_path if it was built since the file last changed, None otherwise """
+        path = cls.index_path(json_path)
+        if not path.exists():
+            return None
+        try:
+            index = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        if not index.is_current(json_path):
+            index.close()
+            return None
+        return index
+
+    @classmethod
+    def build(cls, json_path, path=None, progress=None):
+        """ Scan json_path for the annotations of every image into a new index and open it """
+        json_path = os.path.abspath(str(json_path))
+        path = Path(path) if path is not None else cls.index_path(json_path)
+        file_names = {}
+        ranges = {}
+        with open(json_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            for n, (key, member, value, start, end) in enumerate(iter_members(f)):
+                if not isinstance(value, dict):
+                    continue
+                if key in ("imgs", "images"):
+                    file_names[str(value.get("id", member))] = _utf8(value.get("file_name"))
+                elif key in ("anns", "annotations") and "image_id" in value:
+                    ranges.setdefault(str(value["image_id"]), []).append((start, end))
+                if progress is not None and n % 10000 == 0:
+                    progress(n)
+
+        table = bytearray()
+        flat = array("Q")
+        n_images = 0
+        for image_id, file_name in file_names.items():
+            if not file_name:
+                continue
+            image_ranges = ranges.get(image_id, ())
+            # datasets put the images in folders the viewer may not have, look them up by base name
+            name = file_name.replace("\\", "/").rsplit("/", 1)[-1].encode("utf-8", "surrogateescape")
+            table += JsonGtIndex.ENTRY.pack(len(flat) // 2, len(image_ranges), len(name)) + name
+            for start, end in image_ranges:
+                flat.extend((start, end))
+            n_images += 1
+        ranges_pos = JsonGtIndex.HEADER.size + len(table)
+        ranges_pos += -ranges_pos % 8
+        header = JsonGtIndex.HEADER.pack(JsonGtIndex.MAGIC, sys.byteorder[:2].encode(),
+                st.st_mtime_ns, st.st_size, n_images, len(flat) // 2, ranges_pos)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(table)
+            f.write(b"\0" * (ranges_pos - JsonGtIndex.HEADER.size - len(table)))
+            flat.tofile(f)
+        os.replace(tmp, path)
+        return cls(path)
+
+    def ranges(self, name):
+        """ (start, end) offsets of the annotations of the image called name in the JSON file """
+        entry = self.entries.get(name)
+        if entry is None:
+            return []
+        first, count = entry
+        flat = self._ranges[2 * first:2 * (first + count)]
+        return [(flat[2 * i], flat[2 * i + 1]) for i in range(count)]
+
+    def read(self, f, name):
+        """ Annotations of the image called name, read from the JSON file f """
+        gt = GroundTruth()
+        for start, end in self.ranges(name):
+            f.seek(start)
+            parse_annotation(json.loads(f.read(end - start)), gt)
+        return gt
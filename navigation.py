@@ -0,0 +1,79 @@
+from PyQt5 import QtCore
+
+
+class NavigationController(QtCore.QObject):
+    """ Turns changes of the current row of the image list into image loads.
+
+        Every change of the current row is a navigation, clicks and key presses
+        alike, and a row is loaded right away when nothing was loaded recently.
+        Changes arriving while the previous load is still fresh, like those of
+        a held arrow key, are coalesced and only the latest row is loaded once
+        `delay` milliseconds have passed. Queued background decodes of rows the
+        user already moved past are cancelled.
+    """
+    loaded = QtCore.pyqtSignal(int)
+
+    def __init__(self, view, load, loader=None, paths=None, delay=80, parent=None):
+        super(NavigationController, self).__init__(parent)
+        self.view = view
+        self.load = load
+        self.loader = loader
+        self.paths = paths
+        self.requested = -1
+        self.current = -1
+        self.load_count = 0
+        self.navigation_count = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self._timeout)
+        view.selectionModel().currentChanged.connect(self._currentChanged)
+        view.model().layoutChanged.connect(self._layoutChanged)
+
+    def _currentChanged(self, current, previous):
+        if current.isValid():
+            self.request(current.row())
+
+    def _layoutChanged(self):
+        # sorting moved the loaded image, and the current index with it, to another row
+        row = self.view.currentIndex().row()
+        # a load still waiting is one of the current index
+        self.current = row if self.requested == self.current else -1
+        self.requested = row
+
+    def request(self, row):
+        """ Ask for row to be shown, loading it now or once the burst of requests ends """
+        self.navigation_count += 1
+        self.requested = row
+        if self.timer.isActive():
+            # start decoding the latest row while waiting, dropping the rows skipped over
+            if self.loader is not None and self.paths is not None:
+                self.loader.prefetch([self.paths[row]])
+            return
+        self._load()
+
+    def _load(self):
+        row = self.requested
+        self.load_count += 1
+        self.current = row
+        self.load(row)
+        self.loaded.emit(row)
+        self.timer.start()
+
+    def _timeout(self):
+        if self.requested != self.current:
+            self._load()
+
+    def reset(self):
+        """ Forget the current row and the counters, for a newly opened folder """
+        self.timer.stop()
+        self.requested = -1
+        self.current = -1
+        self.load_count = 0
+        self.navigation_count = 0
+
+    def loads_per_navigation(self):
+        if not self.navigation_count:
+            return 0.0
+        return self.load_count / self.navigation_count
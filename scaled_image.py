@@ -0,0 +1,139 @@
+import math
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+# zoom levels are powers of 2 ** (1 / ZOOM_STEPS), a wheel notch moves one level
+ZOOM_STEPS = 4
+MIN_ZOOM = 1.0 / 64
+MAX_ZOOM = 32.0
+# downscaled renders kept per image
+MAX_SCALED = 4
+
+
+def clamp_zoom(scale):
+    return min(MAX_ZOOM, max(MIN_ZOOM, scale))
+
+
+def zoom_step(scale, steps):
+    """ Zoom level steps levels above scale, or below for negative steps.
+        A scale between two levels moves to the neighbouring level first.
+    """
+    k = math.log2(scale) * ZOOM_STEPS
+    if steps > 0:
+        n = math.floor(k + 1e-6) + steps
+    else:
+        n = math.ceil(k - 1e-6) + steps
+    return clamp_zoom(2.0 ** (n / float(ZOOM_STEPS)))
+
+
+def level_at_least(scale):
+    """ Smallest zoom level not below scale, renders at it have enough pixels for scale """
+    return 2.0 ** (math.ceil(math.log2(scale) * ZOOM_STEPS - 1e-6) / float(ZOOM_STEPS))
+
+
+class _ScaleSignals(QtCore.QObject):
+    scaled = QtCore.pyqtSignal(object, float, QtGui.QImage)
+
+
+class ScaleTask(QtCore.QRunnable):
+    """ Smoothly downscales an image to a zoom level in a worker thread """
+
+    def __init__(self, item, image, level):
+        super(ScaleTask, self).__init__()
+        self.signals = item.signals
+        self.image = image
+        self.level = level
+
+    def run(self):
+        size = self.image.size() * self.level
+        scaled = self.image.scaled(size, QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+        self.signals.scaled.emit(self.image.cacheKey(), self.level, scaled)
+
+
+class ScaledImageItem(QtWidgets.QGraphicsPixmapItem):
+    """ Pixmap item drawing zoomed out views from cached downscaled renders.
+
+        A view zoomed out to a level draws the render made for that level
+        one to one instead of scaling the whole image down on every paint.
+        Renders are made in the background, only while the view draws with
+        SmoothPixmapTransform, that is when the user is not zooming. Meanwhile
+        the closest finer render, or the image itself with fast scaling, is
+        used. Otherwise the painter's SmoothPixmapTransform hint picks the
+        scaling quality. A preview, a lower resolution render of an image
+        about to be shown, is stretched over the image until it is.
+    """
+
+    def __init__(self, parent=None):
+        super(ScaledImageItem, self).__init__(parent)
+        self.image = QtGui.QImage()
+        self.preview = None
+        self.scaled = OrderedDict()
+        self._pending = set()
+        self.signals = _ScaleSignals()
+        self.signals.scaled.connect(self._scaled)
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def set_image(self, image):
+        """ Show image, a QImage """
+        self.preview = None
+        if not image.isNull() and image.cacheKey() == self.image.cacheKey():
+            self.update()
+            return
+        self.image = image
+        self.scaled.clear()
+        self._pending.clear()
+        self.setPixmap(QtGui.QPixmap.fromImage(image) if not image.isNull() else QtGui.QPixmap())
+
+    def set_preview(self, image):
+        """ Show image, a QImage of a lower resolution, over the bounds of the shown image until set_image """
+        self.preview = QtGui.QPixmap.fromImage(image)
+        self.update()
+
+    def _scaled(self, key, level, image):
+        self._pending.discard(level)
+        if key != self.image.cacheKey() or image.isNull():
+            return
+        self.scaled[level] = QtGui.QPixmap.fromImage(image)
+        while len(self.scaled) > MAX_SCALED:
+            self.scaled.popitem(last=False)
+        self.update()
+
+    def _request(self, level):
+        if level in self._pending or level in self.scaled:
+            return
+        self._pending.add(level)
+        self.pool.start(ScaleTask(self, self.image, level))
+
+    def paint(self, painter, option, widget=None):
+        pixmap = self.pixmap()
+        if pixmap.isNull():
+            return
+        smooth = bool(painter.renderHints() & QtGui.QPainter.SmoothPixmapTransform)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        full = pixmap
+        if self.preview is not None:
+            pixmap = self.preview
+        elif lod < 1:
+            level = level_at_least(lod)
+            if level in self.scaled:
+                self.scaled.move_to_end(level)
+            elif smooth:
+                self._request(level)
+            finer = [l for l in self.scaled if lod - 1e-9 <= l < 1]
+            if finer:
+                pixmap = self.scaled[min(finer)]
+            else:
+                # smoothly scaling the whole image down takes long, the render will be smooth
+                smooth = False
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        fx = pixmap.width() / float(full.width())
+        fy = pixmap.height() / float(full.height())
+        source = QtCore.QRectF(exposed.left() * fx, exposed.top() * fy, exposed.width() * fx, exposed.height() * fy)
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, smooth)
+        # antialiasing sends scaled pixmaps down a slow path and does nothing for them
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        painter.drawPixmap(exposed, pixmap, source)
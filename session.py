@@ -0,0 +1,35 @@
+""" State of the viewer kept from one run to the next.
+
+    The session is a small JSON file in the cache folder holding the folders,
+    the current image, the zoom and the display options, so a new run can
+    show the last image without asking for the folders again.
+"""
+import json
+import os
+
+from cache_paths import cache_root
+
+
+def session_file():
+    return cache_root() / "session.json"
+
+
+def load_session(path=None):
+    """ The saved session as a dict, empty if there is none or it cannot be read """
+    path = str(path) if path is not None else str(session_file())
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_session(state, path=None):
+    """ Replace the saved session with state, raises OSError when it cannot be written """
+    path = str(path) if path is not None else str(session_file())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
@@ -0,0 +1,122 @@
+import math
+
+# boxes overlapping more cells are kept in a list checked by every query
+MAX_CELLS = 256
+
+
+class GridIndex(object):
+    """ Uniform grid over axis aligned bounding boxes.
+
+        Every box is registered in the cells it overlaps, so point and
+        rectangle queries only look at the boxes of a few cells. Boxes can be
+        inserted, moved and removed one at a time. The few boxes much larger
+        than the cells, like those of corrupt coordinates, are not registered
+        in cells but checked by every query.
+    """
+
+    def __init__(self, cell_size=64.0):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.boxes = {}
+        self.large = set()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def _is_large(self, box):
+        return not all(math.isfinite(v) for v in box) or self._n_cells(box) > MAX_CELLS
+
+    def _n_cells(self, box):
+        x0, y0, x1, y1 = box
+        s = self.cell_size
+        return (math.floor(x1 / s) - math.floor(x0 / s) + 1) * (math.floor(y1 / s) - math.floor(y0 / s) + 1)
+
+    def _cells(self, box):
+        if self._is_large(box):
+            return
+        x0, y0, x1, y1 = box
+        s = self.cell_size
+        for cy in range(int(math.floor(y0 / s)), int(math.floor(y1 / s)) + 1):
+            for cx in range(int(math.floor(x0 / s)), int(math.floor(x1 / s)) + 1):
+                yield (cx, cy)
+
+    def insert(self, key, box):
+        """ Register key with the box (x0, y0, x1, y1) """
+        if key in self.boxes:
+            self.remove(key)
+        self.boxes[key] = box
+        if self._is_large(box):
+            self.large.add(key)
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        self.large.discard(key)
+        for cell in self._cells(box):
+            keys = self.cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.cells[cell]
+
+    def update(self, key, box):
+        """ Move key to a new box, only touching the cells that changed """
+        old = self.boxes.get(key)
+        if old is None:
+            self.insert(key, box)
+            return
+        old_cells = set(self._cells(old))
+        new_cells = set(self._cells(box))
+        for cell in old_cells - new_cells:
+            keys = self.cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+        for cell in new_cells - old_cells:
+            self.cells.setdefault(cell, set()).add(key)
+        self.boxes[key] = box
+        if self._is_large(box):
+            self.large.add(key)
+        else:
+            self.large.discard(key)
+
+    def query_point(self, x, y):
+        """ Keys whose box contains the point """
+        s = self.cell_size
+        keys = self.large
+        if math.isfinite(x) and math.isfinite(y):
+            keys = keys.union(self.cells.get((int(math.floor(x / s)), int(math.floor(y / s))), ()))
+        result = []
+        for key in keys:
+            x0, y0, x1, y1 = self.boxes[key]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                result.append(key)
+        return result
+
+    def query(self, box):
+        """ Keys whose box intersects box """
+        qx0, qy0, qx1, qy1 = box
+        if self._is_large(box) or self._n_cells(box) > len(self.cells):
+            # the query covers most of the grid, checking every box is cheaper
+            candidates = self.boxes
+        else:
+            candidates = set(self.large)
+            for cell in self._cells(box):
+                candidates.update(self.cells.get(cell, ()))
+        result = set()
+        for key in candidates:
+            x0, y0, x1, y1 = self.boxes[key]
+            if x0 <= qx1 and qx0 <= x1 and y0 <= qy1 and qy0 <= y1:
+                result.add(key)
+        return result
+
+
+def rect_box(rect):
+    """ (x0, y0, x1, y1) box of a QRectF """
+    return (rect.left(), rect.top(), rect.right(), rect.bottom())
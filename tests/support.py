@@ -0,0 +1,41 @@
+""" Shared setup of the tests: the repository on sys.path, a temporary cache
+    folder and an offscreen QApplication for the tests needing one.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# the tests never touch the cache of the user
+CACHE = tempfile.mkdtemp(prefix="image_viewer_tests")
+atexit.register(shutil.rmtree, CACHE, True)
+os.environ["XDG_CACHE_HOME"] = CACHE
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+_app = None
+
+
+def qt_app():
+    """ The QApplication of the tests, made on first use """
+    global _app
+    from PyQt5 import QtWidgets
+    _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    return _app
+
+
+def wait_for(condition, timeout=5.0):
+    """ Run the event loop until condition() is true, False after timeout seconds """
+    import time
+    from PyQt5 import QtTest
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        QtTest.QTest.qWait(10)
+    return True
@@ -0,0 +1,67 @@
+""" Resuming batch exports """
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+import batch_export  # noqa: E402
+from image_list import scan_images  # noqa: E402
+from synthetic import make_dataset  # noqa: E402
+
+
+class BatchExportTest(unittest.TestCase):
+
+    def setUp(self):
+        support.qt_app()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.img_dir, self.gt_dir = make_dataset(self.tmp.name, n_images=3, size=(160, 120), n_boxes=2)
+        self.out_dir = os.path.join(self.tmp.name, "out")
+        os.makedirs(self.out_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def args(self, contact_sheet=None):
+        return argparse.Namespace(img_dir=self.img_dir, gt_dir=self.gt_dir, out_dir=self.out_dir,
+                format="png", contact_sheet=contact_sheet, thumb=64, force=False, no_polygons=False,
+                no_texts=False)
+
+    def run_tasks(self, contact_sheet=None):
+        function, tasks = batch_export.make_tasks(self.args(contact_sheet), sorted(scan_images(self.img_dir)))
+        return [function(task)[1] for task in tasks]
+
+    def test_images_of_the_same_stem_do_not_collide(self):
+        name = sorted(scan_images(self.img_dir))[0]
+        stem, ext = os.path.splitext(name)
+        shutil.copy(os.path.join(self.img_dir, name), os.path.join(self.img_dir, stem + ".png"))
+        self.assertEqual(self.run_tasks(), ["done"] * 4)
+        self.assertEqual(len(os.listdir(self.out_dir)), 4)
+        self.assertIn(name + ".png", os.listdir(self.out_dir))
+        self.assertEqual(self.run_tasks(), ["skipped"] * 4)
+
+    def test_sheets_are_rendered_again_when_their_images_change(self):
+        self.assertEqual(self.run_tasks("2x1"), ["done", "done"])
+        self.assertEqual(self.run_tasks("2x1"), ["skipped", "skipped"])
+        names = sorted(scan_images(self.img_dir))
+        # an image older than the pages, sorted first, moves every image to the next place
+        shutil.copy2(os.path.join(self.img_dir, names[0]), os.path.join(self.img_dir, "a_" + names[0]))
+        self.assertEqual(self.run_tasks("2x1"), ["done", "done"])
+        self.assertEqual(self.run_tasks("2x1"), ["skipped", "skipped"])
+        # removing the last image only changes the last page
+        os.remove(os.path.join(self.img_dir, names[-1]))
+        self.assertEqual(self.run_tasks("2x1"), ["skipped", "done"])
+
+    def test_pages_past_the_last_are_removed(self):
+        self.run_tasks("1x1")
+        batch_export.remove_stale_sheets(self.out_dir, 2, "png")
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ["sheet_00000.png", "sheet_00000.png.members",
+                "sheet_00001.png", "sheet_00001.png.members"])
+
+
+if __name__ == "__main__":
+    unittest.main()
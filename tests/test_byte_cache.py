@@ -0,0 +1,88 @@
+""" Reading files ahead through the byte cache, as on slow network storage """
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from byte_cache import ByteCache, Entry, ReadAhead, SlowFileSystem  # noqa: E402
+
+LATENCY = 0.05
+
+
+class ByteCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_entries_are_evicted_beyond_the_budget(self):
+        cache = ByteCache(budget=10)
+        cache.put("a", Entry((1, 4), b"aaaa", 0.0))
+        cache.put("b", Entry((1, 4), b"bbbb", 0.0))
+        cache.get("a")
+        cache.put("c", Entry((1, 4), b"cccc", 0.0))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((len(cache), cache.size), (2, 8))
+        cache.put("big", Entry((1, 11), b"x" * 11, 0.0))
+        self.assertIsNone(cache.get("big").data)
+        self.assertEqual(cache.size, 8)
+
+    def test_expire_only_touches_the_folder(self):
+        cache = ByteCache()
+        cache.put("/data/img/a.jpg", Entry((1, 1), b"a", 5.0))
+        cache.put("/data/img2/b.jpg", Entry((1, 1), b"b", 5.0))
+        cache.expire("/data/img/")
+        self.assertEqual(cache.get("/data/img/a.jpg").checked, float("-inf"))
+        self.assertEqual(cache.get("/data/img/a.jpg").data, b"a")
+        self.assertEqual(cache.get("/data/img2/b.jpg").checked, 5.0)
+
+
+class ReadAheadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.tmp.name, "img_%d.jpg" % i)
+            with open(path, "wb") as f:
+                f.write(b"%d" % i * 100)
+            self.paths.append(path)
+        self.fs = SlowFileSystem(LATENCY)
+        self.files = ReadAhead(fs=self.fs, concurrency=4)
+
+    def tearDown(self):
+        self.files.shutdown()
+        self.tmp.cleanup()
+
+    def test_prefetched_reads_hit_the_cache(self):
+        self.files.prefetch(self.paths)
+        self.files.pool.waitForDone()
+        self.assertEqual(self.fs.calls["read"], len(self.paths))
+        calls = dict(self.fs.calls)
+        start = time.perf_counter()
+        for i, path in enumerate(self.paths):
+            self.assertEqual(self.files.read(path), b"%d" % i * 100)
+        self.assertLess(time.perf_counter() - start, LATENCY)
+        self.assertEqual(dict(self.fs.calls), calls)
+
+    def test_expired_files_are_checked_but_not_read_again(self):
+        path = self.paths[0]
+        self.files.read(path)
+        self.files.expire(self.tmp.name)
+        self.assertEqual(self.files.read(path), b"0" * 100)
+        self.assertEqual((self.fs.calls["stat"], self.fs.calls["read"]), (2, 1))
+        with open(path, "wb") as f:
+            f.write(b"changed")
+        self.files.expire(self.tmp.name)
+        self.assertEqual(self.files.read(path), b"changed")
+        self.assertEqual(self.fs.calls["read"], 2)
+
+    def test_missing_files(self):
+        missing = os.path.join(self.tmp.name, "missing.jpg")
+        self.assertIsNone(self.files.signature(missing))
+        with self.assertRaises(FileNotFoundError):
+            self.files.read(missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
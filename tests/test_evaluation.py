@@ -0,0 +1,108 @@
+""" Matching detections like the ICDAR 2015 evaluation and rescoring only what changed """
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+try:
+    import evaluation
+except ImportError:  # NumPy is optional
+    evaluation = None
+
+from icdar_gt import DONT_CARE, GroundTruth  # noqa: E402
+
+
+def box(left, top, right, bottom):
+    return [left, top, right, top, right, bottom, left, bottom]
+
+
+def write_boxes(path, boxes):
+    with open(path, "w", encoding="utf-8") as f:
+        for points, text in boxes:
+            f.write(",".join(str(v) for v in points) + "," + text + "\n")
+
+
+@unittest.skipIf(evaluation is None, "needs NumPy")
+class MatchTest(unittest.TestCase):
+
+    def test_matches_missed_and_false_positives(self):
+        gt = GroundTruth()
+        gt.append(box(0, 0, 100, 50), "a")
+        gt.append(box(200, 0, 300, 50), "b")
+        det = GroundTruth()
+        det.append(box(5, 0, 100, 50), "")
+        det.append(box(500, 500, 600, 550), "")
+        m = evaluation.match(gt, det)
+        self.assertEqual(m.pairs, [(0, 0)])
+        self.assertEqual(m.gt_status, ["matched", "missed"])
+        self.assertEqual(m.det_status, ["matched", "false positive"])
+        self.assertEqual(evaluation.image_score(m), (1, 2, 2))
+
+    def test_detections_in_dont_care_regions_are_ignored(self):
+        gt = GroundTruth()
+        gt.append(box(0, 0, 100, 100), DONT_CARE)
+        det = GroundTruth()
+        det.append(box(10, 10, 60, 60), "")
+        m = evaluation.match(gt, det)
+        self.assertEqual((m.gt_status, m.det_status), (["ignored"], ["ignored"]))
+        self.assertEqual(evaluation.image_score(m), (0, 0, 0))
+
+    def test_scores(self):
+        self.assertEqual(evaluation.scores(0, 0, 0), (1.0, 1.0, 1.0))
+        precision, recall, hmean = evaluation.scores(1, 2, 4)
+        self.assertAlmostEqual(hmean, 2 * 0.25 * 0.5 / 0.75)
+
+
+@unittest.skipIf(evaluation is None, "needs NumPy")
+class EvaluateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.img_dir, self.gt_dir, self.pred_dir = (os.path.join(root, d) for d in ("img", "gt", "pred"))
+        for folder in (self.img_dir, self.gt_dir, self.pred_dir):
+            os.makedirs(folder)
+        for i in range(3):
+            open(os.path.join(self.img_dir, "img_%d.jpg" % i), "wb").close()
+            write_boxes(os.path.join(self.gt_dir, "gt_img_%d.txt" % i), [(box(0, 0, 100, 50), "a")])
+            write_boxes(os.path.join(self.pred_dir, "res_img_%d.txt" % i), [(box(0, 0, 100, 50), "")])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def evaluate(self, **kwargs):
+        return evaluation.evaluate(self.img_dir, self.gt_dir, self.pred_dir, **kwargs)
+
+    def test_only_changed_images_are_scored_again(self):
+        self.assertEqual(set(self.evaluate().values()), {(1, 1, 1)})
+        gt_file = os.path.join(self.gt_dir, "gt_img_1.txt")
+        write_boxes(gt_file, [(box(0, 0, 100, 50), "a"), (box(300, 0, 400, 50), "b")])
+        os.utime(gt_file, ns=(time.time_ns() + 10 ** 9,) * 2)
+        loads = []
+        load = evaluation.open_loader
+
+        def counting_loader(source, files=None):
+            loader = load(source, files)
+            loader_load = loader.load
+            loader.load = lambda path: loads.append(os.path.basename(str(path))) or loader_load(path)
+            return loader
+
+        evaluation.open_loader = counting_loader
+        try:
+            scores = self.evaluate()
+        finally:
+            evaluation.open_loader = load
+        self.assertEqual(scores["img_1.jpg"], (1, 2, 1))
+        self.assertEqual(scores["img_0.jpg"], (1, 1, 1))
+        self.assertEqual(sorted(loads), ["img_1.jpg", "img_1.jpg"])
+
+    def test_cancelled_returns_without_scoring(self):
+        self.assertEqual(self.evaluate(cancelled=lambda: True), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
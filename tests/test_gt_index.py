@@ -0,0 +1,128 @@
+""" Round trips through the ground truth indexes """
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from icdar_gt import GtIndex, load_gt, read_icdar2015_gt  # noqa: E402
+from json_gt import JsonGtIndex  # noqa: E402
+
+
+def touch_later(path):
+    """ Move the modification time forward, like a write a second later """
+    os.utime(path, ns=(time.time_ns() + 10 ** 9,) * 2)
+
+
+class GtIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.gt_dir = os.path.join(self.tmp.name, "gt")
+        os.makedirs(self.gt_dir)
+        self.files = {
+            "gt_img_1.txt": "1,2,3,4,5,6,7,8,one\r\n9,10,11,12,13,14,15,16,###\r\n",
+            "gt_img_2.txt": "\ufeff0,0,10,0,10,10,0,10,café, bar\n",
+            "gt_img_3.txt": "",
+        }
+        for name, text in self.files.items():
+            with open(os.path.join(self.gt_dir, name), "w", encoding="utf-8") as f:
+                f.write(text)
+        self.index = GtIndex.build(self.gt_dir, os.path.join(self.tmp.name, "index.bin"))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.index), 3)
+        for name in self.files:
+            expected = read_icdar2015_gt(os.path.join(self.gt_dir, name))
+            gt = self.index.get(name)
+            self.assertEqual(gt.texts, expected.texts)
+            self.assertEqual(list(gt.coords), list(expected.coords))
+        self.assertIsNone(self.index.get("gt_img_4.txt"))
+
+    def test_reopened(self):
+        again = GtIndex(self.index.path)
+        try:
+            self.assertEqual(again.gt_dir, os.path.abspath(self.gt_dir))
+            self.assertEqual(again.get("gt_img_2.txt").texts, ["café, bar"])
+        finally:
+            again.close()
+
+    def test_changed_files_are_read_again(self):
+        path = os.path.join(self.gt_dir, "gt_img_1.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("1,1,2,1,2,2,1,2,new\n")
+        touch_later(path)
+        self.assertIsNone(self.index.get("gt_img_1.txt"))
+        self.assertEqual(self.index.get("gt_img_1.txt", check=False).texts, ["one", "###"])
+        self.assertEqual(load_gt(self.gt_dir, "gt_img_1.txt", self.index).texts, ["new"])
+
+    def test_not_an_index(self):
+        path = os.path.join(self.tmp.name, "other.bin")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 128)
+        with self.assertRaises(ValueError):
+            GtIndex(path)
+
+
+class JsonGtIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.tmp.name, "gt.json")
+        self.index_path = os.path.join(self.tmp.name, "index.bin")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, doc):
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False)
+        index = JsonGtIndex.build(self.json_path, self.index_path)
+        self.addCleanup(index.close)
+        return index
+
+    def read(self, index, name):
+        with open(self.json_path, "rb") as f:
+            return index.read(f, name)
+
+    def test_coco_text(self):
+        index = self.build({
+            "imgs": {"36": {"id": 36, "file_name": "train/COCO_36.jpg"}, "40": {"id": 40, "file_name": "COCO_40.jpg"}},
+            "anns": {"1": {"image_id": 36, "mask": [0, 0, 10, 0, 10, 10, 0, 10], "utf8_string": "café",
+                           "legibility": "legible"},
+                     "2": {"image_id": 36, "bbox": [5, 5, 10, 20], "legibility": "illegible"}},
+        })
+        self.assertEqual(len(index), 2)
+        gt = self.read(index, "COCO_36.jpg")
+        self.assertEqual(gt.texts, ["café", "###"])
+        self.assertEqual(list(gt.points(1)), [5, 5, 15, 5, 15, 25, 5, 25])
+        self.assertEqual(len(self.read(index, "COCO_40.jpg")), 0)
+        self.assertEqual(len(self.read(index, "missing.jpg")), 0)
+
+    def test_coco_style(self):
+        index = self.build({
+            "images": [{"id": 1, "file_name": "a.jpg"}],
+            "annotations": [{"image_id": 1, "segmentation": [[0, 0, 4, 0, 4, 4, 0, 4]], "text": "word"}],
+        })
+        self.assertEqual(self.read(index, "a.jpg").texts, ["word"])
+
+    def test_reopened_only_while_current(self):
+        index = self.build({"images": [{"id": 1, "file_name": "a.jpg"}], "annotations": []})
+        again = JsonGtIndex(self.index_path)
+        self.addCleanup(again.close)
+        self.assertIn("a.jpg", again)
+        self.assertTrue(again.is_current(self.json_path))
+        touch_later(self.json_path)
+        self.assertFalse(index.is_current(self.json_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+""" Keeping the image list model in order as names come and go """
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from PyQt5 import QtCore  # noqa: E402
+
+from image_list import ImageListModel  # noqa: E402
+
+
+class ImageListModelTest(unittest.TestCase):
+
+    def setUp(self):
+        support.qt_app()
+        self.model = ImageListModel()
+        self.model.reset("/data")
+        self.model.append(["b.jpg", "d.jpg", "f.jpg"])
+        self.inserted = []
+        self.removed = []
+        self.model.rowsInserted.connect(lambda parent, first, last: self.inserted.append((first, last)))
+        self.model.rowsRemoved.connect(lambda parent, first, last: self.removed.append((first, last)))
+
+    def test_insert_sorted_in_runs(self):
+        self.model.insert_sorted(["g.jpg", "a.jpg", "c.jpg", "a2.jpg", "h.jpg"])
+        self.assertEqual(self.model.names, ["a.jpg", "a2.jpg", "b.jpg", "c.jpg", "d.jpg", "f.jpg", "g.jpg",
+                "h.jpg"])
+        self.assertEqual(self.inserted, [(0, 1), (3, 3), (6, 7)])
+        self.assertEqual(self.model[0], os.path.join("/data", "a.jpg"))
+
+    def test_remove_names_in_runs(self):
+        self.model.insert_sorted(["a.jpg", "c.jpg"])
+        self.inserted.clear()
+        self.model.remove_names(["a.jpg", "b.jpg", "c.jpg", "f.jpg", "missing.jpg"])
+        self.assertEqual(self.model.names, ["d.jpg"])
+        self.assertEqual(self.removed, [(4, 4), (0, 2)])
+
+    def test_filter(self):
+        self.model.set_filter(lambda name: name != "d.jpg")
+        self.model.insert_sorted(["c.jpg", "e.jpg"])
+        self.assertEqual(self.model.names, ["b.jpg", "c.jpg", "e.jpg", "f.jpg"])
+        self.assertEqual(self.model.all_names, ["b.jpg", "c.jpg", "d.jpg", "e.jpg", "f.jpg"])
+        self.model.remove_names(["c.jpg", "d.jpg"])
+        self.assertEqual(self.model.names, ["b.jpg", "e.jpg", "f.jpg"])
+        self.assertEqual(self.model.all_names, ["b.jpg", "e.jpg", "f.jpg"])
+        self.model.set_filter(None)
+        self.assertEqual(self.model.names, ["b.jpg", "e.jpg", "f.jpg"])
+
+    def test_sort_names_keeps_indexes_on_their_files(self):
+        current = QtCore.QPersistentModelIndex(self.model.index(0))
+        order = {"b.jpg": 2, "d.jpg": 0, "f.jpg": 1}
+        self.model.sort_names(key=order.get)
+        self.assertEqual(self.model.names, ["d.jpg", "f.jpg", "b.jpg"])
+        self.assertEqual(current.row(), 2)
+        # inserted names are placed by the key too
+        order["c.jpg"] = -1
+        self.model.insert_sorted(["c.jpg"])
+        self.assertEqual(self.model.names, ["c.jpg", "d.jpg", "f.jpg", "b.jpg"])
+        self.model.remove_names(["f.jpg"])
+        self.assertEqual(self.model.names, ["c.jpg", "d.jpg", "b.jpg"])
+        self.model.sort_names()
+        self.assertEqual(self.model.names, ["b.jpg", "c.jpg", "d.jpg"])
+        self.assertEqual(current.row(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
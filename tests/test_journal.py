@@ -0,0 +1,73 @@
+""" Recovering the ground truth writes a crash interrupted """
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from gt_writer import AnnotationWriter, Journal  # noqa: E402
+from icdar_gt import GroundTruth, read_icdar2015_gt  # noqa: E402
+
+
+def one_box(text):
+    gt = GroundTruth()
+    gt.append([0, 0, 10, 0, 10, 10, 0, 10], text)
+    return gt
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(os.path.join(self.tmp.name, "journal.jsonl"))
+        self.a = os.path.join(self.tmp.name, "gt_a.txt")
+        self.b = os.path.join(self.tmp.name, "gt_b.txt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pending_keeps_the_latest_unfinished_write_of_every_file(self):
+        for fname, text in ((self.a, "a1"), (self.b, "b1"), (self.a, "a2")):
+            self.journal.record(self.journal.next_seq(), fname, one_box(text))
+        self.journal.done(2)
+        # a crash in the middle of a line
+        with open(self.journal.path, "a", encoding="utf-8") as f:
+            f.write('{"seq": 4, "file": ')
+        pending = Journal(self.journal.path).pending()
+        self.assertEqual(list(pending), [self.a])
+        self.assertEqual(pending[self.a].texts, ["a2"])
+
+    def test_a_finished_write_hides_the_earlier_ones(self):
+        self.journal.record(1, self.a, one_box("a1"))
+        self.journal.record(2, self.a, one_box("a2"))
+        self.journal.done(2)
+        self.assertEqual(self.journal.pending(), {})
+
+    def test_sequence_numbers_continue_after_the_recovered_ones(self):
+        self.journal.record(7, self.a, one_box("a"))
+        journal = Journal(self.journal.path)
+        journal.pending()
+        self.assertEqual(journal.next_seq(), 8)
+
+    def test_polygons_keep_their_starts(self):
+        gt = GroundTruth()
+        gt.append([0, 0, 4, 0, 4, 4, 2, 6, 0, 4], "five")
+        self.assertIsNotNone(gt.starts)
+        self.journal.record(1, self.a, gt)
+        recovered = self.journal.pending()[self.a]
+        self.assertEqual(list(recovered.points(0)), [0, 0, 4, 0, 4, 4, 2, 6, 0, 4])
+
+    def test_writer_recovers_and_clears_the_journal(self):
+        self.journal.record(1, self.a, one_box("lost"))
+        support.qt_app()
+        writer = AnnotationWriter(Journal(self.journal.path))
+        self.assertEqual(writer.recover(), [self.a])
+        writer.flush()
+        self.assertEqual(read_icdar2015_gt(self.a).texts, ["lost"])
+        self.assertFalse(os.path.exists(self.journal.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+""" Coalescing the image loads of a burst of navigations """
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from PyQt5 import QtCore, QtTest, QtWidgets  # noqa: E402
+
+from navigation import NavigationController  # noqa: E402
+
+DELAY = 80
+
+
+class NavigationTest(unittest.TestCase):
+
+    def setUp(self):
+        support.qt_app()
+        self.view = QtWidgets.QListView()
+        self.view.setModel(QtCore.QStringListModel(["img_%d.jpg" % i for i in range(100)]))
+        self.loads = []
+        self.navigation = NavigationController(self.view, self.loads.append, delay=DELAY)
+
+    def tearDown(self):
+        self.view.deleteLater()
+
+    def test_key_repeat_burst_loads_first_and_last_row(self):
+        start = time.monotonic()
+        for _ in range(50):
+            QtTest.QTest.keyClick(self.view, QtCore.Qt.Key_Down)
+        self.assertLess(time.monotonic() - start, DELAY / 1e3, "the burst must fit in the coalescing window")
+        self.assertTrue(support.wait_for(lambda: not self.navigation.timer.isActive()))
+        QtTest.QTest.qWait(2 * DELAY)
+        self.assertEqual(self.navigation.navigation_count, 50)
+        self.assertLessEqual(self.navigation.load_count, 2)
+        self.assertEqual(self.loads[-1], self.view.currentIndex().row())
+        self.assertEqual(self.loads[-1], 49)
+
+    def test_isolated_navigation_loads_right_away(self):
+        self.view.setCurrentIndex(self.view.model().index(3))
+        self.assertEqual(self.loads, [3])
+        self.assertEqual(self.navigation.loads_per_navigation(), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+""" Parsing the ground truth formats """
+import io
+import json
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from gt_loaders import Icdar2013Loader, TotalTextLoader  # noqa: E402
+from icdar_gt import DONT_CARE, GroundTruth, format_icdar2015_gt, parse_icdar2015_gt  # noqa: E402
+from json_gt import iter_members, parse_annotation  # noqa: E402
+
+
+class Icdar2015Test(unittest.TestCase):
+
+    def test_parse(self):
+        data = "\ufeff1,2,3,4,5,6,7,8,hello, world\r\n10,20,30,40,50,60,70,80,###\n1,2,3\nx,2,3,4,5,6,7,8,bad\n"
+        gt = parse_icdar2015_gt(data.encode("utf-8"))
+        self.assertEqual(gt.texts, ["hello, world", DONT_CARE])
+        self.assertEqual(list(gt.points(1)), [10, 20, 30, 40, 50, 60, 70, 80])
+
+    def test_missing_transcription(self):
+        self.assertEqual(parse_icdar2015_gt("1,2,3,4,5,6,7,8").texts, [""])
+
+    def test_format_round_trip(self):
+        gt = GroundTruth()
+        gt.append([1, 2, 3.5, 4, 5.25, 6, 7, 8.125], "a,b")
+        text = format_icdar2015_gt(gt)
+        self.assertEqual(text, "1,2,3.5,4,5.25,6,7,8.12,a,b\r\n")
+        again = parse_icdar2015_gt(text)
+        self.assertEqual(again.texts, ["a,b"])
+        self.assertEqual(list(again.points(0))[:7], [1, 2, 3.5, 4, 5.25, 6, 7])
+
+
+class OtherFormatsTest(unittest.TestCase):
+
+    def test_icdar2013(self):
+        gt = Icdar2013Loader(".").parse('38, 43, 920, 215, "Tiredness"\n275 264 665 450 "kills"\nnot a box\n')
+        self.assertEqual(gt.texts, ["Tiredness", "kills"])
+        self.assertEqual(list(gt.points(0)), [38, 43, 920, 43, 920, 215, 38, 215])
+
+    def test_total_text(self):
+        gt = TotalTextLoader(".").parse(
+                "x: [[115 503 494 115]], y: [[322 346 426 404]], ornt: [u'm'], transcriptions: [u'nauGHTY']\n"
+                "x: [[ 734 1058 1061  744\n   733]], y: [[360 369 449 430 390]], ornt: [u'h'], "
+                "transcriptions: [u'#']\n")
+        self.assertEqual(gt.texts, ["nauGHTY", DONT_CARE])
+        self.assertEqual(list(gt.points(1)), [734, 360, 1058, 369, 1061, 449, 744, 430, 733, 390])
+
+
+class JsonScannerTest(unittest.TestCase):
+
+    def test_members_and_offsets(self):
+        doc = {"imgs": {"36": {"id": 36, "file_name": "a.jpg"}}, "anns": [{"image_id": 36, "bbox": [1.5, 2, 3, 4],
+                "utf8_string": "caf\u00e9"}], "empty": {}, "info": 12345.25}
+        data = json.dumps(doc, indent=1, ensure_ascii=False).encode("utf-8")
+        for chunk_size in (3, 7, 1 << 20):
+            members = list(iter_members(io.BytesIO(data), chunk_size))
+            self.assertEqual([(key, member) for key, member, _, _, _ in members],
+                    [("imgs", "36"), ("anns", None), ("info", None)])
+            self.assertEqual(members[2][2], 12345.25)
+            for key, member, value, start, end in members:
+                self.assertEqual(json.loads(data[start:end].decode("utf-8")), value if key != "anns" else
+                        doc["anns"][0])
+
+    def test_not_an_object(self):
+        with self.assertRaises(ValueError):
+            list(iter_members(io.BytesIO(b"[1, 2]")))
+
+
+class NonFiniteCoordinatesTest(unittest.TestCase):
+
+    def test_icdar2015(self):
+        gt = parse_icdar2015_gt("1,2,3,4,5,6,7,8,ok\nnan,2,3,4,5,6,7,8,nan\n1,inf,3,4,5,6,7,8,inf\n"
+                "1e40,2,3,4,5,6,7,8,float32\n")
+        self.assertEqual(gt.texts, ["ok"])
+
+    def test_icdar2013(self):
+        gt = Icdar2013Loader(".").parse('1, 2, 30, 40, "ok"\n1, 2, 3%s, 40, "inf"\n' % ("0" * 40))
+        self.assertEqual(gt.texts, ["ok"])
+
+    def test_total_text(self):
+        gt = TotalTextLoader(".").parse(
+                "x: [[1 20 20]], y: [[1 1 20]], ornt: [u'h'], transcriptions: [u'ok']\n"
+                "x: [[1 nan 20]], y: [[1 1 20]], ornt: [u'h'], transcriptions: [u'nan']\n")
+        self.assertEqual(gt.texts, ["ok"])
+
+    def test_json_annotation(self):
+        gt = GroundTruth()
+        parse_annotation({"bbox": [1, 2, 3, 4], "text": "ok"}, gt)
+        parse_annotation({"bbox": [math.nan, 2, 3, 4], "text": "nan"}, gt)
+        parse_annotation({"points": [0, 0, 1, 0, math.inf, 1], "text": "inf"}, gt)
+        self.assertEqual(gt.texts, ["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
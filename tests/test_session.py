@@ -0,0 +1,65 @@
+""" Saving and restoring the session, which must never cost the edits on exit """
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from session import load_session, save_session  # noqa: E402
+
+
+class SessionFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "session.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        state = {"img_dir": "/data/img", "image": "img_1.jpg", "zoom": 0.5, "show_texts": False}
+        save_session(state, self.path)
+        self.assertEqual(load_session(self.path), state)
+
+    def test_missing_or_corrupt_session_is_empty(self):
+        self.assertEqual(load_session(self.path), {})
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(load_session(self.path), {})
+        with open(self.path, "w") as f:
+            f.write("[1, 2]")
+        self.assertEqual(load_session(self.path), {})
+
+
+class CloseTest(unittest.TestCase):
+
+    def test_edits_are_saved_when_the_session_cannot_be(self):
+        from PyQt5 import QtCore
+        from synthetic import make_dataset
+        import annotation_and_image_viewer as viewer
+
+        support.qt_app()
+        with tempfile.TemporaryDirectory() as tmp:
+            img_dir, gt_dir = make_dataset(tmp, n_images=2, size=(320, 240), n_boxes=3)
+            w = viewer.AnnotationWindow()
+            w.set_gt_dir(gt_dir)
+            w.open_dir(img_dir)
+            self.assertTrue(support.wait_for(lambda: w.gt_layer is not None))
+            gt_file = str(w.gt_file)
+            with open(gt_file, "rb") as f:
+                before = f.read()
+            w.edit_polygon(0)
+            grip = w.edited_polygons[0].m_items[0]
+            grip.setPos(grip.pos() + QtCore.QPointF(7, 5))
+            with mock.patch.object(viewer, "save_session", side_effect=OSError("read-only file system")):
+                w.close()
+            with open(gt_file, "rb") as f:
+                self.assertNotEqual(f.read(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
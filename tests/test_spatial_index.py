@@ -0,0 +1,63 @@
+""" Grid index of the boxes, including boxes of corrupt coordinates """
+import math
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from spatial_index import GridIndex  # noqa: E402
+
+
+class GridIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GridIndex(cell_size=10)
+        self.index.insert("a", (0, 0, 15, 5))
+        self.index.insert("b", (30, 30, 40, 40))
+
+    def test_queries(self):
+        self.assertEqual(self.index.query_point(12, 3), ["a"])
+        self.assertEqual(self.index.query_point(20, 20), [])
+        self.assertEqual(self.index.query((10, 0, 35, 35)), {"a", "b"})
+        self.assertEqual(self.index.query((-1000, -1000, 1000, 1000)), {"a", "b"})
+
+    def test_update_and_remove(self):
+        self.index.update("a", (50, 50, 55, 55))
+        self.assertEqual(self.index.query_point(12, 3), [])
+        self.assertEqual(self.index.query_point(52, 52), ["a"])
+        self.index.remove("a")
+        self.assertNotIn("a", self.index)
+        self.assertEqual(self.index.query((0, 0, 100, 100)), {"b"})
+        self.assertFalse(any("a" in keys for keys in self.index.cells.values()))
+
+    def test_huge_boxes_are_not_split_in_cells(self):
+        start = time.perf_counter()
+        self.index.insert("huge", (-1e6, -1e6, 1e6, 1e6))
+        self.index.insert("far", (1e30, 1e30, 2e30, 2e30))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(self.index.large, {"huge", "far"})
+        self.assertEqual(sorted(self.index.query_point(35, 35)), ["b", "huge"])
+        self.assertEqual(self.index.query((0, 0, 1, 1)), {"a", "huge"})
+        self.index.update("huge", (100, 100, 110, 110))
+        self.assertEqual(self.index.large, {"far"})
+        self.assertEqual(self.index.query_point(105, 105), ["huge"])
+        self.index.update("huge", (-1e6, -1e6, 1e6, 1e6))
+        self.index.remove("huge")
+        self.assertEqual(self.index.large, {"far"})
+        self.assertEqual(self.index.query_point(105, 105), [])
+
+    def test_non_finite_boxes(self):
+        self.index.insert("nan", (math.nan, 0, 10, 10))
+        self.index.insert("inf", (0, 0, math.inf, 10))
+        self.assertEqual(sorted(self.index.query_point(5, 5)), ["a", "inf"])
+        self.assertEqual(self.index.query_point(math.nan, 5), [])
+        self.index.remove("nan")
+        self.index.remove("inf")
+        self.assertEqual(self.index.large, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
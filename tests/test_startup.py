@@ -0,0 +1,46 @@
+""" Startup regression test: the restored session must be on screen within the budget.
+
+    python -m unittest tests.test_startup    (or python -m pytest tests)
+
+    IMAGE_VIEWER_STARTUP_BUDGET_MS overrides the budget on slower machines.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_startup import BUDGET, eager_modules, measure  # noqa: E402
+
+
+class StartupTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        environ = dict(os.environ)
+        try:
+            cls.cold, cls.runs = measure(cls.tmp.name, runs=5)
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_feature_modules_are_imported_on_first_use(self):
+        self.assertEqual(eager_modules(self.runs[-1]), [])
+
+    def test_startup_within_budget(self):
+        budget = float(os.environ.get("IMAGE_VIEWER_STARTUP_BUDGET_MS", "") or BUDGET)
+        total = 1e3 * statistics.median(run["total"] for run in self.runs)
+        self.assertLessEqual(total, budget, "startup took %.1f ms, the budget is %.0f ms" % (total, budget))
+
+
+if __name__ == "__main__":
+    unittest.main()
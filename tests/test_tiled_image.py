@@ -0,0 +1,99 @@
+""" Tiles of very large images, decoded in the background """
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+from PyQt5 import QtCore, QtGui  # noqa: E402
+
+import tiled_image  # noqa: E402
+from tiled_image import TILE_SIZE, TiledImageItem  # noqa: E402
+
+WIDTH, HEIGHT = 5 * TILE_SIZE, 3 * TILE_SIZE
+
+
+class TiledImageTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        support.qt_app()
+        cls.tmp = tempfile.TemporaryDirectory()
+        image = QtGui.QImage(WIDTH, HEIGHT, QtGui.QImage.Format_RGB32)
+        image.fill(QtGui.QColor(200, 30, 30))
+        cls.paths = {}
+        for fmt in ("png", "jpg"):
+            cls.paths[fmt] = os.path.join(cls.tmp.name, "large.%s" % fmt)
+            assert image.save(cls.paths[fmt])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def open(self, fmt, **kwargs):
+        reads = []
+        reader = tiled_image.image_reader
+
+        def counting_reader(path, data=None):
+            r = reader(path, data)
+            read = r.read
+            r.read = lambda: reads.append(path) or read()
+            return r
+
+        patch = mock.patch.object(tiled_image, "image_reader", counting_reader)
+        patch.start()
+        self.addCleanup(patch.stop)
+        item = TiledImageItem(self.paths[fmt], **kwargs)
+        self.addCleanup(item.close)
+        return item, reads
+
+    def load_all(self, item, level):
+        item._visible = (level, item.boundingRect())
+        keys = item.tiles_in(level, item.boundingRect())
+        for key in keys:
+            item._request(key)
+        self.assertTrue(support.wait_for(lambda: all(key in item.tiles for key in keys)))
+        return keys
+
+    def test_coarse_tile_is_decoded_in_the_background(self):
+        pool = QtCore.QThreadPool()
+        pool.setMaxThreadCount(1)
+        release = QtCore.QSemaphore()
+        pool.start(release.acquire)
+        item, reads = self.open("jpg", pool=pool)
+        self.assertEqual((item.tiles, reads), ({}, []))
+        release.release()
+        self.assertTrue(support.wait_for(lambda: (item.max_level, 0, 0) in item.tiles))
+        pool.waitForDone()
+
+    def test_clip_formats_decode_each_tile(self):
+        item, reads = self.open("jpg")
+        self.assertTrue(item.tileable)
+        keys = self.load_all(item, 0)
+        self.assertEqual(len(keys), 15)
+        self.assertEqual(len(reads), len(keys) + 1)
+
+    def test_other_formats_are_decoded_once(self):
+        item, reads = self.open("png")
+        self.assertFalse(item.tileable)
+        self.assertEqual(item.min_level, 0)
+        self.load_all(item, 0)
+        self.load_all(item, 1)
+        self.assertEqual(len(reads), 1)
+        tile = item.tiles[(1, 2, 1)]
+        self.assertEqual((tile.width(), tile.height()), (TILE_SIZE // 2, TILE_SIZE // 2))
+        self.assertEqual(item.tiles[(0, 4, 2)].toImage().pixelColor(10, 10).red(), 200)
+
+    def test_other_formats_within_the_budget_are_decoded_coarser(self):
+        item, reads = self.open("png", budget=WIDTH * HEIGHT * 4)
+        self.assertEqual(item.min_level, 1)
+        self.assertEqual(item.level_for(1.0), 1)
+        self.load_all(item, 1)
+        self.assertEqual(len(reads), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
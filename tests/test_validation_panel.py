@@ -0,0 +1,59 @@
+""" Stopping the validation without blocking the viewer """
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import support  # noqa: E402
+
+import validation_panel  # noqa: E402
+from validation_panel import ValidationPanel, ValidationRunner  # noqa: E402
+
+
+class StopTest(unittest.TestCase):
+
+    def setUp(self):
+        support.qt_app()
+        self.ended = threading.Event()
+
+        def slow_validate(img_dir, gt_source, names, progress=None, cancelled=None):
+            while not cancelled():
+                time.sleep(0.01)
+            # like a pool of worker processes being terminated
+            time.sleep(0.3)
+            self.ended.set()
+            return []
+
+        patch = mock.patch.object(validation_panel, "validate", slow_validate)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.panel = ValidationPanel()
+        self.addCleanup(self.panel.deleteLater)
+
+    def test_stop_does_not_wait_for_the_runner(self):
+        self.panel.start("img", "gt", ["img_1.jpg"])
+        start = time.perf_counter()
+        self.panel.stop()
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertIsNone(self.panel.runner)
+        self.assertFalse(self.panel.stopButton.isEnabled())
+        self.assertFalse(self.ended.is_set())
+        self.assertTrue(support.wait_for(lambda: not self.panel.findChildren(ValidationRunner)))
+        self.assertTrue(self.ended.is_set())
+
+    def test_restart_drops_the_stopped_runner(self):
+        self.panel.start("img", "gt", ["img_1.jpg"])
+        first = self.panel.runner
+        self.panel.start("img", "gt", ["img_2.jpg"])
+        self.assertIsNot(self.panel.runner, first)
+        self.assertTrue(support.wait_for(lambda: len(self.panel.findChildren(ValidationRunner)) == 1))
+        self.assertTrue(self.panel.stopButton.isEnabled())
+        self.panel.shutdown()
+        self.assertFalse(any(runner.isRunning() for runner in self.panel.findChildren(ValidationRunner)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+
+from archive import stat_path
+from cache_paths import cache_root
+from image_cache import image_reader
+
+THUMBNAIL_SIZE = 128
+
+
+def thumbnail_key(path, size, st=None):
+    """ Content address of a thumbnail, from the path, size and mtime of the file """
+    path = os.path.abspath(str(path))
+    st = st if st is not None else stat_path(path)
+    text = "%s\0%d\0%d\0%d" % (path, st.st_size, st.st_mtime_ns, size)
+    return hashlib.sha1(text.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+class ThumbnailStore(object):
+    """ Persistent thumbnails, JPEG encoded in a single SQLite database """
+
+    def __init__(self, path=None):
+        self.path = str(path) if path is not None else str(cache_root() / "thumbnails.sqlite")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS thumbnails (key TEXT PRIMARY KEY, data BLOB)")
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM thumbnails WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, data):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?)", (key, data))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """ Decode the image straight at thumbnail size, full resolution pixels are never decoded """
+    reader = image_reader(path)
+    full = reader.size()
+    if full.isValid():
+        reader.setScaledSize(full.scaled(size, size, QtCore.Qt.KeepAspectRatio))
+    return reader.read()
+
+
+def encode_image(image, fmt="JPG", quality=85):
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, fmt, quality)
+    return bytes(data)
+
+
+class ThumbnailTask(QtCore.QRunnable):
+    """ Looks a thumbnail up in the store, generating and storing it when missing """
+
+    def __init__(self, provider, path, row):
+        super(ThumbnailTask, self).__init__()
+        self.provider = provider
+        self.store = provider.store
+        self.size = provider.size
+        self.path = path
+        self.row = row
+
+    def run(self):
+        image = QtGui.QImage()
+        try:
+            key = thumbnail_key(self.path, self.size)
+            data = self.store.get(key)
+            if data is not None:
+                image.loadFromData(data)
+            if image.isNull():
+                image = make_thumbnail(self.path, self.size)
+                if not image.isNull():
+                    self.store.put(key, encode_image(image))
+        except (OSError, sqlite3.Error):
+            pass
+        self.provider._done(self.path, self.row, image)
+
+
+class ThumbnailProvider(QtCore.QObject):
+    """ Thumbnails for views, kept in memory for the recently shown ones and
+        looked up or generated by background workers otherwise.
+    """
+    thumbnailReady = QtCore.pyqtSignal(str, int)
+
+    def __init__(self, store=None, size=THUMBNAIL_SIZE, capacity=4000, parent=None):
+        super(ThumbnailProvider, self).__init__(parent)
+        self.store = store if store is not None else ThumbnailStore()
+        self.size = size
+        self.capacity = capacity
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, QtCore.QThread.idealThreadCount() - 1))
+        self._pixmaps = OrderedDict()
+        self._images = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _done(self, path, row, image):
+        with self._lock:
+            self._pending.discard(path)
+            self._images[path] = image
+        self.thumbnailReady.emit(path, row)
+
+    def thumbnail(self, path, row=-1):
+        """ The thumbnail of path if it is at hand, otherwise None and it is prepared
+            in the background, thumbnailReady is emitted once it is available.
+        """
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+        with self._lock:
+            image = self._images.pop(path, None)
+            if image is None:
+                if path not in self._pending:
+                    self._pending.add(path)
+                    self.pool.start(ThumbnailTask(self, path, row))
+                return None
+        # pixmaps can only be made in the GUI thread
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self._pixmaps[path] = pixmap
+        while len(self._pixmaps) > self.capacity:
+            self._pixmaps.popitem(last=False)
+        return pixmap
+
+    def cancel(self):
+        """ Drop the queued requests, e.g. after scrolling away or changing folder """
+        self.pool.clear()
+        with self._lock:
+            self._pending.clear()
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.waitForDone()
+        self.store.close()
@@ -0,0 +1,237 @@
+import math
+import threading
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from image_cache import image_reader
+
+TILE_SIZE = 512
+# memory used by the decoded tiles of one image
+DEFAULT_TILE_BUDGET = 256 * 1024 * 1024
+
+
+class _TileSignals(QtCore.QObject):
+    loaded = QtCore.pyqtSignal(object, QtGui.QImage)
+
+
+class TileTask(QtCore.QRunnable):
+    """ Decodes one tile of one pyramid level with QImageReader, or cuts it from
+        the image decoded once when its format cannot decode a part of it.
+    """
+
+    def __init__(self, item, key):
+        super(TileTask, self).__init__()
+        self.path = item.path
+        self.size = item.image_size
+        self.signals = item.signals
+        self.wanted = item._still_wanted
+        self.decoded = None if item.tileable else item._decoded
+        self.source_level = item.min_level
+        self.key = key
+
+    def run(self):
+        if not self.wanted(self.key):
+            self.signals.loaded.emit(self.key, QtGui.QImage())
+            return
+        if self.decoded is None:
+            tile = read_tile(self.path, self.size, *self.key)
+        else:
+            tile = cut_tile(self.decoded(), self.source_level, *self.key)
+        self.signals.loaded.emit(self.key, tile)
+
+
+def level_size(size, level):
+    """ Size of the image at the given pyramid level, level 0 is full resolution """
+    f = 1 << level
+    return QtCore.QSize(max(1, -(-size.width() // f)), max(1, -(-size.height() // f)))
+
+
+def read_tile(path, size, level, tx, ty):
+    """ Decode tile (tx, ty) of the level without decoding the rest of the image
+        when the image format supports it.
+    """
+    reader = image_reader(path)
+    scaled = level_size(size, level)
+    rect = QtCore.QRect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE).intersected(
+            QtCore.QRect(QtCore.QPoint(0, 0), scaled))
+    if level == 0:
+        reader.setClipRect(rect)
+    else:
+        reader.setScaledSize(scaled)
+        reader.setScaledClipRect(rect)
+    return reader.read()
+
+
+def cut_tile(source, source_level, level, tx, ty):
+    """ Tile (tx, ty) of the level cut from source, the image at source_level """
+    if source.isNull():
+        return source
+    f = 1 << (level - source_level)
+    rect = QtCore.QRect(tx * TILE_SIZE * f, ty * TILE_SIZE * f, TILE_SIZE * f, TILE_SIZE * f).intersected(
+            source.rect())
+    tile = source.copy(rect)
+    if f > 1:
+        tile = tile.scaled(max(1, -(-rect.width() // f)), max(1, -(-rect.height() // f)),
+                QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+    return tile
+
+
+class TiledImageItem(QtWidgets.QGraphicsObject):
+    """ Shows a very large image as a pyramid of tiles.
+
+        Only the tiles covering the exposed area at the level matching the
+        current zoom are decoded, in the background. Until a tile arrives the
+        area is drawn from a coarser level, the coarsest one always being in
+        memory. Tiles are evicted least recently used first beyond the budget.
+
+        Formats which cannot decode a part of the image, like PNG, are decoded
+        once in the background at the finest level whose pixels take at most
+        half of the budget, and their tiles are cut from that image.
+    """
+
+    def __init__(self, path, image_size=None, budget=DEFAULT_TILE_BUDGET, pool=None, parent=None):
+        super(TiledImageItem, self).__init__(parent)
+        self.path = str(path)
+        reader = image_reader(self.path)
+        self.image_size = image_size if image_size is not None else reader.size()
+        self.tileable = reader.supportsOption(QtGui.QImageIOHandler.ClipRect)
+        self.budget = budget
+        self.pool = pool if pool is not None else QtCore.QThreadPool.globalInstance()
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.setCacheMode(QtWidgets.QGraphicsItem.NoCache)
+
+        longest = max(self.image_size.width(), self.image_size.height(), 1)
+        self.max_level = max(0, int(math.ceil(math.log2(longest / TILE_SIZE))))
+        # finest level shown
+        self.min_level = 0
+        if not self.tileable:
+            pixels = self.image_size.width() * self.image_size.height()
+            while self.min_level < self.max_level and 4 * pixels >> 2 * self.min_level > budget // 2:
+                self.min_level += 1
+        self._source = None
+        self._source_lock = threading.Lock()
+        self.signals = _TileSignals()
+        self.signals.loaded.connect(self._tileLoaded)
+        self.tiles = OrderedDict()
+        self.memory = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._visible = (self.max_level, QtCore.QRectF())
+        self._closed = False
+
+        # the coarsest level is a single small tile, kept at hand once decoded
+        self._request((self.max_level, 0, 0))
+
+    def boundingRect(self):
+        return QtCore.QRectF(0, 0, self.image_size.width(), self.image_size.height())
+
+    def close(self):
+        """ Stop decoding tiles, queued tasks finish without doing anything """
+        self._closed = True
+        self.tiles.clear()
+        self.memory = 0
+        with self._source_lock:
+            self._source = None
+
+    def _decoded(self):
+        """ The image at min_level, decoded by the first task needing it """
+        with self._source_lock:
+            if self._source is None and not self._closed:
+                reader = image_reader(self.path)
+                if self.min_level:
+                    reader.setScaledSize(level_size(self.image_size, self.min_level))
+                self._source = reader.read()
+            return self._source if self._source is not None else QtGui.QImage()
+
+    def level_for(self, lod):
+        """ Coarsest level which still has at least one pixel per device pixel """
+        if lod <= 0:
+            return self.max_level
+        level = int(math.floor(math.log2(1.0 / lod))) if lod < 1 else 0
+        return min(max(level, self.min_level), self.max_level)
+
+    def tile_rect(self, level, tx, ty):
+        """ Area of the item covered by a tile """
+        f = 1 << level
+        rect = QtCore.QRectF(tx * TILE_SIZE * f, ty * TILE_SIZE * f, TILE_SIZE * f, TILE_SIZE * f)
+        return rect.intersected(self.boundingRect())
+
+    def tiles_in(self, level, rect):
+        """ Keys of the tiles of a level intersecting rect """
+        span = TILE_SIZE << level
+        rect = rect.intersected(self.boundingRect())
+        if rect.isEmpty():
+            return []
+        x0, y0 = int(rect.left() // span), int(rect.top() // span)
+        x1, y1 = int((rect.right() - 1e-6) // span), int((rect.bottom() - 1e-6) // span)
+        return [(level, tx, ty) for ty in range(y0, y1 + 1) for tx in range(x0, x1 + 1)]
+
+    def _still_wanted(self, key):
+        if self._closed:
+            return False
+        if key == (self.max_level, 0, 0):
+            return True
+        level, rect = self._visible
+        return key[0] == level and self.tile_rect(*key).intersects(rect)
+
+    def _store(self, key, image):
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self.tiles[key] = pixmap
+        self.memory += pixmap.width() * pixmap.height() * 4
+        while self.memory > self.budget and len(self.tiles) > 1:
+            old_key, old = next(iter(self.tiles.items()))
+            if old_key[0] == self.max_level:
+                self.tiles.move_to_end(old_key)
+                continue
+            del self.tiles[old_key]
+            self.memory -= old.width() * old.height() * 4
+
+    def _tileLoaded(self, key, image):
+        with self._lock:
+            self._pending.discard(key)
+        if self._closed or image.isNull():
+            return
+        self._store(key, image)
+        self.update(self.tile_rect(*key))
+
+    def _request(self, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        # coarser levels first, they cover more of the view
+        self.pool.start(TileTask(self, key), key[0])
+
+    def _fallback(self, painter, key, target):
+        """ Draw the area of a missing tile from the loaded coarser levels, finest last """
+        for level in range(self.max_level, key[0], -1):
+            for coarse in self.tiles_in(level, target):
+                pixmap = self.tiles.get(coarse)
+                if pixmap is not None:
+                    self._draw(painter, coarse, pixmap, target)
+
+    def _draw(self, painter, key, pixmap, clip):
+        rect = self.tile_rect(*key)
+        part = rect.intersected(clip)
+        if part.isEmpty():
+            return
+        f = float(1 << key[0])
+        source = QtCore.QRectF((part.left() - rect.left()) / f, (part.top() - rect.top()) / f,
+                part.width() / f, part.height() / f)
+        painter.drawPixmap(part, pixmap, source)
+
+    def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        exposed = option.exposedRect
+        self._visible = (level, exposed)
+        for key in self.tiles_in(level, exposed):
+            target = self.tile_rect(*key).intersected(exposed)
+            pixmap = self.tiles.get(key)
+            if pixmap is None:
+                self._request(key)
+                self._fallback(painter, key, target)
+            else:
+                self.tiles.move_to_end(key)
+                self._draw(painter, key, pixmap, target)
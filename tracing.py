@@ -0,0 +1,119 @@
+""" Timing spans around the stages of loading and showing an image.
+
+    with span("decode"):
+        image = decode_image(path)
+
+    Spans are only recorded while the tracer is enabled, otherwise span()
+    returns a shared object whose enter and exit do nothing, so spans can
+    stay in the code. Recorded spans give the last duration and the 95th
+    percentile of every stage, and can be saved as Chrome trace event JSON
+    to be opened with chrome://tracing or Perfetto.
+    Setting IMAGE_VIEWER_TRACE=1 in the environment enables the tracer at start.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# spans kept for the trace export, the oldest ones are dropped first
+MAX_EVENTS = 100000
+# durations kept per stage for the percentiles
+WINDOW = 256
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Tracer(object):
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.durations = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, duration):
+        """ Record a span of duration nanoseconds started at start (perf_counter_ns) """
+        with self._lock:
+            self.events.append((name, start, duration, threading.get_ident()))
+            durations = self.durations.get(name)
+            if durations is None:
+                durations = self.durations[name] = deque(maxlen=WINDOW)
+            durations.append(duration)
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self.durations.clear()
+
+    def stats(self):
+        """ {stage: (last ms, p95 ms, count)} over the recent spans of every stage """
+        with self._lock:
+            recent = {name: list(durations) for name, durations in self.durations.items()}
+        stats = {}
+        for name, durations in recent.items():
+            ordered = sorted(durations)
+            p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+            stats[name] = (durations[-1] / 1e6, p95 / 1e6, len(durations))
+        return stats
+
+    def chrome_trace(self):
+        """ The recorded spans as a Chrome trace event document """
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        threads = {}
+        trace = []
+        for name, start, duration, ident in events:
+            tid = threads.setdefault(ident, len(threads) + 1)
+            trace.append({"name": name, "cat": "viewer", "ph": "X", "pid": pid, "tid": tid,
+                    "ts": (start - self._origin) / 1e3, "dur": duration / 1e3})
+        main = threading.main_thread().ident
+        for ident, tid in threads.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                    "args": {"name": "main" if ident == main else "worker %d" % tid}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, fname):
+        with open(str(fname), "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+tracer = Tracer(enabled=os.environ.get("IMAGE_VIEWER_TRACE", "") not in ("", "0"))
+
+
+def span(name):
+    """ Context manager timing the enclosed stage with the shared tracer """
+    return tracer.span(name)
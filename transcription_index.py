@@ -0,0 +1,184 @@
+""" Inverted index over the transcriptions of a ground truth folder.
+
+    The index is an SQLite database in the cache folder. Building it a second
+    time only parses the ground truth files that changed since the last time.
+
+    Query syntax, terms are combined with AND:
+        word        transcriptions equal to word, ignoring case
+        wo*         transcriptions starting with wo, ignoring case
+        "Word"      transcriptions exactly equal to Word
+        boxes>N     images with more than N boxes, also boxes<N and boxes=N
+        has:###     images with don't care boxes
+"""
+import os
+import re
+import sqlite3
+
+from archive import Archive, is_archive
+from cache_paths import cache_file
+from icdar_gt import DONT_CARE, read_icdar2015_gt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, name TEXT UNIQUE, mtime INTEGER, size INTEGER,
+    boxes INTEGER, dont_care INTEGER);
+CREATE TABLE IF NOT EXISTS words (word TEXT, text TEXT, file INTEGER, box INTEGER);
+CREATE INDEX IF NOT EXISTS words_word ON words (word);
+CREATE INDEX IF NOT EXISTS words_file ON words (file);
+CREATE INDEX IF NOT EXISTS files_boxes ON files (boxes);
+"""
+
+_COUNT_TERM = re.compile(r"^boxes([<>=])(\d+)$")
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokens(text):
+    """ Words a transcription is found by, the whole text and its space separated parts """
+    words = {text}
+    words.update(text.split())
+    return words
+
+
+def gt_files(gt_dir):
+    """ (name, path, stat) of the ground truth files of a folder or an archive """
+    if is_archive(gt_dir):
+        archive = Archive.open(gt_dir)
+        for member in archive.names():
+            if member.endswith(".txt"):
+                yield member.rsplit("/", 1)[-1], os.path.join(gt_dir, member), archive.stat(member)
+        return
+    with os.scandir(gt_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".txt") and entry.is_file():
+                yield entry.name, entry.path, entry.stat()
+
+
+class TranscriptionIndex(object):
+
+    def __init__(self, gt_dir, path=None):
+        self.gt_dir = os.path.abspath(str(gt_dir))
+        self.path = str(path) if path is not None else str(cache_file("transcriptions", self.gt_dir, ".sqlite"))
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def update(self, progress=None, cancelled=None):
+        """ Index the new and changed ground truth files and forget the deleted ones.
+            Returns the number of files parsed.
+        """
+        known = {name: (file_id, mtime, size) for file_id, name, mtime, size
+                in self.db.execute("SELECT id, name, mtime, size FROM files")}
+        parsed = 0
+        seen = set()
+        complete = True
+        for name, path, st in gt_files(self.gt_dir):
+            if cancelled is not None and cancelled():
+                complete = False
+                break
+            seen.add(name)
+            old = known.get(name)
+            if old is not None and old[1:] == (st.st_mtime_ns, st.st_size):
+                continue
+            if old is not None:
+                self._remove(old[0])
+            self._add(name, path, st)
+            parsed += 1
+            if parsed % 1000 == 0:
+                self.db.commit()
+                if progress is not None:
+                    progress(parsed)
+        if complete:
+            for name, (file_id, _, _) in known.items():
+                if name not in seen:
+                    self._remove(file_id)
+        self.db.commit()
+        return parsed
+
+    def _remove(self, file_id):
+        self.db.execute("DELETE FROM words WHERE file=?", (file_id,))
+        self.db.execute("DELETE FROM files WHERE id=?", (file_id,))
+
+    def _add(self, name, path, st):
+        gt = read_icdar2015_gt(path)
+        dont_care = sum(1 for text in gt.texts if text == DONT_CARE)
+        cursor = self.db.execute("INSERT INTO files (name, mtime, size, boxes, dont_care) VALUES (?, ?, ?, ?, ?)",
+                (name, st.st_mtime_ns, st.st_size, len(gt), dont_care))
+        file_id = cursor.lastrowid
+        self.db.executemany("INSERT INTO words VALUES (?, ?, ?, ?)",
+                [(word.lower(), text, file_id, box) for box, text in enumerate(gt.texts)
+                for word in tokens(text)])
+
+    def search(self, query):
+        """ Ground truth files matching the query, as a dict from file name to the
+            indices of the matching boxes. Files matched by filters only have no boxes.
+        """
+        word_sets = []
+        conditions, params = [], []
+        for quoted_term, plain_term in _TERM.findall(query):
+            quoted = bool(quoted_term)
+            term = quoted_term or plain_term
+            match = _COUNT_TERM.match(term)
+            if match is not None:
+                conditions.append("boxes %s ?" % match.group(1))
+                params.append(int(match.group(2)))
+            elif term.lower() == "has:" + DONT_CARE:
+                conditions.append("dont_care > 0")
+            elif quoted:
+                word_sets.append(self._words("word=? AND text=?", (term.lower(), term)))
+            elif term.endswith("*") and len(term) > 1:
+                prefix = term[:-1].lower()
+                word_sets.append(self._words("word>=? AND word<?", (prefix, prefix + "\U0010ffff")))
+            else:
+                word_sets.append(self._words("word=?", (term.lower(),)))
+
+        files = None
+        if conditions:
+            files = {file_id: set() for file_id, in self.db.execute(
+                    "SELECT id FROM files WHERE " + " AND ".join(conditions), params)}
+        for words in word_sets:
+            if files is None:
+                files = words
+            else:
+                files = {file_id: boxes | words[file_id] for file_id, boxes in files.items() if file_id in words}
+        if not files:
+            return {}
+        names = {}
+        ids = list(files)
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            names.update(self.db.execute("SELECT id, name FROM files WHERE id IN (%s)"
+                    % ",".join("?" * len(chunk)), chunk))
+        return {names[file_id]: sorted(boxes) for file_id, boxes in files.items()}
+
+    def _words(self, condition, params):
+        found = {}
+        for file_id, box in self.db.execute("SELECT file, box FROM words WHERE " + condition, params):
+            found.setdefault(file_id, set()).add(box)
+        return found
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Search the transcriptions of a ground truth folder")
+    parser.add_argument("gt_dir")
+    parser.add_argument("query", nargs="?")
+    args = parser.parse_args()
+    index = TranscriptionIndex(args.gt_dir)
+    start = time.perf_counter()
+    parsed = index.update()
+    print("updated %d of %d files in %.2fs" % (parsed, len(index), time.perf_counter() - start))
+    if args.query:
+        start = time.perf_counter()
+        results = index.search(args.query)
+        elapsed = time.perf_counter() - start
+        for name in sorted(results):
+            print(name, results[name])
+        print("%d files in %.1f ms" % (len(results), 1e3 * elapsed))
@@ -0,0 +1,242 @@
+""" Check a ground truth folder for the mistakes usually found by eye in the viewer.
+
+    python validate_gt.py IMG_DIR GT_DIR [--workers N] [--sort check] [--csv report.csv]
+
+    The images are split in chunks handed to a pool of worker processes.
+    A worker reads the ground truth of its images and their sizes from the
+    image headers, without decoding pixels, then checks all the boxes of the
+    chunk at once with NumPy:
+      zero area           the box has no area, points repeated or on a line
+      self intersection   two edges of the box cross
+      counter clockwise   the points do not go clockwise (ICDAR 2015 only)
+      out of bounds       a point is outside the image
+    and the transcriptions for empty texts, invalid UTF-8 and control
+    characters. Lines of ICDAR 2015 files which cannot be parsed, images
+    without a ground truth file and unreadable images are reported too.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import unicodedata
+from array import array
+from collections import Counter, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from archive import read_bytes
+from gt_loaders import Icdar2015Loader, PerFileLoader, open_loader
+from image_cache import image_size
+from image_list import scan_images
+
+# boxes smaller than this, in square pixels, have no area
+MIN_AREA = 1.0
+# images handed to a worker at a time
+CHUNK_SIZE = 256
+
+# box is -1 for the issues of a whole image
+Issue = namedtuple("Issue", "image box check detail")
+SORT_KEYS = {
+    "image": lambda issue: (issue.image, issue.box),
+    "check": lambda issue: (issue.check, issue.image, issue.box),
+}
+
+_loader = None
+
+
+def _init_worker(gt_source):
+    global _loader
+    _loader = open_loader(gt_source)
+
+
+def _non_adjacent_edges(n):
+    """ Indices (i, j) of the pairs of edges of an n-gon which do not share a point """
+    pairs = [(i, j) for i in range(n) for j in range(i + 2, n) if not (i == 0 and j == n - 1)]
+    return np.array(pairs, dtype=np.intp).reshape(-1, 2)
+
+
+def _cross(o, a, b):
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+
+def check_polygons(points, sizes, clockwise=True):
+    """ Geometry checks of m polygons of n points each.
+
+        points is an (m, n, 2) array and sizes an (m, 2) array of the width and
+        height of their images, NaN when unknown. Returns a dictionary of
+        boolean arrays of length m, one per check, True for the faulty boxes.
+    """
+    x, y = points[..., 0], points[..., 1]
+    # shoelace, positive when the points go clockwise with y pointing down
+    area = 0.5 * np.sum(x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y, axis=1)
+    zero_area = np.abs(area) < MIN_AREA
+    found = {"zero area": zero_area}
+
+    n = points.shape[1]
+    pairs = _non_adjacent_edges(n)
+    i, j = pairs[:, 0], pairs[:, 1]
+    a, b = points[:, i], points[:, (i + 1) % n]
+    c, d = points[:, j], points[:, (j + 1) % n]
+    # the ends of each edge are on both sides of the other one
+    crossing = (_cross(a, b, c) * _cross(a, b, d) < 0) & (_cross(c, d, a) * _cross(c, d, b) < 0)
+    found["self intersection"] = crossing.any(axis=1)
+    if clockwise:
+        found["counter clockwise"] = (area < 0) & ~zero_area & ~found["self intersection"]
+
+    width, height = sizes[:, 0:1], sizes[:, 1:2]
+    # comparisons with NaN are False, boxes of images of unknown size are not checked
+    outside = (x < 0) | (y < 0) | (x > width) | (y > height)
+    found["out of bounds"] = outside.any(axis=1)
+    return found
+
+
+def check_text(text):
+    """ What is wrong with a transcription, None if nothing """
+    if not text:
+        return "empty transcription"
+    if "\ufffd" in text:
+        return "invalid UTF-8"
+    if any(unicodedata.category(c) == "Cc" for c in text):
+        return "control characters"
+    return None
+
+
+def _read(loader, image_path, issues, name):
+    """ The annotations of an image, reporting what keeps them from being read """
+    if not isinstance(loader, PerFileLoader):
+        return loader.load(image_path)
+    gt_path = loader.gt_path(image_path)
+    try:
+        text = read_bytes(gt_path).decode("utf-8-sig", errors="replace")
+    except FileNotFoundError:
+        issues.append(Issue(name, -1, "no ground truth", gt_path.name))
+        return loader.parse("")
+    gt = loader.parse(text)
+    if isinstance(loader, Icdar2015Loader):
+        lines = sum(1 for line in text.splitlines() if line.strip())
+        if lines > len(gt):
+            issues.append(Issue(name, -1, "unparsable lines", "%d of %d lines" % (lines - len(gt), lines)))
+    return gt
+
+
+def validate_images(loader, image_paths, names=None):
+    """ Issues found in the ground truth of the images, and the number of boxes checked """
+    names = names if names is not None else [Path(path).name for path in image_paths]
+    issues = []
+    # boxes grouped by their number of points to be checked together
+    groups = {}
+    n_boxes = 0
+    for image_path, name in zip(image_paths, names):
+        gt = _read(loader, image_path, issues, name)
+        size = image_size(image_path)
+        if size.isValid():
+            wh = (size.width(), size.height())
+        else:
+            wh = (np.nan, np.nan)
+            issues.append(Issue(name, -1, "unreadable image", ""))
+        for i, (points, text) in enumerate(gt):
+            group = groups.setdefault(len(points) // 2, (array("f"), [], []))
+            group[0].extend(points)
+            group[1].append(wh)
+            group[2].append((name, i))
+            problem = check_text(text)
+            if problem is not None:
+                issues.append(Issue(name, i, problem, repr(text)))
+        n_boxes += len(gt)
+
+    clockwise = isinstance(loader, Icdar2015Loader)
+    for n, (coords, sizes, owners) in groups.items():
+        if n < 3:
+            for name, i in owners:
+                issues.append(Issue(name, i, "zero area", "%d points" % n))
+            continue
+        points = np.frombuffer(coords, dtype=np.float32).astype(np.float64).reshape(len(owners), n, 2)
+        found = check_polygons(points, np.array(sizes, dtype=np.float64), clockwise)
+        for check, faulty in found.items():
+            for k in np.flatnonzero(faulty):
+                name, i = owners[k]
+                issues.append(Issue(name, i, check, ""))
+    return issues, n_boxes
+
+
+def validate_chunk(task):
+    """ Worker side of validate: (image paths, names) -> (issues, images, boxes) """
+    image_paths, names = task
+    issues, n_boxes = validate_images(_loader, image_paths, names)
+    return issues, len(image_paths), n_boxes
+
+
+def chunks(img_dir, names, size=CHUNK_SIZE):
+    for start in range(0, len(names), size):
+        part = names[start:start + size]
+        yield [os.path.join(str(img_dir), name) for name in part], part
+
+
+def validate(img_dir, gt_source, names=None, workers=None, progress=None, cancelled=None):
+    """ Issues of the ground truth of every image of img_dir, found by a pool of worker processes.
+        progress is called with the new issues, the images and the boxes checked after every chunk.
+    """
+    names = sorted(scan_images(img_dir)) if names is None else list(names)
+    workers = workers or os.cpu_count() or 1
+    issues = []
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(max(1, workers), initializer=_init_worker, initargs=(str(gt_source),)) as pool:
+        checking = pool.imap_unordered(validate_chunk, chunks(img_dir, names))
+        while True:
+            if cancelled is not None and cancelled():
+                pool.terminate()
+                break
+            try:
+                # cancelling is polled while a chunk is checked
+                found, n_images, n_boxes = checking.next(timeout=0.1)
+            except multiprocessing.TimeoutError:
+                continue
+            except StopIteration:
+                break
+            issues.extend(found)
+            if progress is not None:
+                progress(found, n_images, n_boxes)
+    return issues
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("img_dir")
+    parser.add_argument("gt_dir", help="ground truth folder, archive or JSON file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+            help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="image")
+    parser.add_argument("--csv", metavar="FILE", help="write the report to FILE instead of printing it")
+    args = parser.parse_args(argv)
+
+    totals = Counter()
+
+    def progress(found, n_images, n_boxes):
+        totals["images"] += n_images
+        totals["boxes"] += n_boxes
+
+    start = time.perf_counter()
+    issues = sorted(validate(args.img_dir, args.gt_dir, workers=args.workers, progress=progress),
+            key=SORT_KEYS[args.sort])
+    elapsed = time.perf_counter() - start
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(Issue._fields)
+            writer.writerows(issues)
+    else:
+        for issue in issues:
+            box = "" if issue.box < 0 else "box %d" % issue.box
+            print("%s\t%s\t%s\t%s" % (issue.image, box, issue.check, issue.detail))
+    for check, count in sorted(Counter(issue.check for issue in issues).items()):
+        print("%s: %d" % (check, count), file=sys.stderr)
+    print("%d images, %d boxes checked in %.1f s, %d issues" % (totals["images"], totals["boxes"],
+            elapsed, len(issues)), file=sys.stderr)
+    return 1 if issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+""" Dock listing the ground truth issues found by validate_gt.
+
+    The validation runs in the worker processes of validate_gt, driven from a
+    thread so that issues show up chunk by chunk while the viewer stays usable.
+    Activating an issue opens its image and selects the faulty box.
+"""
+from functools import partial
+
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import Qt
+
+from validate_gt import validate
+
+
+class ValidationRunner(QtCore.QThread):
+    """ Runs validate_gt.validate in the background """
+    found = QtCore.pyqtSignal(list, int, int)
+
+    def __init__(self, img_dir, gt_source, names, parent=None):
+        super(ValidationRunner, self).__init__(parent)
+        self.img_dir = str(img_dir)
+        self.gt_source = str(gt_source)
+        self.names = list(names)
+        self.error = None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            validate(self.img_dir, self.gt_source, self.names,
+                    progress=lambda found, n_images, n_boxes: self.found.emit(found, n_images, n_boxes),
+                    cancelled=lambda: self._cancelled)
+        except (OSError, ValueError) as e:
+            self.error = e
+
+
+class IssueModel(QtCore.QAbstractTableModel):
+    """ The issues as a table sortable on every column """
+    COLUMNS = ("Image", "Box", "Check", "Detail")
+
+    def __init__(self, parent=None):
+        super(IssueModel, self).__init__(parent)
+        self.issues = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.issues)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(IssueModel.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return IssueModel.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        value = self.issues[index.row()][index.column()]
+        if index.column() == 1 and value < 0:
+            return ""
+        return value
+
+    def issue(self, row):
+        return self.issues[row]
+
+    def append(self, issues):
+        if not issues:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.issues), len(self.issues) + len(issues) - 1)
+        self.issues.extend(issues)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.issues = []
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        # ties keep the image and box order
+        self.issues.sort(key=lambda issue: (issue[column], issue.image, issue.box),
+                reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+
+class ValidationPanel(QtWidgets.QDockWidget):
+    """ Validates the listed images and lists the issues found """
+    # image name relative to the images folder and box index, -1 for the whole image
+    issueActivated = QtCore.pyqtSignal(str, int)
+
+    def __init__(self, parent=None):
+        super(ValidationPanel, self).__init__("Validation", parent)
+        self.setObjectName("validationPanel")
+        self.runner = None
+        self.n_images = 0
+        self.n_boxes = 0
+        self.total = 0
+        self.timer = QtCore.QElapsedTimer()
+
+        self.model = IssueModel(self)
+        self.view = QtWidgets.QTableView()
+        self.view.setModel(self.model)
+        self.view.setSortingEnabled(True)
+        self.view.sortByColumn(0, Qt.AscendingOrder)
+        self.view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.view.verticalHeader().hide()
+        self.view.horizontalHeader().setStretchLastSection(True)
+        self.view.activated.connect(self._activated)
+        self.status = QtWidgets.QLabel()
+        self.stopButton = QtWidgets.QPushButton("Stop", enabled=False, clicked=self.stop)
+
+        bar = QtWidgets.QHBoxLayout()
+        bar.addWidget(self.status, 1)
+        bar.addWidget(self.stopButton)
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(bar)
+        layout.addWidget(self.view)
+        widget = QtWidgets.QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+    def start(self, img_dir, gt_source, names):
+        """ Validate the ground truth in gt_source of the images called names in img_dir """
+        self.stop()
+        self.model.clear()
+        self.n_images = self.n_boxes = 0
+        self.total = len(names)
+        self.runner = ValidationRunner(img_dir, gt_source, names, self)
+        self.runner.found.connect(partial(self._found, self.runner))
+        self.runner.finished.connect(partial(self._finished, self.runner))
+        self.stopButton.setEnabled(True)
+        self.timer.start()
+        self.runner.start()
+        self._show_progress()
+
+    def stop(self):
+        """ Cancel the validation, the runner finishes in the background and its results are dropped """
+        if self.runner is None:
+            return
+        runner = self.runner
+        runner.cancel()
+        if runner.isRunning():
+            runner.finished.connect(runner.deleteLater)
+        else:
+            runner.deleteLater()
+        self.runner = None
+        self.stopButton.setEnabled(False)
+        self._show_progress()
+        self._sort()
+
+    def shutdown(self):
+        """ Stop the validation and give it a moment to end, on exit """
+        self.stop()
+        for runner in self.findChildren(ValidationRunner):
+            # cancelling is polled every 0.1 s
+            runner.wait(2000)
+
+    def _found(self, runner, issues, n_images, n_boxes):
+        if runner is not self.runner:
+            return
+        self.model.append(issues)
+        self.n_images += n_images
+        self.n_boxes += n_boxes
+        self._show_progress()
+
+    def _show_progress(self):
+        self.status.setText("%d / %d images, %d boxes, %d issues, %.1f s" % (self.n_images, self.total,
+                self.n_boxes, len(self.model.issues), self.timer.elapsed() / 1e3))
+
+    def _finished(self, runner):
+        if runner is not self.runner:
+            return
+        self.runner = None
+        self.stopButton.setEnabled(False)
+        self._show_progress()
+        if runner.error is not None:
+            self.status.setText("Cannot validate: %s" % runner.error)
+        runner.deleteLater()
+        self._sort()
+
+    def _sort(self):
+        # rows appended while running are not in order
+        header = self.view.horizontalHeader()
+        self.model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+
+    def _activated(self, index):
+        issue = self.model.issue(index.row())
+        self.issueActivated.emit(issue.image, issue.box)